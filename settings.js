@@ -72,5 +72,9 @@ if (process.env.NUM_EXAMPLES) {
 if (process.env.LOG_ALL) {
     settings.log_all_prompts = process.env.LOG_ALL;
 }
+if (process.env.TASK_OVERRIDES) {
+    // JSON overlay of task fields, {"*": {...}, "<task_id>": {...}}, see tasks/task_store.py
+    settings.task_overrides = process.env.TASK_OVERRIDES;
+}
 
 export default settings;
@@ -368,6 +368,11 @@ export class Task {
             const tasksFile = readFileSync(task_path, 'utf8');
             const tasks = JSON.parse(tasksFile);
             let task = tasks[task_id];
+            if (task && settings.task_overrides) {
+                // Per-run fields such as usernames, applied without rewriting the task file
+                const overrides = JSON.parse(readFileSync(settings.task_overrides, 'utf8'));
+                task = Object.assign({}, task, overrides['*'] || {}, overrides[task_id] || {});
+            }
             task['task_id'] = task_id;
             console.log(task);
             console.log(this.agent.count_id);
@@ -0,0 +1,144 @@
+import math
+import threading
+from statistics import NormalDist
+
+from task_scheduler import Job, estimate_cost
+
+"""
+Adaptive number of repetitions per task for evaluation sweeps.
+
+Instead of running every task num_exp times, every task first gets min_exp repetitions.
+After that a task is repeated again only while its success rate is still uncertain:
+it stops once all of its runs agree (always-pass or always-fail) or once the Wilson
+confidence interval of its success rate is at most ci_width wide. The sweep never runs
+more than num_exp runs per task on average, and the runs saved on settled tasks go to
+the unsettled ones (up to max_exp runs each), widest interval first.
+
+Follow-up jobs are added from the on_done callback of task_scheduler.start_workers, and
+the queue orders them with AdaptiveRepetition.priority.
+
+Example usage:
+    sampler = AdaptiveRepetition(tasks, task_ids, num_exp=8)
+    queue = JobQueue(sampler.initial_jobs(), key=sampler.priority)
+
+    def on_done(slot, job, ok, duration):
+        follow_up = sampler.record(job, success_of(slot, job))
+        if follow_up is not None:
+            queue.put(follow_up)
+"""
+
+DEFAULT_MIN_EXP = 3
+DEFAULT_CI_WIDTH = 0.3
+DEFAULT_CONFIDENCE = 0.95
+
+
+def wilson_interval(successes, n, confidence=DEFAULT_CONFIDENCE):
+    """
+    Wilson score interval of a success rate.
+
+    Returns:
+        tuple: (low, high); (0, 1) without any runs.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+class AdaptiveRepetition:
+    def __init__(self, tasks, task_ids, num_exp, min_exp=DEFAULT_MIN_EXP, max_exp=None, ci_width=DEFAULT_CI_WIDTH,
+                 confidence=DEFAULT_CONFIDENCE, cost_fn=estimate_cost):
+        """
+        Args:
+            tasks (dict): Task definitions keyed by task id.
+            task_ids (list): IDs of the tasks to run.
+            num_exp (int): Average number of repetitions per task; the sweep runs at most len(task_ids) * num_exp jobs.
+            min_exp (int): Repetitions every task gets before it may stop (at most num_exp).
+            max_exp (int): Most repetitions of a single task. Defaults to 2 * num_exp.
+            ci_width (float): A task stops once the confidence interval of its success rate is at most this wide.
+            confidence (float): Coverage of the intervals.
+            cost_fn (callable): Maps a task definition to its estimated cost, see task_scheduler.build_jobs.
+        """
+        self.task_ids = list(task_ids)
+        self.costs = {task_id: cost_fn(tasks[task_id]) for task_id in self.task_ids}
+        self.min_exp = max(1, min(min_exp, num_exp))
+        self.max_exp = max(max_exp or 2 * num_exp, self.min_exp)
+        self.ci_width = ci_width
+        self.confidence = confidence
+        self.budget = len(self.task_ids) * num_exp
+        self.lock = threading.Lock()
+        # Repetitions started, jobs still running, runs with a result and successful runs, per task
+        self.scheduled = dict.fromkeys(self.task_ids, 0)
+        self.in_flight = dict.fromkeys(self.task_ids, 0)
+        self.runs = dict.fromkeys(self.task_ids, 0)
+        self.successes = dict.fromkeys(self.task_ids, 0)
+
+    def new_job(self, task_id, source=None):
+        job = Job(task_id, self.scheduled[task_id], self.costs[task_id], source)
+        self.scheduled[task_id] += 1
+        self.in_flight[task_id] += 1
+        return job
+
+    def initial_jobs(self, source=None):
+        """min_exp jobs per task."""
+        with self.lock:
+            return [self.new_job(task_id, source) for task_id in self.task_ids for _ in range(self.min_exp)]
+
+    def interval(self, task_id):
+        return wilson_interval(self.successes[task_id], self.runs[task_id], self.confidence)
+
+    def is_settled(self, task_id):
+        """True once a task has min_exp results that all agree or a narrow enough interval."""
+        runs, successes = self.runs[task_id], self.successes[task_id]
+        if runs < self.min_exp:
+            return False
+        if successes in (0, runs):
+            return True
+        low, high = self.interval(task_id)
+        return high - low <= self.ci_width
+
+    def priority(self, job):
+        """JobQueue key: initial jobs longest first, then follow-ups of the least certain tasks."""
+        if job.repetition < self.min_exp:
+            return (0, -job.cost, job.repetition)
+        with self.lock:
+            low, high = self.interval(job.task_id)
+        return (1, low - high, job.repetition)
+
+    def record(self, job, success):
+        """
+        Records the outcome of a finished job.
+
+        Args:
+            job (task_scheduler.Job): The finished job.
+            success (bool): Whether it succeeded; None if it left no result, e.g. because it crashed.
+
+        Returns:
+            Job or None: The next repetition of the task, if it is still unsettled, has no other job
+            running and neither its cap nor the budget is used up.
+        """
+        with self.lock:
+            task_id = job.task_id
+            self.in_flight[task_id] -= 1
+            if success is not None:
+                self.runs[task_id] += 1
+                self.successes[task_id] += bool(success)
+            if (self.in_flight[task_id] > 0 or self.is_settled(task_id)
+                    or self.scheduled[task_id] >= self.max_exp or sum(self.scheduled.values()) >= self.budget):
+                return None
+            return self.new_job(task_id, job.source)
+
+    def summary(self):
+        """Runs, successes and interval of every task, and the runs used out of the budget."""
+        with self.lock:
+            tasks = {}
+            for task_id in self.task_ids:
+                low, high = self.interval(task_id)
+                tasks[task_id] = {"runs": self.runs[task_id], "successes": self.successes[task_id],
+                                  "ci": [round(low, 3), round(high, 3)], "settled": self.is_settled(task_id)}
+            return {"runs": sum(self.scheduled.values()), "budget": self.budget, "min_exp": self.min_exp,
+                    "max_exp": self.max_exp, "ci_width": self.ci_width, "tasks": tasks}
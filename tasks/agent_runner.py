@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import shutil
+import signal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from readiness import run_ended
+from task_scheduler import DEFAULT_TASK_TIMEOUT
+
+"""
+Runs agent jobs as managed subprocesses instead of bash scripts typed into tmux.
+
+Every (task_id, repetition) job starts `node main.js` directly under asyncio with the
+environment of its server slot. stdout and stderr go to per-run files in the task
+folder, a run that exceeds the task timeout is killed and retried, and the outcome of
+every run (exit code, attempts, wall time) is appended to runs.jsonl in the
+experiment folder. One event loop drives all server slots.
+
+Example usage:
+    runner = AgentRunner("tasks/example_tasks.json", tasks, "experiments/exp_04-22_16-20")
+    run_jobs(runner, JobQueue(build_jobs(tasks, task_ids, num_exp)), slots)
+"""
+
+# main.js and bots/ are in the project root, whatever the working directory of the caller
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds on top of the task timeout for the bots to log in and set up the task
+STARTUP_GRACE = 120
+# Seconds main.js gets to exit after SIGTERM before it is killed
+KILL_GRACE = 10
+# Seconds to wait for every agent to write its end-of-task turn after main.js exits
+RUN_END_TIMEOUT = 30
+RUN_LOG_FILE_NAME = "runs.jsonl"
+
+
+class RunResult(NamedTuple):
+    task_id: str
+    repetition: int
+    session_name: str
+    returncode: Optional[int]  # None if the last attempt was killed
+    timed_out: bool
+    attempts: int
+    wall_time: float  # seconds, summed over all attempts
+    stdout_path: str
+    stderr_path: str
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+
+async def wait_for_logs(memory_paths, since, timeout=RUN_END_TIMEOUT, interval=0.25):
+    """Async version of readiness.wait_for_run_end."""
+    deadline = time.monotonic() + timeout
+    while not all(run_ended(path, since=since) for path in memory_paths):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(interval)
+    return True
+
+
+async def kill_process_group(proc):
+    """Stops main.js and every child it started: SIGTERM first, SIGKILL after KILL_GRACE."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            await asyncio.wait_for(proc.wait(), KILL_GRACE)
+            break
+        except asyncio.TimeoutError:
+            continue
+    await proc.wait()
+
+
+class AgentRunner:
+    def __init__(self, task_path, tasks, experiments_folder, retries=1, s3=False, s3_path="mindcraft-experiments", 
+                 before_run=None):
+        """
+        Args:
+            task_path (str): Path to the task file, passed to main.js.
+            tasks (dict): Task definitions keyed by task id, used for the per-task timeout.
+            experiments_folder (str): Folder holding one subfolder per task id.
+            retries (int): How often a failed or timed out run is started again.
+            s3 (bool): Whether to upload the logs to S3.
+            s3_path (str): S3 path of the experiment.
+            before_run (callable): Called as before_run(slot, job) before every attempt, e.g. to reset the world.
+        """
+        self.before_run = before_run
+        self.task_path = task_path
+        self.tasks = tasks
+        self.experiments_folder = experiments_folder
+        self.retries = retries
+        self.s3 = s3
+        self.s3_path = s3_path
+
+    def run_timeout(self, task_id):
+        return (self.tasks[task_id].get("timeout") or DEFAULT_TASK_TIMEOUT) + STARTUP_GRACE
+
+    def memory_path(self, agent):
+        return os.path.join(PROJECT_ROOT, "bots", agent, "memory.json")
+
+    async def start_agents(self, slot, task_id, stdout_path, stderr_path):
+        """Runs main.js once for task_id. Returns (returncode, timed_out)."""
+        with open(stdout_path, "wb") as stdout, open(stderr_path, "wb") as stderr:
+            proc = await asyncio.create_subprocess_exec(
+                "node", "main.js", "--task_path", os.path.abspath(self.task_path), "--task_id", task_id,
+                stdout=stdout, stderr=stderr, env=slot["env"], cwd=PROJECT_ROOT,
+                # Own process group, so a kill also reaches the bots main.js spawns
+                start_new_session=True)
+            try:
+                return await asyncio.wait_for(proc.wait(), self.run_timeout(task_id)), False
+            except asyncio.TimeoutError:
+                print(f"[{slot['session_name']}] {task_id} exceeded {self.run_timeout(task_id)}s, killing it")
+                await kill_process_group(proc)
+                return None, True
+
+    def save_logs(self, slot, task_id, repetition, since):
+        """Copies each agent's memory.json written since `since` into the task folder. Returns the copies."""
+        task_folder = os.path.join(self.experiments_folder, str(task_id))
+        saved = []
+        for agent in slot["agent_names"]:
+            memory_path = self.memory_path(agent)
+            if not os.path.isfile(memory_path) or os.path.getmtime(memory_path) < since:
+                print(f"No log of {agent} for {task_id} (repetition {repetition})")
+                continue
+            agent_file_path = os.path.join(task_folder, f"{agent}_{repetition}.json")
+            shutil.copyfile(memory_path, agent_file_path)
+            saved.append(agent_file_path)
+        return saved
+
+    async def upload(self, *args):
+        proc = await asyncio.create_subprocess_exec("aws", "s3", "cp", *args)
+        if await proc.wait() != 0:
+            print(f"Upload failed: aws s3 cp {' '.join(args)}")
+
+    def record(self, result):
+        with open(os.path.join(self.experiments_folder, RUN_LOG_FILE_NAME), "a") as f:
+            f.write(json.dumps(dict(result._asdict(), ok=result.ok)) + "\n")
+
+    async def run_job(self, slot, job):
+        """
+        Runs one (task_id, repetition) job on a slot, retrying failed or timed out runs.
+
+        Returns:
+            RunResult: Outcome of the last attempt, with the wall time of all attempts.
+        """
+        task_id, repetition = job.task_id, job.repetition
+        log_folder = os.path.join(self.experiments_folder, str(task_id), "logs")
+        os.makedirs(log_folder, exist_ok=True)
+        memory_paths = [self.memory_path(agent) for agent in slot["agent_names"]]
+
+        wall_time = 0
+        for attempt in range(1, self.retries + 2):
+            stdout_path = os.path.join(log_folder, f"run_{repetition}_attempt_{attempt}.stdout.log")
+            stderr_path = os.path.join(log_folder, f"run_{repetition}_attempt_{attempt}.stderr.log")
+            if self.before_run is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self.before_run, slot, job)
+            run_start = time.time()
+            start = time.monotonic()
+            returncode, timed_out = await self.start_agents(slot, task_id, stdout_path, stderr_path)
+            wall_time += time.monotonic() - start
+            if returncode == 0 and not timed_out:
+                if await wait_for_logs(memory_paths, since=run_start):
+                    break
+                print(f"[{slot['session_name']}] {task_id} exited without an end-of-task turn in every log")
+            else:
+                print(f"[{slot['session_name']}] {task_id} (repetition {repetition}) attempt {attempt} failed "
+                      f"({'timeout' if timed_out else f'exit code {returncode}'})")
+
+        result = RunResult(task_id, repetition, slot["session_name"], returncode, timed_out, attempt,
+                           round(wall_time, 3), stdout_path, stderr_path)
+        saved = self.save_logs(slot, task_id, repetition, since=run_start)
+        if self.s3:
+            for agent_file_path in saved:
+                await self.upload(agent_file_path, f"s3://{self.s3_path}/{task_id}/{os.path.basename(agent_file_path)}")
+            for agent in slot["agent_names"]:
+                await self.upload(os.path.join(PROJECT_ROOT, "bots", agent), f"s3://{self.s3_path}/bots/{agent}",
+                                  "--recursive")
+        self.record(result)
+        return result
+
+
+async def slot_loop(runner, queue, slot, executor, on_done=None):
+    loop = asyncio.get_running_loop()
+    while True:
+        # JobQueue.get blocks, so it waits in a thread instead of stalling the other slots
+        job = await loop.run_in_executor(executor, queue.get)
+        if job is None:
+            return
+        ok = False
+        start = time.monotonic()
+        try:
+            result = await runner.run_job(slot, job)
+            ok = result.ok
+        except Exception as e:
+            print(f"Error running {job.task_id} (repetition {job.repetition}): {e}")
+        finally:
+            duration = time.monotonic() - start
+            print(f"Finished {job.task_id} (repetition {job.repetition}) on slot {slot['session_name']} in {duration:.1f}s")
+            try:
+                # on_done may parse logs (see adaptive_repetition), so it runs off the event loop too
+                if on_done is not None:
+                    await loop.run_in_executor(executor, on_done, slot, job, ok, duration)
+            finally:
+                queue.task_done()
+
+
+async def run_jobs_async(runner, queue, slots, on_done=None):
+    """Drives every slot from the current event loop until the queue is exhausted."""
+    with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+        try:
+            await asyncio.gather(*(slot_loop(runner, queue, slot, executor, on_done=on_done) for slot in slots))
+        finally:
+            # Release slots still blocked in queue.get if a run was interrupted
+            queue.close()
+
+
+def run_jobs(runner, queue, slots, on_done=None):
+    """
+    Runs the jobs of queue on the given server slots as managed subprocesses.
+
+    Args:
+        runner (AgentRunner): Runs single jobs.
+        queue (task_scheduler.JobQueue): Shared job queue.
+        slots (list): Server slots returned by evaluation_script.launch_server_experiment.
+        on_done (callable): Called as on_done(slot, job, ok, duration) after every job, in a worker
+            thread, see task_scheduler.
+    """
+    asyncio.run(run_jobs_async(runner, queue, slots, on_done=on_done))
@@ -1,12 +1,12 @@
-import boto3
 import os
-import json
 import re
-from botocore.exceptions import ClientError
-import json
 import argparse
-from tqdm import tqdm
-import glob
+
+from s3_transfer import download_s3_folders
+from log_ingestion import parse_log_file, ingest_folders, is_success
+from task_ids import parse_task_id
+from results_store import build_runs_frame, folder_frame, success_summary
+import pandas as pd
 
 # Calculate project root directory
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -15,112 +15,50 @@ analysis_output_dir = os.path.join(project_root, "experiments", "analysis_result
 # Ensure the output directory exists
 os.makedirs(analysis_output_dir, exist_ok=True)
 
-def download_s3_folders(bucket_name, s3_prefix, local_base_dir):
+def analyze_json_file(file_path):
     """
-    Downloads groups of folders from S3 based on the next level of prefixes.
+    Analyzes a single JSON file to extract the task outcome.
 
     Args:
-        bucket_name (str): Name of the S3 bucket.
-        s3_prefix (str): Prefix where the folders are located (e.g., 'my-experiments/').
-        local_base_dir (str): Local directory to download the folders to.
+        file_path (str): Path to the JSON file.
 
     Returns:
-        list: List of downloaded local folder paths.
+        bool: True if task was successful, False otherwise. None if the file could not be read.
     """
-    s3_client = boto3.client('s3')
-    downloaded_folders = []
-
-    # Ensure local_base_dir is relative to project root if not absolute
-    if not os.path.isabs(local_base_dir):
-        local_base_dir = os.path.join(project_root, local_base_dir)
-
-    try:
-        # List objects with the prefix, delimited by '/' to find sub-prefixes (folders)
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=s3_prefix, Delimiter='/')
-
-        if 'CommonPrefixes' not in response:
-            print(f"No folders found under s3://{bucket_name}/{s3_prefix}")
-            return downloaded_folders
-
-        s3_folder_prefixes = [prefix['Prefix'] for prefix in response['CommonPrefixes']]
-        subfolder = s3_prefix.split('/')[-2]
-
-        for s3_folder_prefix in tqdm(s3_folder_prefixes):
-            folder_name = s3_folder_prefix.split('/')[-2] # Extract folder name
-            local_folder_path = os.path.join(local_base_dir, subfolder, folder_name)
-            os.makedirs(local_folder_path, exist_ok=True)
-            downloaded_folders.append(local_folder_path)
-
-            # Download files within the folder
-            objects_in_folder = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=s3_folder_prefix)
-            if 'Contents' in objects_in_folder:
-                for obj in objects_in_folder['Contents']:
-                    s3_key = obj['Key']
-                    local_file_path = os.path.join(local_folder_path, os.path.basename(s3_key))
-                    try:
-                        s3_client.download_file(bucket_name, s3_key, local_file_path)
-                    except Exception as e:
-                        print(f"Error downloading {s3_key}: {e}")
-            
-            else:
-                print(f"No files found in {s3_folder_prefix}")
-
-    except ClientError as e:
-        print(f"Error accessing S3: {e}")
-        return []
-
-    return downloaded_folders
+    record = parse_log_file(file_path)
+    if record is None:
+        return None
+    return is_success(record.score)
 
-def analyze_json_file(file_path):
+def folder_success(folder_path, records, num_agents=2):
     """
-    Analyzes a single JSON file to extract the task outcome.
+    Decides whether a task folder succeeded from the records of its agent logs.
 
     Args:
-        file_path (str): Path to the JSON file.
+        folder_path (str): Path of the task folder.
+        records (list or None): RunRecords of the folder, None if it has no JSON files.
+        num_agents (int): Number of agent logs the folder must hold.
 
     Returns:
-        str or None: The task outcome string if found, otherwise None.
+        bool or None: True if any agent reported success, None if the folder has no logs.
     """
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            if 'turns' in data and isinstance(data['turns'], list):
-                for turn in reversed(data['turns']):  # Check turns from the end
-                    if turn.get('role') == 'system' and isinstance(turn.get('content'), str):
-                        if "Task successful ended with code : 2" in turn['content'] or "Task ended with score : 1" in turn["content"] or "Task ended in score: 1" in turn["content"]:
-                            return True
-        return False
-    except FileNotFoundError:
-        print(f"Error: File not found: {file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON format in: {file_path}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred while processing {file_path}: {e}")
-        return None
-
-def extract_result(folder_path):
     folder_name = os.path.basename(folder_path)
-    json_files = glob.glob(os.path.join(folder_path, "*.json"))
-    assert len(json_files) == 2, f"Expected 2 json files in {folder_name}, found {len(json_files)}"
-
-    if not json_files:
+    if records is None:
         print(f"No JSON files found in {folder_name}")
         return None
-    else: 
-        outcome = False
-        for json_file in json_files:
-            outcome = analyze_json_file(json_file)
-            if outcome:
-                return True
-        return False
+    assert len(records) == num_agents, f"Expected {num_agents} json files in {folder_name}, found {len(records)}"
+    return any(is_success(record.score) for record in records)
+
+def extract_result(folder_path):
+    return folder_success(folder_path, ingest_folders([folder_path])[folder_path])
     
 def is_base(folder_path):
-    return "full_plan" in folder_path and "depth_0" in folder_path and "missing" not in folder_path
+    task = parse_task_id(os.path.basename(os.path.normpath(folder_path)))
+    return task.plan == "full_plan" and task.depth == 0 and not task.missing
 
 def base_without_plan(folder_path):
-    return "no_plan" in folder_path and "depth_0" in folder_path and "missing" in folder_path
+    task = parse_task_id(os.path.basename(os.path.normpath(folder_path)))
+    return task.plan == "no_plan" and task.depth == 0 and task.missing
 
 def aggregate_results(local_folders):
     """
@@ -130,92 +68,30 @@ def aggregate_results(local_folders):
         local_folders (list): List of local folder paths containing the JSON files.
 
     Returns:
-        dict: A dictionary where keys are folder names and values are the aggregated outcomes.
+        dict: Totals, successes and success rates overall and per slice (base, plan type, ...).
     """
-    aggregated_data = {}
-
-    total = 0
-    successful = 0
-
-    base_successful = 0
-    base_total = 0
-
-    base_no_plan_successful = 0
-    base_no_plan_total = 0
-
-    missing_successful = 0
-    missing_total = 0
-
-    full_plan_successful = 0
-    full_plan_total = 0
-
-    partial_plan_successful = 0
-    partial_plan_total = 0
-
-    no_plan_successful = 0
-    no_plan_total = 0
-
-    high_depth_successful = 0
-    high_depth_total = 0
-    for folder_path in tqdm(local_folders):
-        folder_name = os.path.basename(folder_path)
-
-        try: 
-            total += 1
-            result = extract_result(folder_path)
-            success = int(extract_result(folder_path))
-            successful += success
-
-            if "missing" in folder_path and not is_base(folder_path):
-                missing_successful += success
-                missing_total += 1
-            if is_base(folder_path):
-                base_successful += success
-                base_total += 1
-            if base_without_plan(folder_path):
-                base_no_plan_successful += success
-                base_no_plan_total += 1
-            if "full_plan" in folder_path and not is_base(folder_path):
-                full_plan_successful += success
-                full_plan_total += 1
-            if "partial_plan" in folder_path and not is_base(folder_path):
-                partial_plan_successful += success
-                partial_plan_total += 1
-            if "no_plan" in folder_path and not is_base(folder_path):
-                no_plan_successful += success
-                no_plan_total += 1
-            if "depth_1" in folder_path or "depth_2" in folder_path and not is_base(folder_path):
-                high_depth_successful += success
-                high_depth_total += 1
-        except Exception as e:
-            print(f"Error processing {folder_name}: {e}")
-    
-    return {
-        "total": total,
-        "successful": successful,
-        "success_rate": successful / total if total > 0 else 0,
-        "base_total": base_total,
-        "base_successful": base_successful,
-        "base_success_rate": base_successful / base_total if base_total > 0 else 0,
-        "base_no_plan_total": base_no_plan_total,
-        "base_no_plan_successful": base_no_plan_successful,
-        "base_no_plan_success_rate": base_no_plan_successful / base_no_plan_total if base_no_plan_total > 0 else 0,
-        "missing_total": missing_total,
-        "missing_successful": missing_successful,
-        "missing_success_rate": missing_successful / missing_total if missing_total > 0 else 0,
-        "full_plan_total": full_plan_total,
-        "full_plan_successful": full_plan_successful,
-        "full_plan_success_rate": full_plan_successful / full_plan_total if full_plan_total > 0 else 0,
-        "partial_plan_total": partial_plan_total,
-        "partial_plan_successful": partial_plan_successful,
-        "partial_plan_success_rate": partial_plan_successful / partial_plan_total if partial_plan_total > 0 else 0,
-        "no_plan_total": no_plan_total,
-        "no_plan_successful": no_plan_successful,
-        "no_plan_success_rate": no_plan_successful / no_plan_total if no_plan_total > 0 else 0,
-        "high_depth_total": high_depth_total,
-        "high_depth_successful": high_depth_successful,
-        "high_depth_success_rate": high_depth_successful / high_depth_total if high_depth_total > 0 else 0
-    }
+    folder_records = ingest_folders(local_folders)
+    folders = folder_frame(build_runs_frame(folder_records))
+    for folder in folders.loc[folders["num_logs"] != 2, "task_id"]:
+        print(f"Error processing {folder}: expected 2 json files")
+
+    # Folders without exactly two readable logs count towards the total only
+    valid = folders["num_logs"] == 2
+    folders["success"] &= valid
+    depth = folders["depth"]
+    plan = folders["plan"]
+    missing = folders["missing"]
+    base = (plan == "full_plan") & depth.isin([0]) & ~missing
+    return success_summary(folders, {
+        "": pd.Series(True, index=folders.index),
+        "base": valid & base,
+        "base_no_plan": valid & (plan == "no_plan") & depth.isin([0]) & missing,
+        "missing": valid & missing & ~base,
+        "full_plan": valid & (plan == "full_plan") & ~base,
+        "partial_plan": valid & (plan == "partial_plan") & ~base,
+        "no_plan": valid & (plan == "no_plan") & ~base,
+        "high_depth": valid & depth.isin([1, 2]),
+    })
 
 def get_immediate_subdirectories(a_dir):
     # Ensure a_dir is relative to project root if not absolute
@@ -1,12 +1,13 @@
 import os
-import json
 from collections import defaultdict
 from prettytable import PrettyTable
-import re
 import argparse
 import pandas as pd
 import glob
 
+from comparison_stats import format_interval
+from experiment_comparison import ExperimentComparison
+
 # Calculate project root directory
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Define output directory for analysis results
@@ -14,87 +15,56 @@ analysis_output_dir = os.path.join(project_root, "experiments", "analysis_result
 # Ensure the output directory exists
 os.makedirs(analysis_output_dir, exist_ok=True)
 
-def extract_success_scores(folders, model_names):
+def extract_success_scores(folders, model_names, stats=True):
+    """
+    Prints the construction score tables of several models.
+
+    Args:
+        folders (list): Experiment folder of each model.
+        model_names (list): Model names, in the same order.
+        stats (bool): Also print bootstrap confidence intervals and permutation p-values
+            (against the first model) next to every table.
+    """
     assert len(folders) == len(model_names), "Folders and model names lists must have the same length."
     
-    all_task_scores = defaultdict(dict)  # Stores task-wise scores per model
-    zero_score_tasks = defaultdict(list)  # Stores tasks with 0 score per model
-    material_groups = defaultdict(lambda: defaultdict(list))
-    room_groups = defaultdict(lambda: defaultdict(list))
-    material_room_groups = defaultdict(lambda: defaultdict(list))
-    overall_scores = defaultdict(list)  # New dict to store all scores for each model
-    skipped_tasks = defaultdict(list)  # Stores tasks with no score message per model
+    # Scan the logs of every model in one pass; all tables below come from the task x model matrix.
+    # A task's score is that of the first agent log with a score, as before.
+    comparison = ExperimentComparison.load(dict(zip(model_names, folders)), score_column="first_score")
+    results = comparison.folders
     
-    pattern = re.compile(r"materials_(\d+)_rooms_(\d+)")
+    for task_folder in results.loc[~results["has_logs"], "task_id"]:
+        print(f"No log files found in {task_folder}")
+    # Score not found but logs exist - skip these tasks
+    skipped = results[results["has_logs"] & ~results["score_found"]]
+    for task_folder, model_name in zip(skipped["task_id"], skipped["model"]):
+        print(f"Error: No score message found for task '{task_folder}' with model '{model_name}'. Skipping this task.")
+    scored = results[results["score_found"]]
     
-    for root_dir, model_name in zip(folders, model_names):
-        for task_folder in os.listdir(root_dir):
-            task_path = os.path.join(root_dir, task_folder)
-            if os.path.isdir(task_path):
-                logs_found = False
-                score_found = False
-                
-                for file_name in os.listdir(task_path):
-                    if file_name.endswith(".json"): 
-                        logs_found = True
-                        file_path = os.path.join(task_path, file_name)
-                        
-                        try:
-                            with open(file_path, 'r') as file:
-                                data = json.load(file)
-                                
-                                for turn in reversed(data.get("turns", [])):
-                                    if turn["role"] == "system" and "Task ended with score" in turn["content"]:
-                                        score = float(turn["content"].split(":")[-1].strip())
-                                        all_task_scores[task_folder][model_name] = score
-                                        overall_scores[model_name].append(score)  # Add to overall scores
-                                        score_found = True
-                                        
-                                        if score == 0:
-                                            zero_score_tasks[model_name].append(task_folder)
-                                        break 
-                                
-                            if score_found:
-                                break 
-                        except Exception as e:
-                            print(f"Error reading {file_path}: {e}")
-                
-                if logs_found and not score_found:
-                    # Score not found but logs exist - skip this task
-                    skipped_tasks[model_name].append(task_folder)
-                    print(f"Error: No score message found for task '{task_folder}' with model '{model_name}'. Skipping this task.")
-                
-                if not logs_found:
-                    print(f"No log files found in {task_folder}")
+    all_task_scores = defaultdict(dict)  # Stores task-wise scores per model
+    for task_folder, model_scores in comparison.scores.iterrows():
+        all_task_scores[task_folder] = {model_name: float(score)
+                                        for model_name, score in model_scores.dropna().items()}
+    zero_score_tasks = defaultdict(list, scored[scored["first_score"] == 0].groupby("model")["task_id"].agg(list).to_dict())
+    skipped_tasks = defaultdict(list, skipped.groupby("model")["task_id"].agg(list).to_dict())
+    overall_scores = defaultdict(list, scored.groupby("model")["first_score"].agg(list).to_dict())
     
     # Calculate model completion rates (only consider tasks with scores)
-    model_completion_rates = {}
-    for model_name in model_names:
-        valid_tasks = [task for task in all_task_scores.keys() if model_name in all_task_scores[task]]
-        total_tasks = len(valid_tasks)
-        completed_tasks = len([task for task in valid_tasks if all_task_scores[task][model_name] > 0])
-        model_completion_rates[model_name] = (completed_tasks / total_tasks) if total_tasks > 0 else 0
+    completion = scored.assign(completed=scored["first_score"] > 0).groupby("model")["completed"].mean()
+    model_completion_rates = {model_name: completion.get(model_name, 0) for model_name in model_names}
     
-    # Process task scores into groups (ignore 0 scores)
-    for task, model_scores in all_task_scores.items():
-        match = pattern.search(task)
-        if match:
-            material = int(match.group(1))
-            room = int(match.group(2))
-            
-            for model, score in model_scores.items():
-                if score > 0:  # Ignore 0 scores
-                    material_groups[material][model].append(score)
-                    room_groups[room][model].append(score)
-                    material_room_groups[(material, room)][model].append(score)
+    # Average scores by materials and rooms (ignore 0 scores and tasks without these attributes)
+    positive = comparison.scores > 0
     
-    def calculate_average(group):
-        return {key: {model: sum(scores) / len(scores) for model, scores in models.items() if scores} 
-                for key, models in group.items() if models}
+    def calculate_average(keys):
+        averages = defaultdict(dict)
+        for key, model_scores in comparison.table("score", by=keys, where=positive).iterrows():
+            key = tuple(int(k) for k in key) if len(keys) > 1 else int(key)
+            averages[key] = model_scores.dropna().to_dict()
+        return averages
     
-    avg_material_scores = calculate_average(material_groups)
-    avg_room_scores = calculate_average(room_groups)
-    avg_material_room_scores = calculate_average(material_room_groups)
+    avg_material_scores = calculate_average(["materials"])
+    avg_room_scores = calculate_average(["rooms"])
+    avg_material_room_scores = calculate_average(["materials", "rooms"])
     
     def display_table(title, data, tuple_keys=False):
         table = PrettyTable(["Category"] + model_names)
@@ -176,12 +146,31 @@ def extract_success_scores(folders, model_names):
         print("\nOverall Performance Metrics")
         print(table)
     
+    def display_comparison(title, where=None, keys=None):
+        if not stats:
+            return
+        intervals = comparison.compare(by=keys, where=where)
+        table = PrettyTable(["Category"] + model_names)
+        groups = intervals.groupby(keys, sort=True) if keys else [(("All Tasks",), intervals)]
+        for key, rows in groups:
+            key = tuple(k if isinstance(k, str) else int(k) for k in key)
+            key = key[0] if len(key) == 1 else f"({', '.join(map(str, key))})"
+            cells = {row.model: format_interval(row.mean, row.ci_low, row.ci_high, row.p_value)
+                     for row in rows.itertuples()}
+            table.add_row([key] + [cells[model] for model in model_names])
+        print(f"\n{title} (mean [95% CI], p vs {model_names[0]})")
+        print(table)
+    
     display_overall_averages()  # Display overall averages first
+    display_comparison("Average Score (All Tasks)")
     display_task_scores()
     display_zero_and_skipped_tasks()
     display_table("Average Success Score by Material", avg_material_scores)
+    display_comparison("Average Success Score by Material", positive, ["materials"])
     display_table("Average Success Score by Room", avg_room_scores)
+    display_comparison("Average Success Score by Room", positive, ["rooms"])
     display_table("Average Success Score by (Material, Room) Tuples", avg_material_room_scores, tuple_keys=True)
+    display_comparison("Average Success Score by (Material, Room) Tuples", positive, ["materials", "rooms"])
 
 
 def main():
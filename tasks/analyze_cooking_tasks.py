@@ -1,12 +1,16 @@
 import os
-import json
-import re
 from collections import defaultdict
 from prettytable import PrettyTable
 import pandas as pd
 import glob
 import argparse
 
+from log_ingestion import ingest_folders
+from task_ids import parse_task_id
+from results_store import build_runs_frame, folder_frame, success_table
+from comparison_stats import format_interval
+from experiment_comparison import ExperimentComparison
+
 # Calculate project root directory
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Define output directory for analysis results
@@ -16,113 +20,42 @@ os.makedirs(analysis_output_dir, exist_ok=True)
 
 def extract_cooking_items(exp_dir):
     """Extract cooking items from experiment directory name."""
-    # Remove prefix and blocked access part
-    clean_name = re.sub(r'^multiagent_cooking_', '', exp_dir)
-    clean_name = re.sub(r'_blocked_access_[0-9_]+$', '', clean_name)
-    
-    # Extract individual items
-    items = []
-    for item_match in re.finditer(r'([0-9]+)_([a-zA-Z_]+)', clean_name):
-        count = int(item_match.group(1))
-        item = item_match.group(2)
-        # Remove trailing underscores to fix the item name issue
-        item = item.rstrip('_')
-        items.append(item)
-    
-    return items
+    return list(parse_task_id(exp_dir).items)
+
+def cooking_folder_frame(root_dir):
+    """Per-folder results of every multiagent_cooking_* experiment in root_dir, see results_store.folder_frame."""
+    experiment_dirs = [d for d in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, d)) 
+                      and d.startswith("multiagent_cooking_")]
+    # Parse every agent log of every experiment in one pass
+    exp_records = ingest_folders([os.path.join(root_dir, d) for d in experiment_dirs])
+    return folder_frame(build_runs_frame(exp_records))
+
+def counts_by(table, key_fn=lambda key: key):
+    """Turns a results_store.success_table into {key: {"success", "total"}} counters."""
+    counts = defaultdict(lambda: {"success": 0, "total": 0})
+    for key, row in table.iterrows():
+        counts[key_fn(key)] = {"success": int(row["successful"]), "total": int(row["total"])}
+    return counts
+
+# Headers of the columns the comparison tables can be grouped by
+COLUMN_LABELS = {"num_blocked": "Blocked Agents", "items": "Cooking Item"}
+
+def blocked_key(num_blocked):
+    return f"{num_blocked} agent(s)"
 
 def analyze_experiments(root_dir, model_name):
-    # Store results by number of blocked agents
-    blocked_access_results = defaultdict(lambda: {
-        "success": 0, 
-        "total": 0
-    })
-    
-    # Store results by cooking item
-    cooking_item_results = defaultdict(lambda: {
-        "success": 0,
-        "total": 0
-    })
+    folders = cooking_folder_frame(root_dir)
     
     # Keep track of all unique cooking items
-    all_cooking_items = set()
+    all_cooking_items = set(folders["items"].explode().dropna())
     
-    # Keep track of ignored tasks
-    ignored_tasks = []
+    # If no score information was found in any agent file, ignore this task
+    ignored_tasks = list(folders.loc[~folders["score_found"], "task_id"])
+    scored = folders[folders["score_found"]]
     
-    # Get a list of all experiment directories
-    experiment_dirs = [d for d in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, d)) 
-                      and d.startswith("multiagent_cooking_")]
-    
-    for exp_dir in experiment_dirs:
-        # Extract cooking items
-        cooking_items = extract_cooking_items(exp_dir)
-        
-        # Add to unique items set
-        all_cooking_items.update(cooking_items)
-        
-        # Extract blocked access information from directory name
-        blocked_access_match = re.search(r'blocked_access_([0-9_]+)$', exp_dir)
-        
-        if blocked_access_match:
-            blocked_access_str = blocked_access_match.group(1)
-            # Count how many agents have blocked access
-            num_blocked_agents = len(blocked_access_str.split('_'))
-            blocked_key = f"{num_blocked_agents} agent(s)"
-        else:
-            # No agents blocked
-            blocked_key = "0 agent(s)"
-        
-        # Check if the task was successful
-        is_successful = False
-        score_found = False
-        full_exp_path = os.path.join(root_dir, exp_dir)
-        
-        # Get all JSON files in the experiment directory
-        agent_files = [f for f in os.listdir(full_exp_path) if f.endswith(".json")]
-        
-        # Check each agent file for success information
-        for agent_file in agent_files:
-            agent_file_path = os.path.join(full_exp_path, agent_file)
-            
-            try:
-                with open(agent_file_path, 'r') as f:
-                    agent_data = json.load(f)
-                    
-                # Check for score information in the turns data
-                if "turns" in agent_data:
-                    for turn in agent_data["turns"]:
-                        if turn.get("role") == "system" and "content" in turn:
-                            if isinstance(turn["content"], str) and "Task ended with score : " in turn["content"]:
-                                score_found = True
-                                if "Task ended with score : 1" in turn["content"]:
-                                    is_successful = True
-                                    break
-                
-                # If we found success, no need to check other files
-                if is_successful:
-                    break
-                    
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Error reading {agent_file_path}: {e}")
-                # Continue to check other agent files instead of failing
-                continue
-        
-        # If no score information was found in any agent file, ignore this task
-        if not score_found:
-            ignored_tasks.append(exp_dir)
-            continue
-        
-        # Update cooking item results
-        for item in cooking_items:
-            cooking_item_results[item]["total"] += 1
-            if is_successful:
-                cooking_item_results[item]["success"] += 1
-        
-        # Update the blocked access counters
-        blocked_access_results[blocked_key]["total"] += 1
-        if is_successful:
-            blocked_access_results[blocked_key]["success"] += 1
+    # Results by number of blocked agents and by cooking item
+    blocked_access_results = counts_by(success_table(scored, "num_blocked"), blocked_key)
+    cooking_item_results = counts_by(success_table(scored.explode("items").dropna(subset=["items"]), "items"))
     
     # Print information about ignored tasks
     if ignored_tasks:
@@ -307,65 +240,91 @@ def print_model_comparison_items_by_blocked(models_data, all_cooking_items):
         table.add_row(overall_row)
         print(table)
 
+def load_cooking_comparison(experiments, model_names=None):
+    """Scans the multiagent_cooking_* folders of several experiments in one pass, see ExperimentComparison.load."""
+    return ExperimentComparison.load(experiments, model_names, task_prefix="multiagent_cooking_")
+
+def matrix_counts(comparison, by, key_fn=lambda key: key):
+    """{model: {key: {"success", "total"}}} counters per group of tasks, taken from the success matrix."""
+    successes = comparison.table("success", by=by, agg="sum")
+    totals = comparison.table("success", by=by, agg="count")
+    counts = {}
+    for model_name in comparison.models:
+        counts[model_name] = defaultdict(lambda: {"success": 0, "total": 0})
+        for key, total in totals[model_name].items():
+            if total > 0:
+                counts[model_name][key_fn(key)] = {"success": int(successes.at[key, model_name]), "total": int(total)}
+    return counts
+
+def analyze_models(comparison):
+    """
+    Results of every model for the print_model_comparison_* functions, without reading the logs again.
+
+    Args:
+        comparison (ExperimentComparison): Cooking experiments, see load_cooking_comparison.
+
+    Returns:
+        tuple: (models_results, models_item_results, all_cooking_items, models_data) where models_data
+            maps each model to (blocked_access_results, cooking_item_results, item_blocked_data).
+    """
+    all_cooking_items = set(comparison.folders["items"].explode().dropna())
+    models_results = matrix_counts(comparison, ["num_blocked"], blocked_key)
+    models_item_results = matrix_counts(comparison, ["items"])
+    models_item_blocked = matrix_counts(comparison, ["items", "num_blocked"],
+                                        lambda key: (key[0], blocked_key(key[1])))
+
+    models_data = {}
+    for model_name in comparison.models:
+        item_blocked_data = defaultdict(lambda: defaultdict(lambda: {"success": 0, "total": 0}))
+        for (item, blocked), counts in models_item_blocked[model_name].items():
+            item_blocked_data[item][blocked] = counts
+        models_data[model_name] = (models_results[model_name], models_item_results[model_name], item_blocked_data)
+    return models_results, models_item_results, all_cooking_items, models_data
+
+def print_model_comparison_stats(comparison, by):
+    """
+    Success rates with bootstrap confidence intervals and paired permutation p-values.
+
+    Args:
+        comparison (ExperimentComparison): Cooking experiments, see load_cooking_comparison.
+        by (list): Columns to compare by, any of "num_blocked" and "items"; empty for overall.
+    """
+    model_names = comparison.models
+    results = comparison.compare(by=by, value="success")
+
+    labels = [COLUMN_LABELS.get(column, column) for column in by]
+    print(f"\nModel Comparison by {' and '.join(labels) or 'All Tasks'} (Success Rate % [95% CI], p vs {model_names[0]}):")
+    print("=" * 100)
+    table = PrettyTable()
+    table.field_names = [" / ".join(labels) or "Tasks"] + model_names
+    groups = results.groupby(by, sort=True) if by else [(("Overall",), results)]
+    for key, rows in groups:
+        key = " / ".join(blocked_key(k) if column == "num_blocked" else str(k) for column, k in zip(by or [None], key))
+        cells = {row.model: format_interval(row.mean, row.ci_low, row.ci_high, row.p_value, scale=100)
+                 for row in rows.itertuples()}
+        table.add_row([key] + [cells[model_name] for model_name in model_names])
+    print(table)
+
+def print_model_comparisons(comparison):
+    """Prints the count tables and the confidence-interval tables of every model of a comparison."""
+    models_results, models_item_results, all_cooking_items, models_data = analyze_models(comparison)
+    print_model_comparison_blocked(models_results)
+    print_model_comparison_items(models_item_results, all_cooking_items)
+    print_model_comparison_items_by_blocked(models_data, all_cooking_items)
+    for by in ([], ["num_blocked"], ["items"]):
+        print_model_comparison_stats(comparison, by)
+
 def generate_item_blocked_data(experiments_root):
-    # Organize data by item and blocked agent count
-    item_blocked_data = defaultdict(lambda: defaultdict(lambda: {"success": 0, "total": 0}))
+    folders = cooking_folder_frame(experiments_root)
     
-    # Keep track of ignored tasks
-    ignored_tasks = []
+    # Tasks without score information are skipped
+    ignored_tasks = list(folders.loc[~folders["score_found"], "task_id"])
+    scored = folders[folders["score_found"]].explode("items").dropna(subset=["items"])
     
-    # Populate the data structure
-    for exp_dir in os.listdir(experiments_root):
-        if not os.path.isdir(os.path.join(experiments_root, exp_dir)) or not exp_dir.startswith("multiagent_cooking_"):
-            continue
-        
-        # Extract cooking items
-        cooking_items = extract_cooking_items(exp_dir)
-        
-        # Extract blocked access information
-        blocked_access_match = re.search(r'blocked_access_([0-9_]+)$', exp_dir)
-        if blocked_access_match:
-            blocked_access_str = blocked_access_match.group(1)
-            num_blocked_agents = len(blocked_access_str.split('_'))
-            blocked_key = f"{num_blocked_agents} agent(s)"
-        else:
-            blocked_key = "0 agent(s)"
-        
-        # Check if the task was successful and if score information exists
-        is_successful = False
-        score_found = False
-        full_exp_path = os.path.join(experiments_root, exp_dir)
-        agent_files = [f for f in os.listdir(full_exp_path) if f.endswith(".json")]
-        
-        for agent_file in agent_files:
-            try:
-                with open(os.path.join(full_exp_path, agent_file), 'r') as f:
-                    agent_data = json.load(f)
-                    
-                if "turns" in agent_data:
-                    for turn in agent_data["turns"]:
-                        if turn.get("role") == "system" and "content" in turn:
-                            if isinstance(turn["content"], str) and "Task ended with score : " in turn["content"]:
-                                score_found = True
-                                if "Task ended with score : 1" in turn["content"]:
-                                    is_successful = True
-                                    break
-                
-                if is_successful:
-                    break
-            except:
-                continue
-        
-        # If no score information was found, skip this task
-        if not score_found:
-            ignored_tasks.append(exp_dir)
-            continue
-            
-        # Update the item-blocked data
-        for item in cooking_items:
-            item_blocked_data[item][blocked_key]["total"] += 1
-            if is_successful:
-                item_blocked_data[item][blocked_key]["success"] += 1
+    # Organize data by item and blocked agent count
+    item_blocked_data = defaultdict(lambda: defaultdict(lambda: {"success": 0, "total": 0}))
+    for (item, num_blocked), row in success_table(scored, ["items", "num_blocked"]).iterrows():
+        item_blocked_data[item][blocked_key(num_blocked)] = {"success": int(row["successful"]), "total": int(row["total"])}
     
     return item_blocked_data, ignored_tasks
 
@@ -384,8 +343,16 @@ def main():
     # Removed --output_file argument
     # parser.add_argument('--output_file', type=str, default='cooking_analysis_results.csv', 
     #                     help='Output CSV file name (relative to project root)')
+    parser.add_argument('--experiments', type=str, default=None,
+                        help='Glob of experiment folders or a JSON manifest of them; compares their models')
+    parser.add_argument('--model_names', nargs='+', default=None,
+                        help='Names of the experiments, in glob order')
     args = parser.parse_args()
 
+    if args.experiments:
+        print_model_comparisons(load_cooking_comparison(args.experiments, args.model_names))
+        return
+
     # Resolve log_dir path relative to project root
     log_dir_abs = args.log_dir
     if not os.path.isabs(log_dir_abs):
@@ -1,12 +1,11 @@
-import boto3
 import os
-import json
 import re
-from botocore.exceptions import ClientError
-import json
 import argparse
-from tqdm import tqdm
-import glob
+
+from s3_transfer import download_s3_folders
+from log_ingestion import parse_log_file, ingest_folders, is_success
+from task_ids import parse_task_id
+from results_store import build_runs_frame, folder_frame, success_summary, save_runs
 from prettytable import PrettyTable
 import pandas as pd
 
@@ -17,239 +16,91 @@ analysis_output_dir = os.path.join(project_root, "experiments", "analysis_result
 # Ensure the output directory exists
 os.makedirs(analysis_output_dir, exist_ok=True)
 
-def download_s3_folders(bucket_name, s3_prefix, local_base_dir):
+def analyze_json_file(file_path):
     """
-    Downloads groups of folders from S3 based on the next level of prefixes.
+    Analyzes a single JSON file to extract the task outcome.
 
     Args:
-        bucket_name (str): Name of the S3 bucket.
-        s3_prefix (str): Prefix where the folders are located (e.g., 'my-experiments/').
-        local_base_dir (str): Local directory to download the folders to.
+        file_path (str): Path to the JSON file.
 
     Returns:
-        list: List of downloaded local folder paths.
+        bool: True if task was successful, False otherwise. None if the file could not be read.
     """
-    s3_client = boto3.client('s3')
-    downloaded_folders = []
-
-    # Ensure local_base_dir is relative to project root if not absolute
-    if not os.path.isabs(local_base_dir):
-        local_base_dir = os.path.join(project_root, local_base_dir)
-
-    try:
-        # List objects with the prefix, delimited by '/' to find sub-prefixes (folders)
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=s3_prefix, Delimiter='/')
-
-        if 'CommonPrefixes' not in response:
-            print(f"No folders found under s3://{bucket_name}/{s3_prefix}")
-            return downloaded_folders
-
-        s3_folder_prefixes = [prefix['Prefix'] for prefix in response['CommonPrefixes']]
-        subfolder = s3_prefix.split('/')[-2]
-
-        for s3_folder_prefix in tqdm(s3_folder_prefixes):
-            folder_name = s3_folder_prefix.split('/')[-2] # Extract folder name
-            local_folder_path = os.path.join(local_base_dir, subfolder, folder_name)
-            os.makedirs(local_folder_path, exist_ok=True)
-            downloaded_folders.append(local_folder_path)
-
-            # Download files within the folder
-            objects_in_folder = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=s3_folder_prefix)
-            if 'Contents' in objects_in_folder:
-                for obj in objects_in_folder['Contents']:
-                    s3_key = obj['Key']
-                    local_file_path = os.path.join(local_folder_path, os.path.basename(s3_key))
-                    try:
-                        s3_client.download_file(bucket_name, s3_key, local_file_path)
-                    except Exception as e:
-                        print(f"Error downloading {s3_key}: {e}")
-            
-            else:
-                print(f"No files found in {s3_folder_prefix}")
-
-    except ClientError as e:
-        print(f"Error accessing S3: {e}")
-        return []
-
-    return downloaded_folders
+    record = parse_log_file(file_path)
+    if record is None:
+        return None
+    return is_success(record.score)
 
-def analyze_json_file(file_path):
+def folder_success(folder_path, records):
     """
-    Analyzes a single JSON file to extract the task outcome.
+    Decides whether a task folder succeeded from the records of its agent logs.
 
     Args:
-        file_path (str): Path to the JSON file.
+        folder_path (str): Path of the task folder.
+        records (list or None): RunRecords of the folder, None if it has no JSON files.
 
     Returns:
-        bool: True if task was successful, False otherwise.
+        bool or None: True if any agent reported success, None if the folder has no logs.
     """
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            if 'turns' in data and isinstance(data['turns'], list):
-                for turn in data['turns']:  # Check all turns, not just from the end
-                    if turn.get('role') == 'system' and isinstance(turn.get('content'), str):
-                        if "Task successful ended with code : 2" in turn['content'] or "Task ended with score : 1" in turn["content"] or "Task ended in score: 1" in turn["content"]:
-                            # print(f"Success found in {file_path}")
-                            return True
-        return False
-    except FileNotFoundError:
-        print(f"Error: File not found: {file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON format in: {file_path}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred while processing {file_path}: {e}")
-        return None
-
-def extract_result(folder_path):
     folder_name = os.path.basename(folder_path)
-    json_files = glob.glob(os.path.join(folder_path, "*.json"))
-    
-    if not json_files:
+    if records is None:
         print(f"No JSON files found in {folder_name}")
         return None
-    else: 
-        # Check each JSON file in the folder for success indication
-        for json_file in json_files:
-            outcome = analyze_json_file(json_file)
-            if outcome:  # If any file indicates success, return True
-                return True
-        return False  # Return False only if no files indicate success
+    return any(is_success(record.score) for record in records)
+
+def extract_result(folder_path):
+    return folder_success(folder_path, ingest_folders([folder_path])[folder_path])
     
 def is_base(folder_path):
-    return "full_plan" in folder_path and "depth_0" in folder_path and "missing" not in folder_path
+    task = parse_task_id(os.path.basename(os.path.normpath(folder_path)))
+    return task.plan == "full_plan" and task.depth == 0 and not task.missing
 
 def base_without_plan(folder_path):
-    return "no_plan" in folder_path and "depth_0" in folder_path and "missing" in folder_path
-
-def aggregate_results(local_folders):
+    task = parse_task_id(os.path.basename(os.path.normpath(folder_path)))
+    return task.plan == "no_plan" and task.depth == 0 and task.missing
+
+def build_results_frame(local_folders):
+    """Parses the agent logs of local_folders into the per-run frame of results_store."""
+    folder_records = ingest_folders(local_folders)
+    for folder_path, records in folder_records.items():
+        if records is None:
+            print(f"No JSON files found in {os.path.basename(folder_path)}")
+    return build_runs_frame(folder_records)
+
+def aggregate_results(local_folders, runs=None):
     """
     Aggregates the analysis results for each folder.
 
     Args:
         local_folders (list): List of local folder paths containing the JSON files.
+        runs (pd.DataFrame): Per-run frame of local_folders, built with build_results_frame if not given.
 
     Returns:
-        dict: A dictionary where keys are folder names and values are the aggregated outcomes.
+        dict: Totals, successes and success rates overall and per slice (base, plan type, depth, ...).
     """
-    aggregated_data = {}
-
-    total = 0
-    successful = 0
-
-    base_successful = 0
-    base_total = 0
-
-    base_no_plan_successful = 0
-    base_no_plan_total = 0
-
-    missing_successful = 0
-    missing_total = 0
-
-    full_plan_successful = 0
-    full_plan_total = 0
-
-    partial_plan_successful = 0
-    partial_plan_total = 0
-
-    no_plan_successful = 0
-    no_plan_total = 0
-
-    high_depth_successful = 0
-    high_depth_total = 0
-    
-    # For depth-based metrics
-    depth_0_successful = 0
-    depth_0_total = 0
-    depth_1_successful = 0
-    depth_1_total = 0
-    depth_2_successful = 0
-    depth_2_total = 0
-    
-    for folder_path in tqdm(local_folders):
-        folder_name = os.path.basename(folder_path)
-
-        try: 
-            total += 1
-            result = extract_result(folder_path)
-            success = int(extract_result(folder_path))
-            successful += success
-
-            print(f"Folder: {folder_name} -> {success}")
-
-            if "missing" in folder_path:
-                missing_successful += success
-                missing_total += 1
-            if is_base(folder_path):
-                base_successful += success
-                base_total += 1
-            if base_without_plan(folder_path):
-                base_no_plan_successful += success
-                base_no_plan_total += 1
-            if "full_plan" in folder_path: 
-                full_plan_successful += success
-                full_plan_total += 1
-            if "partial_plan" in folder_path:
-                partial_plan_successful += success
-                partial_plan_total += 1
-            if "no_plan" in folder_path:
-                no_plan_successful += success
-                no_plan_total += 1
-            if "depth_1" in folder_path or "depth_2" in folder_path:
-                high_depth_successful += success
-                high_depth_total += 1
-                
-            # Collect depth-specific metrics
-            if "depth_0" in folder_path:
-                depth_0_successful += success
-                depth_0_total += 1
-            elif "depth_1" in folder_path:
-                depth_1_successful += success
-                depth_1_total += 1
-            elif "depth_2" in folder_path:
-                depth_2_successful += success
-                depth_2_total += 1
-                
-        except Exception as e:
-            print(f"Error processing {folder_name}: {e}")
-    
-    return {
-        "total": total,
-        "successful": successful,
-        "success_rate": successful / total if total > 0 else 0,
-        "base_total": base_total,
-        "base_successful": base_successful,
-        "base_success_rate": base_successful / base_total if base_total > 0 else 0,
-        "base_no_plan_total": base_no_plan_total,
-        "base_no_plan_successful": base_no_plan_successful,
-        "base_no_plan_success_rate": base_no_plan_successful / base_no_plan_total if base_no_plan_total > 0 else 0,
-        "missing_total": missing_total,
-        "missing_successful": missing_successful,
-        "missing_success_rate": missing_successful / missing_total if missing_total > 0 else 0,
-        "full_plan_total": full_plan_total,
-        "full_plan_successful": full_plan_successful,
-        "full_plan_success_rate": full_plan_successful / full_plan_total if full_plan_total > 0 else 0,
-        "partial_plan_total": partial_plan_total,
-        "partial_plan_successful": partial_plan_successful,
-        "partial_plan_success_rate": partial_plan_successful / partial_plan_total if partial_plan_total > 0 else 0,
-        "no_plan_total": no_plan_total,
-        "no_plan_successful": no_plan_successful,
-        "no_plan_success_rate": no_plan_successful / no_plan_total if no_plan_total > 0 else 0,
-        "high_depth_total": high_depth_total,
-        "high_depth_successful": high_depth_successful,
-        "high_depth_success_rate": high_depth_successful / high_depth_total if high_depth_total > 0 else 0,
-        "depth_0_total": depth_0_total,
-        "depth_0_successful": depth_0_successful,
-        "depth_0_success_rate": depth_0_successful / depth_0_total if depth_0_total > 0 else 0,
-        "depth_1_total": depth_1_total,
-        "depth_1_successful": depth_1_successful,
-        "depth_1_success_rate": depth_1_successful / depth_1_total if depth_1_total > 0 else 0,
-        "depth_2_total": depth_2_total,
-        "depth_2_successful": depth_2_successful,
-        "depth_2_success_rate": depth_2_successful / depth_2_total if depth_2_total > 0 else 0
-    }
+    if runs is None:
+        runs = build_results_frame(local_folders)
+    folders = folder_frame(runs)
+
+    # Folders without logs count towards the total only
+    valid = folders["has_logs"]
+    depth = folders["depth"]
+    plan = folders["plan"]
+    missing = folders["missing"]
+    base = (plan == "full_plan") & depth.isin([0]) & ~missing
+    return success_summary(folders, {
+        "": pd.Series(True, index=folders.index),
+        "base": valid & base,
+        "base_no_plan": valid & (plan == "no_plan") & depth.isin([0]) & missing,
+        "missing": valid & missing,
+        "full_plan": valid & (plan == "full_plan"),
+        "partial_plan": valid & (plan == "partial_plan"),
+        "no_plan": valid & (plan == "no_plan"),
+        "high_depth": valid & depth.isin([1, 2]),
+        "depth_0": valid & depth.isin([0]),
+        "depth_1": valid & depth.isin([1]),
+        "depth_2": valid & depth.isin([2]),
+    })
 
 def get_immediate_subdirectories(a_dir):
     # Ensure a_dir is relative to project root if not absolute
@@ -344,7 +195,8 @@ def main():
         print("No folders found or downloaded. Exiting.")
         exit()
         
-    results = aggregate_results(folders)
+    runs = build_results_frame(folders)
+    results = aggregate_results(folders, runs=runs)
     print(results)
     
     # Create pretty tables
@@ -375,5 +227,8 @@ def main():
     
     print(f"Results saved to {results_file_path} and tables saved to {tables_file_path}")
 
+    # Keep the per-run results for further slicing with pandas
+    save_runs(runs, os.path.join(analysis_output_dir, f"{results_filename_base}_runs.parquet"))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
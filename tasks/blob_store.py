@@ -0,0 +1,227 @@
+import os
+import json
+import gzip
+import shutil
+import fnmatch
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from server_provisioning import file_sha256
+
+"""
+Content-addressed storage for snapshots of the bots/ folder.
+
+Every file is stored once, gzip-compressed, under objects/<first two hex digits>/<sha256>.gz.
+A snapshot is a manifest (manifests/<name>.json) mapping each relative path to the
+hash of its content, so histories and profiles that did not change between runs take
+no extra space, and the original folder layout can be rebuilt from any manifest.
+Hashes of files whose size and mtime match the previous manifest are reused.
+
+Example usage:
+    store = BlobStore("tasks/full_run_logs_2025-04-22")
+    manifest = snapshot(store, "bots", "run_001", include=["Andy_*", "Jill_*"])
+    restore(store, "run_001", "restored/run_001")
+
+    python tasks/blob_store.py restore tasks/full_run_logs_2025-04-22 run_001 restored/run_001
+"""
+
+OBJECTS_DIR = "objects"
+MANIFESTS_DIR = "manifests"
+
+
+class BlobStore:
+    def __init__(self, root):
+        """
+        Args:
+            root (str): Folder of the store; created if missing.
+        """
+        self.root = root
+        os.makedirs(os.path.join(root, OBJECTS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, MANIFESTS_DIR), exist_ok=True)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, OBJECTS_DIR, digest[:2], digest + ".gz")
+
+    def has(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def put_file(self, path, digest=None):
+        """
+        Stores the content of path unless it is already in the store.
+
+        Returns:
+            tuple: (digest, stored), stored is False if the blob already existed.
+        """
+        digest = digest or file_sha256(path)
+        if self.has(digest):
+            return digest, False
+        blob_path = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # Compress into a temporary file and rename it, so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".tmp")
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return digest, True
+
+    def restore_file(self, digest, dest_path):
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        with gzip.open(self.blob_path(digest), 'rb') as src, open(dest_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def manifest_path(self, name):
+        return os.path.join(self.root, MANIFESTS_DIR, name + ".json")
+
+    def load_manifest(self, name):
+        try:
+            with open(self.manifest_path(name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_manifest(self, name, manifest):
+        path = self.manifest_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def manifests(self):
+        """Names of all snapshots in the store."""
+        manifests_dir = os.path.join(self.root, MANIFESTS_DIR)
+        names = []
+        for dir_path, _, file_names in os.walk(manifests_dir):
+            for file_name in file_names:
+                if file_name.endswith(".json"):
+                    rel_path = os.path.relpath(os.path.join(dir_path, file_name), manifests_dir)
+                    names.append(rel_path[:-len(".json")].replace(os.sep, '/'))
+        return sorted(names)
+
+
+def list_files(src_dir, include=None):
+    """
+    '/'-separated relative paths of the files below src_dir.
+
+    Args:
+        include (list): Optional patterns the first path component must match, e.g. ["Andy_*"].
+    """
+    src_dir = os.fspath(src_dir)
+    files = []
+    for dir_path, dir_names, file_names in os.walk(src_dir):
+        if include and dir_path == src_dir:
+            dir_names[:] = [d for d in dir_names if any(fnmatch.fnmatch(d, pattern) for pattern in include)]
+            file_names = [f for f in file_names if any(fnmatch.fnmatch(f, pattern) for pattern in include)]
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            files.append(os.path.relpath(os.path.join(dir_path, file_name), src_dir).replace(os.sep, '/'))
+    return files
+
+
+def snapshot(store, src_dir, name, include=None, previous=None, max_workers=8):
+    """
+    Stores the files of src_dir and records them in the manifest `name`.
+
+    Args:
+        store (BlobStore): Destination store.
+        src_dir (str): Folder to snapshot, e.g. "bots".
+        name (str): Name of the manifest, e.g. "run_001"; may contain '/'.
+        include (list): Patterns of the top-level entries to snapshot, see list_files.
+        previous (dict): Earlier manifest of the same folder; unchanged files keep its hashes.
+        max_workers (int): Files hashed and compressed concurrently.
+
+    Returns:
+        dict: The manifest, with the number of new blobs and their compressed size in "stats".
+    """
+    cached = (previous or {}).get("files", {})
+
+    def store_file(rel_path):
+        path = os.path.join(src_dir, rel_path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return rel_path, None, False
+        entry = cached.get(rel_path)
+        digest = entry["sha256"] if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns else None
+        digest, stored = store.put_file(path, digest)
+        return rel_path, {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                          "mode": st.st_mode & 0o777}, stored
+
+    files = {}
+    new_blobs, new_bytes = 0, 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for rel_path, entry, stored in executor.map(store_file, list_files(src_dir, include)):
+            if entry is None:
+                continue
+            files[rel_path] = entry
+            if stored:
+                new_blobs += 1
+                new_bytes += os.path.getsize(store.blob_path(entry["sha256"]))
+
+    manifest = {
+        "name": name,
+        "source": os.path.abspath(src_dir),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+        "stats": {"files": len(files), "bytes": sum(entry["size"] for entry in files.values()),
+                  "new_blobs": new_blobs, "new_blob_bytes": new_bytes},
+    }
+    store.save_manifest(name, manifest)
+    return manifest
+
+
+def restore(store, name, dest_dir, max_workers=8):
+    """
+    Rebuilds the folder recorded in the manifest `name` under dest_dir.
+
+    Returns:
+        int: Number of files restored.
+    """
+    manifest = store.load_manifest(name)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot named {name} in {store.root}")
+
+    def restore_entry(item):
+        rel_path, entry = item
+        dest_path = os.path.join(dest_dir, *rel_path.split('/'))
+        store.restore_file(entry["sha256"], dest_path)
+        os.chmod(dest_path, entry["mode"])
+        os.utime(dest_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(restore_entry, manifest["files"].items()))
+    return len(manifest["files"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot folders into a content-addressed store and restore them')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    snapshot_parser = subparsers.add_parser('snapshot', help='Store a folder as a new snapshot')
+    snapshot_parser.add_argument('store', help='Folder of the store')
+    snapshot_parser.add_argument('src_dir', help='Folder to snapshot')
+    snapshot_parser.add_argument('name', help='Name of the snapshot')
+    snapshot_parser.add_argument('--include', nargs='*', default=None, help='Patterns of the top-level entries to include')
+    restore_parser = subparsers.add_parser('restore', help='Rebuild a snapshot')
+    restore_parser.add_argument('store', help='Folder of the store')
+    restore_parser.add_argument('name', help='Name of the snapshot')
+    restore_parser.add_argument('dest_dir', help='Folder to rebuild it in')
+    list_parser = subparsers.add_parser('list', help='List the snapshots of a store')
+    list_parser.add_argument('store', help='Folder of the store')
+    args = parser.parse_args()
+
+    store = BlobStore(args.store)
+    if args.action == 'snapshot':
+        print(snapshot(store, args.src_dir, args.name, include=args.include)["stats"])
+    elif args.action == 'restore':
+        print(f"Restored {restore(store, args.name, args.dest_dir)} files to {args.dest_dir}")
+    else:
+        for name in store.manifests():
+            print(name, store.load_manifest(name)["stats"])
+
+if __name__ == "__main__":
+    main()
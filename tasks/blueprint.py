@@ -0,0 +1,196 @@
+import numpy as np
+
+from task_store import TaskStore
+
+"""
+Compact representation of construction blueprints.
+
+In task files a blueprint is {"materials": {...}, "levels": [{"level", "coordinates",
+"placement"}, ...]}, where placement is a list of rows (z) of block names (x), as read by
+Blueprint.checkLevel in src/agent/tasks/construction_tasks.js. Blueprint stores the same
+data as a palette of block names and one (levels x z x x) uint8 array of palette indices
+(uint16 for more than 256 block types), with index 0 always "air". Conversion to and from
+the JSON form is lossless, and counts, volumes, bounding boxes and differences are NumPy
+operations on the index array instead of loops over nested lists of strings.
+
+Example usage:
+    blueprint = Blueprint.from_task(tasks["church_three_agents"])
+    blueprint.material_counts()  # {"oak_planks": 84, "stone_bricks": 120, ...}
+    blueprint.bounding_box()     # ((x0, y0, z0), (x1, y1, z1)) of the non-air blocks
+    blueprint.to_json() == tasks["church_three_agents"]["blueprint"]
+
+    blueprints = load_blueprints("tasks/construction_tasks/custom/tasks.json")
+"""
+
+AIR = "air"
+
+
+class Blueprint:
+    def __init__(self, blocks, palette, coordinates, level_numbers=None, materials=None):
+        """
+        Args:
+            blocks (np.ndarray): (levels x z x x) palette indices.
+            palette (list): Block names; palette[0] must be "air".
+            coordinates (np.ndarray): (levels x 3) world coordinates of the first block of every level.
+            level_numbers (list): The "level" field of every level. Defaults to 0, 1, ...
+            materials (dict): The "materials" field of the blueprint, kept for to_json.
+        """
+        if palette[0] != AIR:
+            raise ValueError(f"palette[0] must be '{AIR}', got '{palette[0]}'")
+        self.blocks = blocks
+        self.palette = list(palette)
+        self.coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 3)
+        self.level_numbers = list(range(len(blocks))) if level_numbers is None else list(level_numbers)
+        self.materials = materials
+        self.palette_index = {name: i for i, name in enumerate(self.palette)}
+
+    @classmethod
+    def from_json(cls, blueprint):
+        """Builds a Blueprint from the JSON form. Every level must have the same rectangular shape."""
+        levels = blueprint["levels"]
+        placements = [level["placement"] for level in levels]
+        shapes = {(len(placement), len(row)) for placement in placements for row in placement}
+        if len(shapes) > 1:
+            raise ValueError(f"Blueprint levels are not of one rectangular shape: {sorted(shapes)}")
+        names = np.array(placements, dtype=str)
+        if names.ndim != 3:
+            names = names.reshape(len(levels), 0, 0)
+
+        palette, indices = np.unique(names, return_inverse=True)
+        palette = palette.tolist()
+        # Keep air at index 0 so that "not air" is simply blocks != 0
+        if AIR in palette:
+            air = palette.index(AIR)
+            order = [air] + [i for i in range(len(palette)) if i != air]
+            palette = [palette[i] for i in order]
+            remap = np.empty(len(order), dtype=np.int64)
+            remap[order] = np.arange(len(order))
+            indices = remap[indices]
+        else:
+            palette = [AIR] + palette
+            indices = indices + 1
+        dtype = np.uint8 if len(palette) <= 256 else np.uint16
+        blocks = indices.reshape(names.shape).astype(dtype)
+
+        coordinates = np.array([level["coordinates"] for level in levels], dtype=np.int64).reshape(-1, 3)
+        return cls(blocks, palette, coordinates, [level["level"] for level in levels], blueprint.get("materials"))
+
+    @classmethod
+    def from_task(cls, task):
+        return cls.from_json(task["blueprint"])
+
+    def to_json(self):
+        """The blueprint in the JSON form of task files."""
+        names = np.array(self.palette, dtype=object)[self.blocks]
+        levels = [{"level": level, "coordinates": coordinates, "placement": placement}
+                  for level, coordinates, placement in zip(self.level_numbers, self.coordinates.tolist(), names.tolist())]
+        blueprint = {} if self.materials is None else {"materials": self.materials}
+        blueprint["levels"] = levels
+        return blueprint
+
+    @property
+    def shape(self):
+        return self.blocks.shape
+
+    @property
+    def num_levels(self):
+        return self.blocks.shape[0]
+
+    def index_of(self, name):
+        """Palette index of a block name, -1 if the blueprint does not use it."""
+        return self.palette_index.get(name, -1)
+
+    def remap(self, palette):
+        """
+        The blocks as indices into another palette, e.g. one shared by many blueprints.
+
+        Args:
+            palette (list or dict): Block names, or a name to index dict. Names missing from it are added.
+
+        Returns:
+            np.ndarray: Array of the same shape as blocks.
+        """
+        palette_index = palette if isinstance(palette, dict) else {name: i for i, name in enumerate(palette)}
+        lookup = np.array([palette_index.setdefault(name, len(palette_index)) for name in self.palette], dtype=np.int64)
+        return lookup[self.blocks]
+
+    def counts(self):
+        """Number of blocks of every palette entry, air included."""
+        return np.bincount(self.blocks.ravel(), minlength=len(self.palette))
+
+    def material_counts(self, include_air=False):
+        """Block name to number of blocks, most frequent first."""
+        counts = self.counts()
+        order = np.argsort(-counts, kind="stable")
+        return {self.palette[i]: int(counts[i]) for i in order
+                if counts[i] > 0 and (include_air or i != 0)}
+
+    def volume(self):
+        """Number of non-air blocks."""
+        return int(np.count_nonzero(self.blocks))
+
+    def level_volumes(self):
+        """Number of non-air blocks of every level."""
+        return np.count_nonzero(self.blocks, axis=(1, 2))
+
+    def world_positions(self, mask=None):
+        """
+        World coordinates of the cells selected by mask (default: every non-air block).
+
+        Returns:
+            np.ndarray: (n x 3) x, y, z coordinates, level by level, row by row.
+        """
+        level, z, x = np.nonzero(self.blocks != 0 if mask is None else mask)
+        start = self.coordinates[level]
+        return np.stack([start[:, 0] + x, start[:, 1], start[:, 2] + z], axis=1)
+
+    def bounding_box(self):
+        """((min_x, min_y, min_z), (max_x, max_y, max_z)) of the non-air blocks, None if there are none."""
+        positions = self.world_positions()
+        if len(positions) == 0:
+            return None
+        return tuple(positions.min(axis=0).tolist()), tuple(positions.max(axis=0).tolist())
+
+    def diff(self, other):
+        """
+        Cells whose block differs from the same cell of another blueprint of the same shape.
+
+        Returns:
+            np.ndarray: Boolean (levels x z x x) mask.
+        """
+        if other.shape != self.shape:
+            raise ValueError(f"Cannot compare blueprints of shapes {self.shape} and {other.shape}")
+        return self.blocks != other.remap(dict(self.palette_index))
+
+    def level_diff(self, other):
+        """Number of differing cells per level, see diff."""
+        return np.count_nonzero(self.diff(other), axis=(1, 2))
+
+    def __eq__(self, other):
+        return (isinstance(other, Blueprint) and self.shape == other.shape
+                and not self.diff(other).any() and np.array_equal(self.coordinates, other.coordinates)
+                and self.level_numbers == other.level_numbers)
+
+    def __repr__(self):
+        return f"Blueprint(levels={self.shape[0]}, z={self.shape[1]}, x={self.shape[2]}, palette={len(self.palette)})"
+
+
+def load_blueprints(task_path, task_ids=None):
+    """
+    Blueprints of the tasks of a task file, decoding only those tasks (see task_store.py).
+
+    Args:
+        task_ids (list): Tasks to load. Defaults to every task with a blueprint.
+
+    Returns:
+        dict: Task id to Blueprint.
+    """
+    tasks = TaskStore(task_path)
+    if task_ids is None:
+        task_ids = [task_id for task_id, meta in tasks.metadata.items() if meta.get("type") == "construction"]
+    blueprints = {}
+    for task_id in task_ids:
+        task = tasks.get(task_id)
+        if "blueprint" in task:
+            blueprints[task_id] = Blueprint.from_task(task)
+    return blueprints
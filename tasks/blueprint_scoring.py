@@ -0,0 +1,218 @@
+import os
+import json
+import glob
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from blueprint import AIR, Blueprint
+from task_store import TaskStore
+
+"""
+Offline scoring of construction tasks against captured world snapshots.
+
+Live runs are scored by ConstructionTaskValidator.validate in
+src/agent/tasks/construction_tasks.js, which reads every blueprint cell from the running
+world with bot.blockAt. This module computes the same result from a snapshot of the
+world instead, so saved runs can be re-scored, or scored with new metrics, without
+replaying them:
+    - a cell where both the blueprint and the world have air is skipped,
+    - a cell matches when the world has exactly the expected block and mismatches otherwise,
+    - positions missing from the snapshot are air (as an unloaded bot.blockAt),
+    - score = 100 * matches / (matches + mismatches), valid = no mismatches.
+
+A snapshot is a block dump keyed by coordinates, either {"x,y,z": block_name} or a list
+of [x, y, z, block_name] entries, optionally wrapped as {"task_id": ..., "blocks": ...}
+in a snapshot file. The blueprint and the world are compared as palette-index arrays
+(see blueprint.py), so scoring a snapshot is a handful of NumPy operations.
+
+Example usage:
+    result = score(Blueprint.from_task(task), {"-18,-60,29": "stone_bricks", ...})
+    result["score"], result["valid"], result["level_matches"]
+
+    python tasks/blueprint_scoring.py "snapshots/*.json" --task_path tasks/construction_tasks/custom/tasks.json
+"""
+
+
+class WorldSnapshot:
+    def __init__(self, positions, names, palette):
+        """
+        Args:
+            positions (np.ndarray): (n x 3) x, y, z coordinates of the dumped blocks.
+            names (np.ndarray): Palette index of the block at each position.
+            palette (list): Block names.
+        """
+        self.positions = positions
+        self.names = names
+        self.palette = palette
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """Builds a snapshot from {"x,y,z": name} (or {(x, y, z): name}) or a list of [x, y, z, name]."""
+        if isinstance(blocks, dict):
+            entries = [(*(key.split(",") if isinstance(key, str) else key), name) for key, name in blocks.items()]
+        else:
+            entries = blocks
+        if not entries:
+            return cls(np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.int64), [AIR])
+        positions = np.array([entry[:3] for entry in entries], dtype=np.int64)
+        palette, names = np.unique(np.array([entry[3] for entry in entries], dtype=str), return_inverse=True)
+        return cls(positions, names.ravel(), palette.tolist())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a snapshot file.
+
+        Returns:
+            tuple: (task id or None, WorldSnapshot)
+        """
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "blocks" in data:
+            return data.get("task_id"), cls.from_blocks(data["blocks"])
+        return None, cls.from_blocks(data)
+
+    def grid(self, blueprint):
+        """
+        The world as seen by Blueprint.checkLevel: the block at every cell of blueprint.
+
+        Returns:
+            np.ndarray: Array shaped like blueprint.blocks of indices into blueprint.palette; block
+            names the blueprint does not use get indices from len(blueprint.palette) on.
+        """
+        palette_index = dict(blueprint.palette_index)
+        lookup = np.array([palette_index.setdefault(name, len(palette_index)) for name in self.palette], dtype=np.int64)
+        actual = np.zeros(blueprint.shape, dtype=np.int64)
+        _, depth, width = blueprint.shape
+        x, y, z = self.positions.T if len(self.positions) else (np.empty(0, dtype=np.int64),) * 3
+        for level, (start_x, start_y, start_z) in enumerate(blueprint.coordinates):
+            dx, dz = x - start_x, z - start_z
+            inside = (y == start_y) & (dx >= 0) & (dx < width) & (dz >= 0) & (dz < depth)
+            actual[level, dz[inside], dx[inside]] = lookup[self.names[inside]]
+        return actual
+
+
+def compare(blueprint, snapshot):
+    """
+    Cell-by-cell comparison of a blueprint with a world snapshot.
+
+    Returns:
+        tuple: (expected, actual, matches, mismatches); the first two are palette-index arrays, the
+        last two boolean masks shaped like blueprint.blocks.
+    """
+    expected = blueprint.blocks.astype(np.int64)
+    actual = snapshot.grid(blueprint)
+    checked = (expected != 0) | (actual != 0)
+    same = expected == actual
+    return expected, actual, checked & same, checked & ~same
+
+
+def score(blueprint, snapshot):
+    """
+    Scores a world snapshot as ConstructionTaskValidator.validate does.
+
+    Args:
+        blueprint (Blueprint): The target structure.
+        snapshot (WorldSnapshot or dict or list): The world, see WorldSnapshot.from_blocks.
+
+    Returns:
+        dict: valid, score (0-100; NaN if no cell was checked, as in the JS validator), matches,
+        mismatches, and level_matches / level_mismatches per level.
+    """
+    if not isinstance(snapshot, WorldSnapshot):
+        snapshot = WorldSnapshot.from_blocks(snapshot)
+    _, _, matches, mismatches = compare(blueprint, snapshot)
+    level_matches = np.count_nonzero(matches, axis=(1, 2))
+    level_mismatches = np.count_nonzero(mismatches, axis=(1, 2))
+    num_matches, num_mismatches = int(level_matches.sum()), int(level_mismatches.sum())
+    total = num_matches + num_mismatches
+    return {
+        "valid": num_mismatches == 0,
+        "score": 100 * num_matches / total if total else float("nan"),
+        "matches": num_matches,
+        "mismatches": num_mismatches,
+        "level_matches": level_matches.tolist(),
+        "level_mismatches": level_mismatches.tolist(),
+    }
+
+
+def mismatch_list(blueprint, snapshot):
+    """The mismatches as Blueprint.check lists them: {"level", "coordinates", "expected", "actual"} dicts."""
+    if not isinstance(snapshot, WorldSnapshot):
+        snapshot = WorldSnapshot.from_blocks(snapshot)
+    expected, actual, _, mismatches = compare(blueprint, snapshot)
+    names = blueprint.palette + [name for name in snapshot.palette if name not in blueprint.palette_index]
+    levels = np.nonzero(mismatches)[0]
+    return [{"level": blueprint.level_numbers[level], "coordinates": position,
+             "expected": names[want], "actual": names[got]}
+            for level, position, want, got in zip(levels.tolist(), blueprint.world_positions(mismatches).tolist(),
+                                                  expected[mismatches].tolist(), actual[mismatches].tolist())]
+
+
+@lru_cache(maxsize=None)
+def load_blueprint(task_path, task_id):
+    """The blueprint of a task, decoded once per worker process; score and compare never modify it."""
+    return Blueprint.from_task(TaskStore(task_path).get(task_id))
+
+
+def score_file(item):
+    """Scores one snapshot file; item is (snapshot_path, task_path, task_id or None)."""
+    snapshot_path, task_path, task_id = item
+    try:
+        file_task_id, snapshot = WorldSnapshot.load(snapshot_path)
+        task_id = task_id or file_task_id
+        if task_id is None:
+            raise ValueError("no task id given and none in the snapshot file")
+        result = score(load_blueprint(task_path, task_id), snapshot)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error scoring {snapshot_path}: {e}")
+        return {"snapshot": snapshot_path, "task_id": task_id}
+    return dict(result, snapshot=snapshot_path, task_id=task_id)
+
+
+def score_files(snapshot_paths, task_path, task_id=None, max_workers=None):
+    """
+    Scores many snapshot files in parallel worker processes.
+
+    Args:
+        snapshot_paths (list): Snapshot files.
+        task_path (str): Task file holding the blueprints.
+        task_id (str): Task of every snapshot; by default the task_id stored in each file.
+        max_workers (int): Number of worker processes.
+
+    Returns:
+        pd.DataFrame: One row per snapshot with snapshot, task_id, valid, score, matches and mismatches.
+    """
+    # Index the task file once, so the workers only read it
+    TaskStore(task_path)
+    items = [(path, task_path, task_id) for path in snapshot_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(score_file, items, chunksize=64))
+    columns = ["snapshot", "task_id", "valid", "score", "matches", "mismatches"]
+    return pd.DataFrame(results).reindex(columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score construction world snapshots against their blueprints')
+    parser.add_argument('snapshots', help='Glob of snapshot files')
+    parser.add_argument('--task_path', required=True, help='Task file holding the blueprints')
+    parser.add_argument('--task_id', default=None, help='Task of every snapshot (default: the task_id in each file)')
+    parser.add_argument('--num_workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--output', default=None, help='Write the scores to this CSV file')
+    args = parser.parse_args()
+
+    snapshot_paths = sorted(glob.glob(args.snapshots))
+    results = score_files(snapshot_paths, args.task_path, args.task_id, args.num_workers)
+    print(results.to_string(index=False))
+    print(f"{len(results)} snapshots, {int(results['valid'].fillna(False).sum())} valid, "
+          f"mean score {results['score'].mean():.2f}")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        results.to_csv(args.output, index=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+"""
+Bootstrap confidence intervals and paired permutation tests for model comparisons.
+
+Scores are laid out as a (models x tasks) matrix with NaN where a model has no result
+for a task. All resamples are drawn at once as NumPy arrays: a bootstrap resample of
+the tasks is a row of multiplicities, so the means of every model under every resample
+are a single matrix product, and a paired permutation test flips the signs of the
+per-task differences with one random sign matrix shared by all models. Resampling the
+tasks (not each model separately) keeps the comparison paired.
+
+Example usage:
+    comparison = compare_models(scored, ["gpt-4o", "claude-3-5-sonnet"], by="materials")
+    print(comparison[["materials", "model", "mean", "ci_low", "ci_high", "p_value"]])
+"""
+
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+
+
+def bootstrap_weights(num_tasks, num_resamples=DEFAULT_RESAMPLES, rng=None):
+    """
+    Draws bootstrap resamples of num_tasks tasks.
+
+    Returns:
+        np.ndarray: (num_resamples x num_tasks) matrix, how often each task is drawn in each resample.
+    """
+    rng = np.random.default_rng(rng)
+    draws = rng.integers(0, num_tasks, size=(num_resamples, num_tasks))
+    offsets = np.arange(num_resamples)[:, None] * num_tasks
+    counts = np.bincount((draws + offsets).ravel(), minlength=num_resamples * num_tasks)
+    return counts.reshape(num_resamples, num_tasks).astype(float)
+
+
+def bootstrap_ci(scores, num_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0):
+    """
+    Percentile bootstrap confidence intervals of the mean score of every model.
+
+    Args:
+        scores (np.ndarray): (models x tasks) scores, NaN where a model has no result. A 1-D
+            array is treated as a single model.
+        num_resamples (int): Number of bootstrap resamples.
+        confidence (float): Coverage of the interval.
+        seed (int): Seed of the resampling, so reports are reproducible.
+
+    Returns:
+        tuple: (mean, low, high) arrays with one entry per model, NaN for models without results.
+    """
+    scores = np.atleast_2d(np.asarray(scores, dtype=float))
+    present = ~np.isnan(scores)
+    values = np.where(present, scores, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = values.sum(axis=1) / present.sum(axis=1)
+        if scores.shape[1] == 0:
+            return mean, mean.copy(), mean.copy()
+        weights = bootstrap_weights(scores.shape[1], num_resamples, seed)
+        # (resamples x models); a resample without any task of a model gives NaN
+        resampled = (weights @ values.T) / (weights @ present.T)
+    alpha = (1 - confidence) / 2
+    low, high = np.full_like(mean, np.nan), np.full_like(mean, np.nan)
+    has_results = present.any(axis=1)
+    if has_results.any():
+        low[has_results], high[has_results] = np.nanpercentile(
+            resampled[:, has_results], [100 * alpha, 100 * (1 - alpha)], axis=0)
+    return mean, low, high
+
+
+def paired_permutation_test(scores, reference=0, num_permutations=DEFAULT_RESAMPLES, seed=0):
+    """
+    Two-sided paired permutation test of every model against a reference model.
+
+    Only tasks both models have a result for are paired. Under the null hypothesis the
+    sign of each per-task difference is arbitrary, so the observed sum of differences is
+    compared with its distribution under random sign flips.
+
+    Args:
+        scores (np.ndarray): (models x tasks) scores, NaN where a model has no result.
+        reference (int): Row of the reference model.
+        num_permutations (int): Number of random sign flips.
+        seed (int): Seed of the sign flips.
+
+    Returns:
+        np.ndarray: p-value per model; NaN for the reference and models sharing no task with it.
+    """
+    scores = np.atleast_2d(np.asarray(scores, dtype=float))
+    differences = scores - scores[reference]
+    paired = ~np.isnan(differences)
+    differences = np.where(paired, differences, 0.0)
+
+    rng = np.random.default_rng(seed)
+    signs = rng.integers(0, 2, size=(num_permutations, scores.shape[1])) * 2.0 - 1.0
+    observed = np.abs(differences.sum(axis=1))
+    permuted = np.abs(signs @ differences.T)  # (permutations x models)
+    # Tolerance so that ties with the observed statistic count despite rounding
+    extreme = (permuted >= observed - 1e-9).sum(axis=0)
+    p_values = (extreme + 1) / (num_permutations + 1)
+    p_values[~paired.any(axis=1)] = np.nan
+    p_values[reference] = np.nan
+    return p_values
+
+
+def pairwise_permutation_tests(scores, num_permutations=DEFAULT_RESAMPLES, seed=0):
+    """(models x models) matrix of paired permutation p-values, see paired_permutation_test."""
+    scores = np.atleast_2d(np.asarray(scores, dtype=float))
+    return np.vstack([paired_permutation_test(scores, reference=i, num_permutations=num_permutations, seed=seed)
+                      for i in range(scores.shape[0])])
+
+
+def score_matrix(frame, models, value="score"):
+    """
+    Pivots a frame with model, task_id and value columns into a (models x tasks) matrix.
+
+    Returns:
+        np.ndarray: Mean value per model and task, NaN where a model has no result.
+    """
+    matrix = frame.pivot_table(index="model", columns="task_id", values=value, aggfunc="mean")
+    return matrix.reindex(list(models)).to_numpy(dtype=float)
+
+
+def compare_models(frame, models, by=None, value="score", reference=None, num_resamples=DEFAULT_RESAMPLES,
+                   confidence=DEFAULT_CONFIDENCE, seed=0):
+    """
+    Mean, bootstrap confidence interval and permutation p-value of every model, per group.
+
+    Args:
+        frame (pd.DataFrame): One row per model and task with model, task_id and value columns,
+            e.g. a results_store.folder_frame of several experiments.
+        models (list): Models to compare, in table order.
+        by (str or list): Optional columns to group by, e.g. "materials"; None compares over all tasks.
+        value (str): Column to average, e.g. "score" or "success".
+        reference (str): Model the others are tested against. Defaults to the first model.
+        num_resamples (int): Number of bootstrap resamples and of permutations.
+        confidence (float): Coverage of the intervals.
+        seed (int): Seed of the resampling.
+
+    Returns:
+        pd.DataFrame: One row per group and model with the by columns, model, n, mean, ci_low,
+            ci_high and p_value (NaN for the reference model).
+    """
+    models = list(models)
+    reference_index = models.index(reference) if reference is not None else 0
+    keys = [by] if isinstance(by, str) else list(by or [])
+    frame = frame.assign(**{value: frame[value].astype(float)})
+    groups = frame.groupby(keys, observed=True) if keys else [((), frame)]
+
+    rows = []
+    for key, group in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        scores = score_matrix(group, models, value)
+        mean, low, high = bootstrap_ci(scores, num_resamples, confidence, seed)
+        p_values = paired_permutation_test(scores, reference_index, num_resamples, seed)
+        counts = (~np.isnan(scores)).sum(axis=1)
+        for i, model in enumerate(models):
+            rows.append(key + (model, int(counts[i]), mean[i], low[i], high[i], p_values[i]))
+    return pd.DataFrame(rows, columns=keys + ["model", "n", "mean", "ci_low", "ci_high", "p_value"])
+
+
+def format_interval(mean, low, high, p_value=None, scale=1, digits=2):
+    """Formats one table cell as 'mean [low, high]', with ' p=...' if a p-value is given."""
+    if mean is None or np.isnan(mean):
+        return "N/A"
+    cell = f"{mean * scale:.{digits}f} [{low * scale:.{digits}f}, {high * scale:.{digits}f}]"
+    if p_value is not None and not np.isnan(p_value):
+        cell += f" p={p_value:.3f}"
+    return cell
@@ -1,76 +1,162 @@
-import json
+import os
+import sys
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.colors import ListedColormap
+from matplotlib.patches import Patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from blueprint import Blueprint, load_blueprints
+
+"""
+Renders construction blueprints level by level.
+
+Every level is drawn as one image of its palette indices (see blueprint.py) with a
+colormap built from the blueprint's palette, instead of one patch and one label per
+block, so large structures render in about the same time as small ones. World
+coordinates are shown on the axes, and at most max_labels cells per level get a
+coordinate label.
+
+Example usage:
+    python tasks/construction_tasks/blueprint_visualizer.py tasks/construction_tasks/custom/church_three_agents.json
+    python tasks/construction_tasks/blueprint_visualizer.py tasks/construction_tasks/train/2_agents.json \
+        --output_dir renders --format png --num_workers 8
+"""
+
+BLOCK_COLORS = {
+    "air": "#FFFFFF",          # White
+    "oak_planks": "#8B4513",   # Saddle Brown
+    "stone_bricks": "#808080", # Gray
+    "oak_door": "#A0522D",      # Sienna
+    "oak_stairs": "#D2691E",    # Chocolate
+    "quartz_block": "#FFFFF0",  # Ivory
+    "glass_pane": "#00CED1",    # Dark Turquoise
+    "torch": "#FF8C00"          # Dark Orange
+}
+# Colors of the blocks missing from BLOCK_COLORS, in palette order
+FALLBACK_COLORS = plt.get_cmap("tab20").colors
+MAX_LABELS = 25
+MAX_TICKS = 12
 
-def display_3d_blocks(data):
+
+def palette_colors(palette):
+    colors = []
+    fallback = 0
+    for name in palette:
+        if name in BLOCK_COLORS:
+            colors.append(BLOCK_COLORS[name])
+        else:
+            colors.append(FALLBACK_COLORS[fallback % len(FALLBACK_COLORS)])
+            fallback += 1
+    return colors
+
+
+def label_stride(depth, width, max_labels):
+    """Distance between labelled cells so that a level gets at most max_labels labels."""
+    if max_labels <= 0:
+        return None
+    return max(1, math.ceil(math.sqrt(depth * width / max_labels)))
+
+
+def display_3d_blocks(data, output_path=None, max_labels=MAX_LABELS):
     """Displays a 3D array of blocks with different types in a single figure with subplots for each level,
     including block coordinates. Dynamically adjusts the height of the figure.
 
     Args:
-        data: A dictionary containing the block data, structured like the JSON example.
+        data: A dictionary containing the block data, structured like the JSON example, or a Blueprint.
+        output_path: File to save the figure to (PNG, PDF, ... by extension). The figure is returned if None.
+        max_labels: Most cells per level labelled with their coordinates; 0 for none.
     """
-
-    block_types = {
-        "air": "#FFFFFF",          # White
-        "oak_planks": "#8B4513",   # Saddle Brown
-        "stone_bricks": "#808080", # Gray
-        "oak_door": "#A0522D",      # Sienna
-        "oak_stairs": "#D2691E",    # Chocolate
-        "quartz_block": "#FFFFF0",  # Ivory
-        "glass_pane": "#00CED1",    # Dark Turquoise
-        "torch": "#FF8C00"          # Dark Orange
-    }
-
-    # Extract data from the JSON
-    levels = data["levels"]
-    num_levels = len(levels)
+    blueprint = data if isinstance(data, Blueprint) else Blueprint.from_json(data)
+    num_levels, depth, width = blueprint.shape
+    colormap = ListedColormap(palette_colors(blueprint.palette))
 
     # Create a figure and subplots grid
-    fig, axes = plt.subplots(num_levels, 1, figsize=(10, 5 * num_levels))  # One column, dynamic height
-    axes[0].legend(handles=[plt.Rectangle((0, 0), 1, 1, color=color) for color in block_types.values()], 
-           labels=block_types.keys(), loc='upper right')
-    starting_coords = levels[0]["coordinates"]
+    fig, axes = plt.subplots(max(num_levels, 1), 1, figsize=(10, 5 * max(num_levels, 1)), squeeze=False)  # One column, dynamic height
+    axes = axes[:, 0]
+    present = np.flatnonzero(blueprint.counts())
+    axes[0].legend(handles=[Patch(color=colormap.colors[i]) for i in present],
+                   labels=[blueprint.palette[i] for i in present], loc='upper right')
 
-    # Iterate over each level and corresponding subplot
-    for i, level in enumerate(levels):
+    stride = label_stride(depth, width, max_labels)
+    x_ticks = np.unique(np.linspace(0, width - 1, min(width, MAX_TICKS)).astype(int)) if width else []
+    z_ticks = np.unique(np.linspace(0, depth - 1, min(depth, MAX_TICKS)).astype(int)) if depth else []
+
+    for i in range(num_levels):
         ax = axes[i]
-        ax.set_title(f"Level {level['level']}")
-        placement = level["placement"]
-
-        # Convert placement data to NumPy array
-        block_array = np.array([
-            [block_types.get(block, 'gray') for block in row] for row in placement
-        ])
-
-        # Iterate over each block in the level
-        for x in range(block_array.shape[1]):
-            for y in range(block_array.shape[0]):
-                block_type = block_array[y, x]
-
-                # Plot the block as a rectangle
-                rect = plt.Rectangle((x, y), 1, 1, color=block_type)
-                ax.add_patch(rect)
-
-                # Add coordinate text to the center of the block
-                real_x = x + starting_coords[0]
-                real_y = level['level'] + starting_coords[1]
-                real_z = y + starting_coords[2]
-                ax.text(x + 0.5, y + 0.5, f"({real_x},{real_y},{real_z})", ha='center', va='center', fontsize=8)
-
-        # Set axis limits and labels
-        ax.set_xlim([0, block_array.shape[1]])
-        ax.set_ylim([0, block_array.shape[0]])
+        start_x, start_y, start_z = blueprint.coordinates[i]
+        ax.set_title(f"Level {blueprint.level_numbers[i]} (Y: {start_y})")
+        # Row z is drawn at height z, as in Blueprint.checkLevel
+        ax.imshow(blueprint.blocks[i], cmap=colormap, vmin=-0.5, vmax=len(blueprint.palette) - 0.5,
+                  origin='lower', extent=(0, width, 0, depth), interpolation='nearest', aspect='equal')
+
+        if stride is not None:
+            for z in range(0, depth, stride):
+                for x in range(0, width, stride):
+                    ax.text(x + 0.5, z + 0.5, f"({start_x + x},{start_y},{start_z + z})",
+                            ha='center', va='center', fontsize=8)
+
+        ax.set_xticks(np.asarray(x_ticks) + 0.5, [str(start_x + x) for x in x_ticks])
+        ax.set_yticks(np.asarray(z_ticks) + 0.5, [str(start_z + z) for z in z_ticks])
+        ax.set_xlim([0, width])
+        ax.set_ylim([0, depth])
         ax.set_xlabel("X")
-        ax.set_ylabel("Y")
+        ax.set_ylabel("Z")
 
-    
     plt.tight_layout()  # Adjust spacing between subplots
-    # plt.show()
-    plt.savefig("construction_tasks/church_three_agents.pdf", bbox_inches='tight')
+    if output_path is None:
+        return fig
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    fig.savefig(output_path, bbox_inches='tight')
+    plt.close(fig)
+    return output_path
+
+
+def render_blueprint(item):
+    """Renders one blueprint; item is (task_id, blueprint, output_path, max_labels)."""
+    task_id, blueprint, output_path, max_labels = item
+    # Worker processes only write files, so they need no display
+    matplotlib.use("Agg")
+    try:
+        return display_3d_blocks(blueprint, output_path, max_labels=max_labels)
+    except Exception as e:
+        print(f"Error rendering {task_id}: {e}")
+        return None
+
+
+def render_task_file(task_path, output_dir, file_format="pdf", task_ids=None, max_labels=MAX_LABELS, max_workers=None):
+    """
+    Renders every blueprint of a task file to output_dir/<task_id>.<file_format> in worker processes.
+
+    Returns:
+        list: Paths of the rendered files.
+    """
+    blueprints = load_blueprints(task_path, task_ids)
+    items = [(task_id, blueprint, os.path.join(output_dir, f"{task_id}.{file_format}"), max_labels)
+             for task_id, blueprint in blueprints.items()]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rendered = list(executor.map(render_blueprint, items))
+    return [path for path in rendered if path is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the blueprints of a construction task file')
+    parser.add_argument('task_path', help='Task file holding the blueprints')
+    parser.add_argument('--output_dir', default=None, help='Folder of the renders (default: next to the task file)')
+    parser.add_argument('--format', default='pdf', choices=['pdf', 'png', 'svg'], help='File format of the renders')
+    parser.add_argument('--task_ids', nargs='+', default=None, help='Only render these tasks')
+    parser.add_argument('--max_labels', type=int, default=MAX_LABELS, help='Most coordinate labels per level, 0 for none')
+    parser.add_argument('--num_workers', type=int, default=None, help='Number of rendering processes')
+    args = parser.parse_args()
 
-# Example usage:
-with open("construction_tasks/custom/church_three_agents.json", "r") as f:
-    data = json.load(f)
-    data = data["church_three_agents"]["blueprint"]
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(args.task_path))
+    rendered = render_task_file(args.task_path, output_dir, args.format, args.task_ids, args.max_labels, args.num_workers)
+    print(f"Rendered {len(rendered)} blueprints to {output_dir}")
 
-display_3d_blocks(data)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 import json
-import re
 import statistics
-import random
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_ids import parse_task_id
+from task_sampler import DifficultyIndex, StratifiedSampler
+from task_store import TaskStore
+
+EASY_TASK_QUOTAS = [
+    "3 per (m,r) with m,r<=2 and w,c<=1",
+    "2 with m,r,w,c=0",
+    "1 with m=1 and r,w,c=0",
+]
+SEED = 0
 
 def extract_difficulty(task_name):
     """Extract difficulty parameters from the task name."""
-    match = re.search(r'materials_(\d+)_rooms_(\d+)_window_(\d+)_carpet_(\d+)_variant_\d+', task_name)
-    if match:
-        return tuple(map(int, match.groups()))  # (m, r, w, c)
+    task = parse_task_id(task_name)
+    if task.variant is not None:
+        return (task.materials, task.rooms, task.window, task.carpet)  # (m, r, w, c)
     return (0, 0, 0, 0)  # Default to lowest difficulty if not found
 
 def calculate_difficulty_score(task_name, task, alpha=1.0, beta=3.0):
@@ -97,97 +108,18 @@ def process_json(file_path, output_path, alpha=1.0, beta=3.0):
     
     print(f"Saved {num_tasks_to_select} easiest tasks with statistics to {output_path}")
 
-def sample_tasks_with_distribution(file_path, output_path):
+def sample_tasks_with_distribution(file_path, output_path, seed=None):
     """
-    Sample tasks with a specific distribution:
+    Sample tasks with at least 3 levels following EASY_TASK_QUOTAS:
     - 3 tasks for each of the 9 possibilities of (m,r) where 0 <= m <= 2 and 0 <= r <= 2
     - Random (w,c) between 0 and 1 for the above tasks
     - 2 additional tasks from (m,r,w,c) = (0,0,0,0)
     - 1 additional task from (m,r,w,c) = (1,0,0,0)
+    Only the sampled tasks are decoded from the task file.
     """
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    
-    # Filter tasks with at least 3 levels
-    valid_tasks = {}
-    for task_name, task_details in data.items():
-        num_levels = len(task_details.get("blueprint", {}).get("levels", []))
-        if num_levels >= 3:
-            valid_tasks[task_name] = task_details
-    
-    # print(f"Total valid tasks: {len(valid_tasks)}")
-    
-    # Categorize tasks by their (m,r,w,c) values
-    tasks_by_params = {}
-    for task_name, task_details in valid_tasks.items():
-        m, r, w, c = extract_difficulty(task_name)
-        key = (m, r, w, c)
-        if key not in tasks_by_params:
-            tasks_by_params[key] = []
-        tasks_by_params[key].append((task_name, task_details))
-    
-    # # Print available combinations
-    # print("Available (m,r,w,c) combinations:")
-    # for params, tasks in tasks_by_params.items():
-    #     print(f"  {params}: {len(tasks)} tasks")
-    
-    # Sample tasks according to the distribution
-    sampled_tasks = {}
-    already_sampled = set()
-    
-    # 1. Sample 3 tasks for each (m,r) where 0 <= m <= 2 and 0 <= r <= 2
-    for m in range(3):
-        for r in range(3):
-            # Find all tasks with the current (m,r) and w,c between 0 and 1
-            candidates = []
-            for params, tasks in tasks_by_params.items():
-                if params[0] == m and params[1] == r and params[2] <= 1 and params[3] <= 1:
-                    candidates.extend(tasks)
-            
-            # Sample 3 tasks if possible
-            if len(candidates) >= 3:
-                sampled = random.sample(candidates, 3)
-                for task_name, task_details in sampled:
-                    if task_name not in already_sampled:
-                        sampled_tasks[task_name] = task_details
-                        already_sampled.add(task_name)
-            else:
-                print(f"Warning: Not enough tasks for (m={m}, r={r}) with w,c <= 1. Found {len(candidates)}.")
-                # Add all available
-                for task_name, task_details in candidates:
-                    if task_name not in already_sampled:
-                        sampled_tasks[task_name] = task_details
-                        already_sampled.add(task_name)
-    
-    # 2. Add 2 tasks with (m,r,w,c) = (0,0,0,0)
-    zero_zero_zero_zero = tasks_by_params.get((0,0,0,0), [])
-    zero_zero_zero_zero = [t for t in zero_zero_zero_zero if t[0] not in already_sampled]
-    
-    if len(zero_zero_zero_zero) >= 2:
-        additional = random.sample(zero_zero_zero_zero, 2)
-        for task_name, task_details in additional:
-            sampled_tasks[task_name] = task_details
-            already_sampled.add(task_name)
-    else:
-        print(f"Warning: Not enough tasks for (0,0,0,0). Found {len(zero_zero_zero_zero)}.")
-        for task_name, task_details in zero_zero_zero_zero:
-            sampled_tasks[task_name] = task_details
-            already_sampled.add(task_name)
-    
-    # 3. Add 1 task with (m,r,w,c) = (1,0,0,0)
-    one_zero_zero_zero = tasks_by_params.get((1,0,0,0), [])
-    one_zero_zero_zero = [t for t in one_zero_zero_zero if t[0] not in already_sampled]
-    
-    if len(one_zero_zero_zero) >= 1:
-        additional = random.sample(one_zero_zero_zero, 1)
-        for task_name, task_details in additional:
-            sampled_tasks[task_name] = task_details
-            already_sampled.add(task_name)
-    else:
-        print(f"Warning: Not enough tasks for (1,0,0,0). Found {len(one_zero_zero_zero)}.")
-        for task_name, task_details in one_zero_zero_zero:
-            sampled_tasks[task_name] = task_details
-            already_sampled.add(task_name)
+    tasks = TaskStore(file_path)
+    sampler = StratifiedSampler(DifficultyIndex.from_store(tasks), seed=seed)
+    sampled_tasks = {task_name: tasks.get(task_name) for task_name in sampler.sample(EASY_TASK_QUOTAS, where="levels>=3")}
     
     # Print summary of sampled tasks
     print(f"\nTotal sampled tasks: {len(sampled_tasks)}")
@@ -238,4 +170,4 @@ for filename in os.listdir(tasks_dir):
         output_filename = filename.replace('.json', '_distributed_tasks.json')
         output_path = os.path.join(tasks_dir, output_filename)
         print(f"\nProcessing {filename}...")
-        sample_tasks_with_distribution(input_path, output_path)
\ No newline at end of file
+        sample_tasks_with_distribution(input_path, output_path, seed=SEED)
\ No newline at end of file
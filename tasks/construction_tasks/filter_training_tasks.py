@@ -1,61 +1,39 @@
 import json
-import re
 import random
 import os
+import sys
 from collections import defaultdict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_ids import parse_task_id
+from task_sampler import DifficultyIndex, StratifiedSampler, parse_conditions
+from task_store import TaskStore
+
+TRAINING_TASK_QUOTAS = ["500 first by (m,r,w,c)"]
+SEED = 0
+
 def extract_difficulty(task_name):
     """Extract difficulty parameters from the task name."""
-    match = re.search(r'materials_(\d+)_rooms_(\d+)_window_(\d+)_carpet_(\d+)_variant_\d+', task_name)
-    if match:
-        return tuple(map(int, match.groups()))  # (m, r, w, c)
+    task = parse_task_id(task_name)
+    if task.variant is not None:
+        return (task.materials, task.rooms, task.window, task.carpet)  # (m, r, w, c)
     return (0, 0, 0, 0)  # Default if not found
 
-def filter_and_sample_tasks(file_path, output_path):
+def filter_and_sample_tasks(file_path, output_path, seed=None):
     """Filters, samples, and saves 500 unique tasks based on given criteria."""
-    with open(file_path, 'r') as f:
-        data = json.load(f)
+    tasks = TaskStore(file_path)
+    index = DifficultyIndex.from_store(tasks)
 
-    total_tasks = len(data)
     print(f"\nProcessing file: {file_path}")
-    print(f"Total available tasks: {total_tasks}")
-
-    valid_tasks = {}
-
-    # Filter tasks with at least 3 levels
-    for task_name, task_details in data.items():
-        num_levels = len(task_details.get("blueprint", {}).get("levels", []))
-        if num_levels >= 3:
-            valid_tasks[task_name] = task_details
+    print(f"Total available tasks: {len(index)}")
+    print(f"Tasks with at least 3 levels: {index.count(parse_conditions('levels>=3'))}")
 
-    print(f"Tasks with at least 3 levels: {len(valid_tasks)}")
-
-    # Organize tasks by difficulty parameters (m, r, w, c)
-    tasks_by_params = defaultdict(list)
-    for task_name, task_details in valid_tasks.items():
-        key = extract_difficulty(task_name)
-        tasks_by_params[key].append((task_name, task_details))
-
-    # Sort keys in increasing order
-    sorted_keys = sorted(tasks_by_params.keys())
-    sampled_tasks = {}
-    total_selected = 0
+    # Pick tasks in increasing order of (m, r, w, c) until 500 are collected
+    sampler = StratifiedSampler(index, seed=seed)
+    sampled_tasks = {task_name: tasks.get(task_name) for task_name in sampler.sample(TRAINING_TASK_QUOTAS, where="levels>=3")}
     sampled_task_counts = defaultdict(int)
-    
-    # Pick tasks sequentially until 500 are collected
-    for key in sorted_keys:
-        if total_selected >= 500:
-            break
-        
-        if key in tasks_by_params:
-            candidates = tasks_by_params[key]
-            for task_name, task_details in candidates:
-                if total_selected < 500:
-                    sampled_tasks[task_name] = task_details
-                    sampled_task_counts[key] += 1  # Keep the key as a tuple
-                    total_selected += 1
-                else:
-                    break
+    for task_name in sampled_tasks:
+        sampled_task_counts[extract_difficulty(task_name)] += 1
     
     print(f"\nTotal sampled tasks: {len(sampled_tasks)}")
 
@@ -66,7 +44,7 @@ def filter_and_sample_tasks(file_path, output_path):
 
     # Randomly shuffle the tasks before saving
     shuffled_tasks = list(sampled_tasks.items())
-    random.shuffle(shuffled_tasks)
+    random.Random(seed).shuffle(shuffled_tasks)
     final_tasks = dict(shuffled_tasks)
     
     # Save sampled tasks to JSON
@@ -84,4 +62,4 @@ for i, filename in enumerate(all_filenames):
     input_path = os.path.join(tasks_dir, filename)
     output_filename = filename.replace('.json', '_sampled_tasks_for_training.json')
     output_path = os.path.join(tasks_dir, output_filename)
-    filter_and_sample_tasks(input_path, output_path)
\ No newline at end of file
+    filter_and_sample_tasks(input_path, output_path, seed=SEED)
\ No newline at end of file
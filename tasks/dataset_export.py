@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import gzip
+import glob
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from log_ingestion import ingest_folders, is_success
+from server_provisioning import file_sha256
+
+"""
+Exports the conversations of successful runs as a training dataset.
+
+With LOG_ALL enabled every bot appends each model call to a text file in
+bots/<agent>/logs/<task_id>/: the prompt, the conversation sent to the model and the
+response. This module parses those files for the successful task ids in parallel
+workers and streams one chat record per call into gzip-compressed JSONL shards of
+bounded size. Identical conversations (same messages, by SHA-256 of their content)
+are written once, and a manifest lists every shard with its record count and hash.
+The logs are read in place; nothing is copied.
+
+Example usage:
+    with DatasetWriter("tasks/training_data_2025-04-22") as writer:
+        export_conversations(writer, log_files("bots", successful_task_ids))
+
+    python tasks/dataset_export.py --experiments "experiments/*_04-22_16-20" --output_dir tasks/training_data
+"""
+
+MANIFEST_FILE_NAME = "manifest.json"
+# Shards are rolled over after this many bytes of uncompressed JSONL
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+AGENT_PREFIXES = ("Andy_", "Jill_", "agent_")
+
+# Header of one logged model call, see Prompter._saveLog in src/models/prompter.js
+LOG_ENTRY_PATTERN = re.compile(r"^\[(?P<timestamp>[^\]\n]+)\](?: Task ID: (?P<task_id>[^\n]*))? *\nPrompt:\n", re.MULTILINE)
+CONVERSATION_MARKER = "\n\nConversation:\n"
+RESPONSE_MARKER = "\n\nResponse:\n"
+
+
+def parse_prompt_log(file_path):
+    """
+    Parses a prompt log file into its logged model calls.
+
+    Returns:
+        list: {"timestamp", "task_id", "prompt", "messages", "response"} dicts; entries that
+        cannot be parsed are skipped.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error reading {file_path}: {e}")
+        return []
+
+    decoder = json.JSONDecoder()
+    headers = list(LOG_ENTRY_PATTERN.finditer(text))
+    entries = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        body = text[header.end():end]
+        conversation_start = body.find(CONVERSATION_MARKER)
+        if conversation_start < 0:
+            continue
+        try:
+            messages, conversation_end = decoder.raw_decode(body, conversation_start + len(CONVERSATION_MARKER))
+        except json.JSONDecodeError:
+            continue
+        if not body.startswith(RESPONSE_MARKER, conversation_end) or not isinstance(messages, list):
+            continue
+        entries.append({
+            "timestamp": header.group("timestamp"),
+            "task_id": header.group("task_id"),
+            "prompt": body[:conversation_start],
+            "messages": messages,
+            "response": body[conversation_end + len(RESPONSE_MARKER):].rstrip("\n"),
+        })
+    return entries
+
+
+def content_hash(messages):
+    """SHA-256 of a conversation, independent of key order and whitespace."""
+    canonical = json.dumps(messages, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def conversation_records(log_file):
+    """
+    Chat records of one prompt log, as written to the dataset.
+
+    Args:
+        log_file (tuple): (agent, file_path), see log_files.
+
+    Returns:
+        list: One {"id", "task_id", "agent", "tag", "timestamp", "messages"} record per model call,
+        where messages are the system prompt, the conversation and the response.
+    """
+    agent, file_path = log_file
+    # Files are named {tag}_{timestamp}.txt, e.g. conversation_2025-04-22T16-20-00-000Z.txt
+    tag = os.path.basename(file_path).rsplit("_", 1)[0]
+    records = []
+    for entry in parse_prompt_log(file_path):
+        messages = ([{"role": "system", "content": entry["prompt"]}] + entry["messages"]
+                    + [{"role": "assistant", "content": entry["response"]}])
+        records.append({
+            "id": content_hash(messages),
+            "task_id": entry["task_id"] or os.path.basename(os.path.dirname(file_path)),
+            "agent": agent,
+            "tag": tag,
+            "timestamp": entry["timestamp"],
+            "messages": messages,
+        })
+    return records
+
+
+def log_files(bots_dir, task_ids, agent_prefixes=AGENT_PREFIXES, agent_names=None, since=None):
+    """
+    Lists the prompt logs every agent wrote for the given tasks.
+
+    Args:
+        agent_names (list): Only the logs of these agents, e.g. the agents of one server slot.
+        since (float): Only logs modified at or after this time (seconds since the epoch), e.g. the
+            start of a run. Every model call is logged to a file of its own.
+
+    Returns:
+        list: Sorted (agent, file_path) tuples.
+    """
+    files = []
+    for task_id in sorted(set(task_ids)):
+        for file_path in glob.glob(os.path.join(bots_dir, "*", "logs", glob.escape(task_id), "*.txt")):
+            agent = os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(file_path))))
+            if not agent.startswith(agent_prefixes) or (agent_names is not None and agent not in agent_names):
+                continue
+            if since is not None and os.path.getmtime(file_path) < since:
+                continue
+            files.append((agent, file_path))
+    return sorted(files)
+
+
+class DatasetWriter:
+    def __init__(self, output_dir, max_shard_bytes=DEFAULT_SHARD_BYTES, prefix="conversations"):
+        """
+        Args:
+            output_dir (str): Folder of the shards and the manifest.
+            max_shard_bytes (int): Uncompressed size after which a new shard is started.
+            prefix (str): File name prefix of the shards.
+        """
+        self.output_dir = output_dir
+        self.max_shard_bytes = max_shard_bytes
+        self.prefix = prefix
+        self.seen = set()
+        self.shards = []
+        self.duplicates = 0
+        self.sources = []
+        self.shard = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def open_shard(self):
+        file_name = f"{self.prefix}-{len(self.shards):05d}.jsonl.gz"
+        self.shard = {"file": file_name, "records": 0, "bytes": 0,
+                      "handle": gzip.open(os.path.join(self.output_dir, file_name), 'wt', encoding='utf-8')}
+
+    def close_shard(self):
+        if self.shard is None:
+            return
+        self.shard.pop("handle").close()
+        self.shard["sha256"] = file_sha256(os.path.join(self.output_dir, self.shard["file"]))
+        self.shards.append(self.shard)
+        self.shard = None
+
+    def write(self, record):
+        """Appends record unless a record with the same id was written before. Returns whether it was written."""
+        if record["id"] in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen.add(record["id"])
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        if self.shard is not None and self.shard["bytes"] + len(line) > self.max_shard_bytes:
+            self.close_shard()
+        if self.shard is None:
+            self.open_shard()
+        self.shard["handle"].write(line)
+        self.shard["records"] += 1
+        self.shard["bytes"] += len(line)
+        return True
+
+    def add_source(self, source, files, records, duplicates):
+        """Counts files and records of source for the manifest."""
+        for entry in self.sources:
+            if entry["source"] == source:
+                entry["files"] += files
+                entry["records"] += records
+                entry["duplicates"] += duplicates
+                return
+        self.sources.append({"source": source, "files": files, "records": records, "duplicates": duplicates})
+
+    def close(self):
+        """Finishes the last shard and writes the manifest."""
+        self.close_shard()
+        manifest = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "num_records": sum(shard["records"] for shard in self.shards),
+            "duplicates": self.duplicates,
+            "sources": self.sources,
+            "shards": self.shards,
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_FILE_NAME), 'w') as f:
+            json.dump(manifest, f, indent=4)
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_conversations(writer, files, max_workers=None, source=None, executor=None):
+    """
+    Parses prompt logs in parallel and streams their records into writer.
+
+    Args:
+        writer (DatasetWriter): Destination of the records.
+        files (list): (agent, file_path) tuples, see log_files.
+        max_workers (int): Number of parsing processes.
+        source (str): Optional label of these logs (e.g. the experiment folder) for the manifest. Counts of
+            repeated calls with the same source are added up.
+        executor (Executor): Pool to parse in, kept open by the caller; by default a new process pool.
+
+    Returns:
+        tuple: (written, duplicates) for these files.
+    """
+    written, duplicates = 0, 0
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        # Records come back one file at a time, in order
+        for records in executor.map(conversation_records, files, chunksize=16):
+            for record in records:
+                if writer.write(record):
+                    written += 1
+                else:
+                    duplicates += 1
+    finally:
+        if own_executor:
+            executor.shutdown()
+    if source is not None:
+        writer.add_source(source, len(files), written, duplicates)
+    return written, duplicates
+
+
+def successful_task_ids(experiment_dir):
+    """Task ids of the folders in experiment_dir in which some agent reported success."""
+    folders = [entry.path for entry in os.scandir(experiment_dir) if entry.is_dir()]
+    return sorted(os.path.basename(folder) for folder, records in ingest_folders(folders).items()
+                  if records and any(is_success(record.score) for record in records))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the conversations of successful runs as JSONL shards')
+    parser.add_argument('--experiments', required=True, help='Glob of experiment folders whose successful tasks are exported')
+    parser.add_argument('--bots_dir', default='bots', help='Folder holding the bots and their prompt logs')
+    parser.add_argument('--output_dir', default=None, help='Dataset folder (default: tasks/training_data_{date})')
+    parser.add_argument('--max_shard_mb', type=int, default=DEFAULT_SHARD_BYTES // (1024 * 1024), help='Uncompressed shard size in MB')
+    parser.add_argument('--num_workers', type=int, default=None, help='Number of parsing processes')
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join("tasks", f"training_data_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}")
+    with DatasetWriter(output_dir, max_shard_bytes=args.max_shard_mb * 1024 * 1024) as writer:
+        for experiment_dir in sorted(glob.glob(args.experiments)):
+            task_ids = successful_task_ids(experiment_dir)
+            written, duplicates = export_conversations(writer, log_files(args.bots_dir, task_ids),
+                                                       max_workers=args.num_workers, source=experiment_dir)
+            print(f"{experiment_dir}: {len(task_ids)} successful tasks, {written} conversations, {duplicates} duplicates")
+    print(f"Dataset written to {output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,35 @@ import time
 import filecmp
 import json
 import glob
-import socket
+import threading
 
 import boto3
 
+from log_ingestion import parse_log_file, ingest_folders, best_score, is_success
+from results_index import ingest_folders_indexed
+from folder_watcher import FolderWatcher
+from readiness import wait_until, port_open
+from task_scheduler import JobQueue, build_jobs, start_workers
+import agent_runner
+from server_provisioning import provision_slots
+from server_pool import ServerPool, TASKS_DIR, slot_path, write_properties
+from run_manifest import RunManifest, RUN_MANIFEST_FILE_NAME
+from task_store import TaskStore, TASK_OVERRIDES_FILE_NAME, save_overrides
+from adaptive_repetition import AdaptiveRepetition, DEFAULT_MIN_EXP, DEFAULT_CI_WIDTH
+
+# Deadlines for the readiness probes that replace fixed sleeps
+SERVER_START_TIMEOUT = 180
+MAKE_OPS_TIMEOUT = 120
+RUN_END_TIMEOUT = 30
+READINESS_SCRIPT = os.path.join(TASKS_DIR, "readiness.py")
+# main.js, the agent profiles and bots/ are relative to the project root, the agents run from there
+PROJECT_ROOT = os.path.dirname(TASKS_DIR)
+# Seconds between checks whether the scheduled jobs have all finished
+DONE_CHECK_INTERVAL = 5
+
+# Minecraft world every task type is played in
+WORLD_NAMES = {"cooking": "Superflat", "techtree": "Forest", "construction": "Superflat"}
+
 BLOCKED_ACTIONS_COOKING = [
     '!activate', '!attackPlayer', '!checkBlueprint', '!checkBlueprintLevel',
     '!clearChat', '!clearFurnace', '!consume', '!craftable', '!discard',
@@ -47,65 +72,32 @@ def analyze_json_file(file_path):
         file_path (str): Path to the JSON file.
 
     Returns:
-        str or None: The task outcome string if found, otherwise None.
+        float or None: The task score if found, otherwise None.
     """
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            if "turns" in data:
-                for turn in data["turns"]:
-                    if turn.get("role") == "system" and "content" in turn:
-                        if isinstance(turn["content"], str) and "Task ended with score : " in turn["content"]:
-                            if "Task ended with score : 1" in turn["content"]:
-                                return 1
-                            elif "Task ended with score : 0" in turn["content"]:
-                                return 0
-                            else:
-                                score = float(turn["content"].split(":")[-1].strip())
-                                return score
-                            
-                            
-        return None
-    except FileNotFoundError:
-        print(f"Error: File not found: {file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON format in: {file_path}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred while processing {file_path}: {e}")
+    record = parse_log_file(file_path)
+    return record.score if record is not None else None
+
+def folder_result(records):
+    """Best score of a task folder given its records, None if the folder has no logs."""
+    if records is None:
         return None
+    score = best_score(records)
+    return score if score is not None else 0
     
 def extract_result(folder_path):
-    folder_name = os.path.basename(folder_path)
-    json_files = glob.glob(os.path.join(folder_path, "*.json"))
-    # assert len(json_files) == 2, f"Expected 2 json files in {folder_name}, found {len(json_files)}"
-
-    if not json_files:
-        return None
-    else: 
-        score = None
-        curr_score = 0
-        for json_file in json_files:
-            score = analyze_json_file(json_file)
-            if score is not None:
-                max_score = max(score, curr_score)
-                curr_score = max_score
-
-        return curr_score
+    return folder_result(ingest_folders([folder_path])[folder_path])
     
-def aggregate_results(local_folders):
+def summarize_results(local_folders, folder_results):
     """
-    Aggregates the analysis results for each folder.
+    Summarizes per-folder scores into the totals reported for an experiment.
 
     Args:
         local_folders (list): List of local folder paths containing the JSON files.
+        folder_results (dict): Maps folder paths to their score, see folder_result.
 
     Returns:
-        dict: A dictionary where keys are folder names and values are the aggregated outcomes.
+        dict: The total number of finished tasks and the number (or mean score) of successful ones.
     """
-    aggregated_data = {}
-
     total = 0
     successful = 0
     successful_tasks = []
@@ -120,21 +112,17 @@ def aggregate_results(local_folders):
 
     for folder_path in local_folders:
         folder_name = os.path.basename(folder_path)
-
-        try: 
-            result = extract_result(folder_path)
-            
-            if result == 1:
-                successful_tasks.append(folder_name)
-            if result is not None:
-                total += 1
-                successful += result
-        except Exception as e:
-            print(f"Error processing {folder_name}: {e}")
+        result = folder_results.get(folder_path)
+        
+        if result == 1:
+            successful_tasks.append(folder_name)
+        if result is not None:
+            total += 1
+            successful += result
 
     successful_tasks.sort()
 
-    if task_type == "construction":
+    if task_type == "construction" and total > 0:
         successful = successful / total
     
     return {
@@ -142,6 +130,25 @@ def aggregate_results(local_folders):
         "successful": successful,
     }
 
+def aggregate_results(local_folders, index_folder=None):
+    """
+    Aggregates the analysis results for each folder.
+
+    Args:
+        local_folders (list): List of local folder paths containing the JSON files.
+        index_folder (str): Experiment folder holding a persistent results index. When given,
+            only logs that are new or changed since the last call are parsed.
+
+    Returns:
+        dict: A dictionary where keys are folder names and values are the aggregated outcomes.
+    """
+    if index_folder is not None:
+        folder_records = ingest_folders_indexed(local_folders, index_folder)
+    else:
+        folder_records = ingest_folders(local_folders)
+    folder_results = {folder_path: folder_result(records) for folder_path, records in folder_records.items()}
+    return summarize_results(local_folders, folder_results)
+
 def check_folder_results(folder_path):
     """
     Evaluate all JSON files in a folder and its subfolders and calculate success metrics.
@@ -165,11 +172,11 @@ def check_folder_results(folder_path):
         if subfolders:
             # If there are subfolders, evaluate each subfolder
             print(f"Found {len(subfolders)} subfolders to evaluate")
-            results = aggregate_results(subfolders)
+            results = aggregate_results(subfolders, index_folder=folder_path)
         else:
             # If no subfolders, treat the folder itself as a results folder
             print("No subfolders found, evaluating the folder itself")
-            results = aggregate_results([folder_path])
+            results = aggregate_results([folder_path], index_folder=folder_path)
             
         # Calculate success rate
         if results["total"] > 0:
@@ -241,6 +248,50 @@ def set_environment_variable_tmux_session(session_name, key, value):
     """Set an environment variable for the current process."""
     subprocess.run(["tmux", "send-keys", "-t", session_name, f"export {key}={value}", "C-m"])
 
+def prepare_servers(num_parallel, warm_servers=False):
+    """Stops the agent sessions of a previous invocation and, unless warm servers are kept, its servers and their files."""
+    if warm_servers:
+        # Only restart the agents; the server sessions are reused
+        for i in range(num_parallel):
+            subprocess.run(['tmux', 'kill-session', '-t', str(i)], stderr=subprocess.DEVNULL)
+        return
+    try: 
+        subprocess.run(['tmux', 'kill-server'], check=True)
+    except: 
+        print("No tmux session to kill")
+    clean_up_server_files(num_parallel)
+
+def start_servers(num_parallel, world_name, run_in_tmux=True, warm_servers=False):
+    """
+    Provides num_parallel Minecraft servers running world_name.
+
+    Returns:
+        tuple: ((server_path, port) per server, the ServerPool or None if the servers are not pooled)
+    """
+    if run_in_tmux and warm_servers:
+        # Reuse servers left running by a previous invocation and reset their worlds between jobs
+        pool = ServerPool(num_parallel, world_name=world_name)
+        return pool.start(), pool
+    elif run_in_tmux:
+        return create_server_files(os.path.join(TASKS_DIR, "server_data", ""), num_parallel, world_name=world_name), None
+    else:
+        return [(slot_path(i), 55916 + i) for i in range(num_parallel)], None
+
+def launch_slots(servers, launch_world_server=True, **kwargs):
+    """
+    Sets up the agents of every server, see launch_server_experiment.
+
+    Args:
+        servers (list): (server_path, port) per server, see start_servers.
+        launch_world_server (bool): Start the Minecraft servers; False if they come from a ServerPool.
+        **kwargs: Agent settings passed to launch_server_experiment, e.g. num_agents, model, api.
+
+    Returns:
+        list: One server slot per server, for run_job_on_slot.
+    """
+    return [launch_server_experiment(None, None, 0, server, None, launch_world_server=launch_world_server, **kwargs) 
+            for server in servers]
+
 def launch_parallel_experiments(task_path, 
                                 num_exp, 
                                 exp_name, 
@@ -257,30 +308,22 @@ def launch_parallel_experiments(task_path,
                                 num_examples=2, 
                                 no_pruning=False,
                                 block_conversation=False, 
-                                run_in_tmux=True):
+                                run_in_tmux=True, 
+                                runner="script", 
+                                warm_servers=False, 
+                                run_manifest=None, 
+                                adaptive=False, 
+                                min_exp=DEFAULT_MIN_EXP, 
+                                max_exp=None, 
+                                ci_width=DEFAULT_CI_WIDTH, 
+                                task_overrides=None):
     
-    with open(task_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-    json_data = json.loads(content)
+    # Only the index of the task file is read here; single tasks are decoded when a job needs them
+    tasks = TaskStore(task_path, overrides=task_overrides)
+    task_ids = tasks.task_ids
+    task_type = tasks.task_type()
 
-    task_ids = json_data.keys()
-
-    task_type = json_data[list(task_ids)[0]]["type"]
-    # split the task_ids into num_parallel groups
-    task_ids = list(task_ids)
-    task_ids_split = [task_ids[i::num_parallel] for i in range(num_parallel)]
-
-    if task_type == "cooking":
-        world_name = "Superflat"
-    elif task_type == "techtree":
-        world_name = "Forest"
-    elif task_type == "construction":
-        world_name = "Superflat"
-
-    if run_in_tmux:
-        servers = create_server_files("./tasks/server_data/", num_parallel, world_name=world_name)
-    else:
-        servers = [(f"./tasks/server_data_{i}/", 55916 + i) for i in range(num_parallel)]
+    servers, pool = start_servers(num_parallel, WORLD_NAMES[task_type], run_in_tmux=run_in_tmux, warm_servers=warm_servers)
     date_time = datetime.now().strftime("%m-%d_%H-%M")
     experiments_folder = f"experiments/{exp_name}_{date_time}"
     exp_name = f"{exp_name}_{date_time}"
@@ -295,55 +338,175 @@ def launch_parallel_experiments(task_path,
 
     # start wandb
     os.makedirs(experiments_folder, exist_ok=True)
-    for i, server in enumerate(servers):
-        launch_server_experiment(task_path, 
-                                 task_ids_split[i], 
-                                 num_exp, 
-                                 server, 
-                                 experiments_folder, 
-                                 exp_name, 
-                                 s3=s3, 
-                                 bucket_name=bucket_name, 
-                                 template_profile=template_profile, 
-                                 model=model, 
-                                 api=api, 
-                                 insecure_coding=insecure_coding,
-                                 num_agents=num_agents, 
-                                 url=url, 
-                                 task_type=task_type, 
-                                 s3_path=s3_path, 
-                                 max_messages=max_messages,
-                                 num_examples=num_examples, 
-                                 no_pruning=no_pruning,
-                                 block_conversation=block_conversation, 
-                                 run_in_tmux=run_in_tmux)
-        time.sleep(5)
+    for task_id in task_ids:
+        os.makedirs(os.path.join(experiments_folder, str(task_id)), exist_ok=True)
+
+    task_overrides_path = None
+    if tasks.overrides:
+        # Applied by main.js on top of the task file, which stays as it is
+        task_overrides_path = os.path.abspath(os.path.join(experiments_folder, TASK_OVERRIDES_FILE_NAME))
+        save_overrides(tasks.overrides, task_overrides_path)
+
+    # Published in the experiment folder (and at run_manifest) so drivers know which folder belongs to this run
+    manifest = RunManifest([os.path.join(experiments_folder, RUN_MANIFEST_FILE_NAME), run_manifest], 
+                           experiment_folder=experiments_folder, 
+                           exp_name=exp_name, 
+                           task_path=task_path, 
+                           task_ids=task_ids, 
+                           num_exp=num_exp, 
+                           model=model, 
+                           api=api, 
+                           num_agents=num_agents, 
+                           num_parallel=num_parallel)
+    try:
+        slots = launch_slots(servers, 
+                             num_agents=num_agents, 
+                             model=model, 
+                             api=api, 
+                             template_profile=template_profile, 
+                             insecure_coding=insecure_coding, 
+                             url=url, 
+                             max_messages=max_messages, 
+                             num_examples=num_examples, 
+                             run_in_tmux=run_in_tmux, 
+                             launch_world_server=pool is None, 
+                             task_overrides=task_overrides_path)
+
+        # Every server pulls the next (task_id, repetition) job from one shared queue as soon as it is free,
+        # longest tasks first
+        sampler = None
+        if adaptive:
+            # Tasks are repeated only until their success rate is settled, see adaptive_repetition.py
+            sampler = AdaptiveRepetition(tasks.metadata, task_ids, num_exp, min_exp=min_exp, max_exp=max_exp, ci_width=ci_width)
+            queue = JobQueue(sampler.initial_jobs(), key=sampler.priority)
+        else:
+            queue = JobQueue(build_jobs(tasks.metadata, task_ids, num_exp))
+
+        def on_done(slot, job, ok, duration):
+            manifest.job_done(slot, job, ok, duration)
+            if sampler is not None:
+                follow_up = sampler.record(job, job_success(experiments_folder, slot, job))
+                if follow_up is not None:
+                    queue.put(follow_up)
+
+        def reset_world(slot, job):
+            if pool is not None:
+                pool.reset_world(int(slot["session_name"]), tasks.get(job.task_id))
+
+        if runner == "subprocess":
+            # main.js runs as a managed child process of this script, all slots on one event loop
+            job_runner = agent_runner.AgentRunner(task_path, tasks.metadata, experiments_folder, s3=s3, s3_path=s3_path, 
+                                                  before_run=reset_world)
+            workers = [threading.Thread(target=agent_runner.run_jobs, args=(job_runner, queue, slots), 
+                                        kwargs={"on_done": on_done}, daemon=True)]
+            workers[0].start()
+        else:
+            def run_job(slot, job):
+                reset_world(slot, job)
+                run_job_on_slot(slot, job, task_path, experiments_folder, s3=s3, s3_path=s3_path, run_in_tmux=run_in_tmux)
+
+            workers = start_workers(queue, slots, run_job, on_done=on_done)
     
-    total_num_tasks = len(task_ids)
-    total_num_experiments = total_num_tasks * num_exp
-    total_run = 0
-    while total_run < total_num_experiments:
-        results = aggregate_results([f"{experiments_folder}/{task_id}" for task_id in task_ids])
-        total_run = results["total"]
-        print(f"Total tasks run: {total_run}/{total_num_experiments}")
-        print(results)
-        results["exp_name"] = exp_name
-        results["template_profile"] = template_profile
-        results["model"] = model
-        results["api"] = api
-        results["num_agents"] = num_agents
-        results["task_path"] = task_path
-        results["task_type"] = task_type
-        results["max_messages"] = max_messages
-        results["num_examples"] = num_examples
-        with open(f"{experiments_folder}/results.txt", "w") as file:
-            file.write(str(results))
-        if s3: 
-            cmd = f"aws s3 cp {experiments_folder}/results.txt s3://{s3_path}/results.txt"
-            print(cmd)
-            subprocess.run(cmd.split())
-        
-        time.sleep(60)
+        if sampler is not None:
+            # Settled tasks stop early, so the budget is only an upper bound; done() ends the wait
+            total_num_experiments = sampler.budget
+        else:
+            total_num_experiments = len(task_ids) * num_exp
+        results = monitor_experiments(experiments_folder, 
+                                      task_ids, 
+                                      total_num_experiments, 
+                                      metadata={
+                                          "exp_name": exp_name,
+                                          "template_profile": template_profile,
+                                          "model": model,
+                                          "api": api,
+                                          "num_agents": num_agents,
+                                          "task_path": task_path,
+                                          "task_type": task_type,
+                                          "max_messages": max_messages,
+                                          "num_examples": num_examples,
+                                      },
+                                      s3=s3, 
+                                      s3_path=s3_path, 
+                                      done=lambda: not any(worker.is_alive() for worker in workers))
+        if sampler is not None:
+            summary = sampler.summary()
+            print(f"Adaptive repetition used {summary['runs']} of {summary['budget']} runs, "
+                  f"{sum(task['settled'] for task in summary['tasks'].values())}/{len(task_ids)} tasks settled")
+            manifest.update(adaptive=summary)
+    except BaseException as e:
+        manifest.finish(status="failed", error=repr(e))
+        raise
+    manifest.finish(results)
+
+def monitor_experiments(experiments_folder, 
+                        task_ids, 
+                        total_num_experiments, 
+                        metadata=None, 
+                        s3=False, 
+                        s3_path="", 
+                        heartbeat=60, 
+                        done=None):
+    """
+    Tracks the progress of running experiments until all of them have a result.
+
+    Task folders are watched for new agent logs and only the folders that changed are
+    re-scored. results.txt is rewritten (and uploaded to S3) only when the totals change.
+
+    Args:
+        experiments_folder (str): Folder holding one subfolder per task id.
+        task_ids (list): IDs of the tasks being run.
+        total_num_experiments (int): Number of results to wait for.
+        metadata (dict): Extra fields written to results.txt alongside the totals.
+        s3 (bool): Whether to upload results.txt to S3 when it changes.
+        s3_path (str): S3 path of the experiment.
+        heartbeat (float): Seconds between progress prints while nothing changes.
+        done (callable): Optional check that returns True once no more results can arrive, e.g. because
+            every scheduled job has run. Checked every DONE_CHECK_INTERVAL seconds.
+
+    Returns:
+        dict: The final totals, as written to results.txt without the metadata.
+    """
+    task_folders = [f"{experiments_folder}/{task_id}" for task_id in task_ids]
+    folder_results = {}
+    last_results = None
+    last_print = time.monotonic()
+    changed = set(task_folders)
+
+    with FolderWatcher(task_folders) as watcher:
+        while True:
+            if changed:
+                folder_records = ingest_folders_indexed(sorted(changed), experiments_folder)
+                for folder_path, records in folder_records.items():
+                    folder_results[folder_path] = folder_result(records)
+                results = summarize_results(task_folders, folder_results)
+
+                if results != last_results:
+                    last_results = results
+                    print(f"Total tasks run: {results['total']}/{total_num_experiments}")
+                    print(results)
+                    results = dict(results, **(metadata or {}))
+                    with open(f"{experiments_folder}/results.txt", "w") as file:
+                        file.write(str(results))
+                    if s3: 
+                        cmd = f"aws s3 cp {experiments_folder}/results.txt s3://{s3_path}/results.txt"
+                        print(cmd)
+                        subprocess.run(cmd.split())
+                last_print = time.monotonic()
+            elif time.monotonic() - last_print >= heartbeat:
+                print(f"Total tasks run: {last_results['total']}/{total_num_experiments}")
+                last_print = time.monotonic()
+
+            if last_results["total"] >= total_num_experiments:
+                break
+            if done is not None and done():
+                # The workers have finished; score logs copied since the last pass, then stop
+                changed = watcher.wait(timeout=0)
+                if not changed:
+                    break
+                continue
+            changed = watcher.wait(timeout=heartbeat if done is None else min(heartbeat, DONE_CHECK_INTERVAL))
+    return last_results
 
 def launch_server_experiment(task_path, 
                              task_ids, 
@@ -365,7 +528,9 @@ def launch_server_experiment(task_path,
                              num_examples=2, 
                              no_pruning=False,
                              block_conversation=False, 
-                             run_in_tmux=True):
+                             run_in_tmux=True, 
+                             launch_world_server=True, 
+                             task_overrides=None):
     
     """
     Launch a Minecraft server and run experiments on it.
@@ -379,9 +544,13 @@ def launch_server_experiment(task_path,
     @param model: Model to use for the agents
     @param s3: Boolean flag to enable S3 upload
     @param bucket_name: Name of the S3 bucket
+    @param launch_world_server: Start the Minecraft server; False if it is already running, e.g. from a ServerPool
+    @param task_overrides: Path of a task overlay (see task_store.py) main.js applies to every task
+    @return: The server slot (session name, agent names, server path and environment). If task_ids
+             is None, nothing is run and the slot is left for run_job_on_slot.
     """
     server_path, server_port = server
-    edit_file(os.path.join(server_path, "server.properties"), {"server-port": server_port})
+    write_properties(os.path.join(server_path, "server.properties"), {"server-port": server_port})
     mindserver_port = server_port - 55916 + 8080
     
     # set up server and agents 
@@ -420,9 +589,10 @@ def launch_server_experiment(task_path,
     print(agent_profiles_str)
     if run_in_tmux:
         print("run in tmux is true")
-        launch_world(server_path, session_name="server_" + session_name, agent_names=agent_names, port=server_port)
+        if launch_world_server:
+            launch_world(server_path, session_name="server_" + session_name, agent_names=agent_names, port=server_port)
 
-        subprocess.run(['tmux', 'new-session', '-d', '-s', session_name], check=True) 
+        subprocess.run(['tmux', 'new-session', '-d', '-s', session_name, '-c', PROJECT_ROOT], check=True) 
     # set environment variables
     if run_in_tmux:
         set_environment_variable_tmux_session(session_name, "MINECRAFT_PORT", server_port)
@@ -433,7 +603,11 @@ def launch_server_experiment(task_path,
         set_environment_variable_tmux_session(session_name, "LOG_ALL", "true")
         if insecure_coding:
             set_environment_variable_tmux_session(session_name, "INSECURE_CODING", "true")
-        make_ops(agent_names, session_name)
+        if task_overrides:
+            set_environment_variable_tmux_session(session_name, "TASK_OVERRIDES", task_overrides)
+        # A warm server keeps its ops.json from earlier runs
+        if not check_agent_ops(agent_names, ops_file=os.path.join(server_path, "ops.json")):
+            make_ops(agent_names, session_name)
     else: 
         agent_profiles_str = "["
         for agent in agent_profiles[:-1]:
@@ -444,7 +618,28 @@ def launch_server_experiment(task_path,
         os.environ["MAX_MESSAGES"] = str(max_messages)
         os.environ["NUM_EXAMPLES"] = str(num_examples)
         os.environ["LOG_ALL"] = "true"
-    
+        if task_overrides:
+            os.environ["TASK_OVERRIDES"] = task_overrides
+
+    # Environment for agent processes started directly instead of through the tmux session
+    slot_env = {"MINECRAFT_PORT": str(server_port), 
+                "MINDSERVER_PORT": str(mindserver_port), 
+                "PROFILES": json.dumps(agent_profiles), 
+                "MAX_MESSAGES": str(max_messages), 
+                "NUM_EXAMPLES": str(num_examples), 
+                "LOG_ALL": "true"}
+    if insecure_coding:
+        slot_env["INSECURE_CODING"] = "true"
+    if task_overrides:
+        slot_env["TASK_OVERRIDES"] = task_overrides
+
+    slot = {"session_name": session_name, 
+            "agent_names": agent_names, 
+            "server_path": server_path, 
+            "env": dict(os.environ, **slot_env)}
+    if task_ids is None:
+        return slot
+
     run_script(task_path, 
                task_ids, 
                num_exp, 
@@ -455,6 +650,72 @@ def launch_server_experiment(task_path,
                s3_path=s3_path, 
                session_name=session_name, 
                run_in_tmux=run_in_tmux)
+    return slot
+
+def make_run_commands(task_path, task_id, repetition, task_folder, agent_names, s3=False, s3_path="mindcraft-experiments"):
+    """Shell commands for one repetition of a task: run it, wait for the end turn and save the logs."""
+    cmd = f"node main.js --task_path \'{task_path}\' --task_id {task_id}"
+    memory_paths = " ".join(f"bots/{agent}/memory.json" for agent in agent_names)
+    wait_cmd = f"{sys.executable} {READINESS_SCRIPT} run-ended {memory_paths} --timeout {RUN_END_TIMEOUT} --since $run_start"
+    script_content = "run_start=$(date +%s)\n"
+    script_content += f"{cmd}\n"
+    script_content += f"{wait_cmd}\n"
+    for agent in agent_names:
+        agent_file_path = os.path.join(task_folder, f"{agent}_{repetition}.json")
+        script_content += f"echo 'Saving to {agent_file_path}'\n"
+        cp_cmd = f"cp bots/{agent}/memory.json {agent_file_path}"
+        script_content += f"echo '{cp_cmd}'\n"
+        script_content += f"{cp_cmd}\n"
+        if s3:
+            s3_cmd = f"aws s3 cp {agent_file_path} s3://{s3_path}/{task_id}/{agent}_{repetition}.json"
+            script_content += f"echo 'Uploading {agent_file_path} to S3'\n"
+            script_content += f"echo '{s3_cmd}'\n"
+            script_content += f"{s3_cmd}\n"
+    return script_content
+
+def make_bots_upload_commands(agent_names, s3_path="mindcraft-experiments"):
+    return "".join(f"aws s3 cp bots/{agent} s3://{s3_path}/bots/{agent} --recursive\n" for agent in agent_names)
+
+def job_success(experiments_folder, slot, job):
+    """
+    Whether some agent of slot reported success in the logs saved for job.
+
+    Returns:
+        bool or None: None if none of the agent logs of the job could be read.
+    """
+    task_folder = os.path.join(experiments_folder, str(job.task_id))
+    records = [parse_log_file(os.path.join(task_folder, f"{agent}_{job.repetition}.json")) for agent in slot["agent_names"]]
+    records = [record for record in records if record is not None]
+    if not records:
+        return None
+    return any(is_success(record.score) for record in records)
+
+def run_job_on_slot(slot, job, task_path, experiments_folder, s3=False, s3_path="mindcraft-experiments", run_in_tmux=True):
+    """
+    Runs one (task_id, repetition) job on a server slot and blocks until it has finished.
+
+    Args:
+        slot (dict): Server slot returned by launch_server_experiment.
+        job (task_scheduler.Job): The job to run.
+        task_path (str): Path to the task file.
+        experiments_folder (str): Folder to store experiment results.
+        s3 (bool): Whether to upload the logs to S3.
+        s3_path (str): S3 path of the experiment.
+        run_in_tmux (bool): Whether the slot runs its jobs in a tmux session.
+    """
+    task_folder = os.path.join(experiments_folder, str(job.task_id))
+    os.makedirs(task_folder, exist_ok=True)
+    script_content = make_run_commands(task_path, job.task_id, job.repetition, task_folder, slot["agent_names"], 
+                                       s3=s3, s3_path=s3_path)
+    if s3:
+        script_content += make_bots_upload_commands(slot["agent_names"], s3_path=s3_path)
+    script_file = os.path.join(PROJECT_ROOT, "tmp", f"experiment_script_{slot['session_name']}.sh")
+    make_script_file_and_run(script_content, 
+                             script_file, 
+                             session_name=slot["session_name"], 
+                             run_in_tmux=run_in_tmux, 
+                             wait=True, 
+                             env=slot["env"])
 
 def run_script(task_path, 
                task_ids, 
@@ -474,31 +735,13 @@ def run_script(task_path,
         assert os.path.exists(task_folder), f"Directory {task_folder} was not created"
         print(f"Created directory: {task_folder}")
         
-        cmd = f"node main.js --task_path \'{task_path}\' --task_id {task_id}"
-        cp_cmd = f"cp {agent_names[0]}.json {server_path}bots/{agent_names[0]}/profile.json"
         for _ in range(num_exp):
-            script_content += f"{cmd}\n"
-            script_content += "sleep 2\n"
-            for agent in agent_names:
-                agent_file_path = os.path.join(task_folder, f"{agent}_{_}.json")
-                script_content += f"echo 'Saving to {agent_file_path}'\n"
-                cp_cmd = f"cp bots/{agent}/memory.json {agent_file_path}"
-                script_content += f"echo '{cp_cmd}'\n"
-                script_content += f"{cp_cmd}\n"
-                script_content += "sleep 1\n"
-                if s3:
-                    s3_cmd = f"aws s3 cp {agent_file_path} s3://{s3_path}/{task_id}/{agent}_{_}.json"
-                    script_content += f"echo 'Uploading {agent_file_path} to S3'\n"
-                    script_content += f"echo '{s3_cmd}'\n"
-                    script_content += f"{s3_cmd}\n"
-                    script_content += "sleep 1\n"
-        script_content += f"sleep 10\n"
+            script_content += make_run_commands(task_path, task_id, _, task_folder, agent_names, s3=s3, s3_path=s3_path)
         if s3:
-            for agent in agent_names:
-                script_content += f"aws s3 cp bots/{agent} s3://{s3_path}/bots/{agent} --recursive\n"
+            script_content += make_bots_upload_commands(agent_names, s3_path=s3_path)
 
     # Create a temporary shell script file
-    script_file = f"./tmp/experiment_script_{session_name}.sh"
+    script_file = os.path.join(PROJECT_ROOT, "tmp", f"experiment_script_{session_name}.sh")
     make_script_file_and_run(script_content, script_file, session_name=session_name, run_in_tmux=run_in_tmux)
 
 
@@ -510,11 +753,13 @@ def make_ops(agent_names, session_name):
 
     subprocess.run(["tmux", "send-keys", "-t", session_name, cmd, "C-m"])
 
-    time.sleep(30)
+    # Keep opping whoever has joined until every agent shows up in ops.json
+    def op_agents():
+        subprocess.run(["tmux", "send-keys", "-t", "server_" + session_name, f"/op @a", "C-m"])
+        return check_agent_ops(agent_names, ops_file=os.path.join(slot_path(session_name), "ops.json"))
 
-    subprocess.run(["tmux", "send-keys", "-t", "server_" + session_name, f"/op @a", "C-m"])
-
-    agents_op = check_agent_ops(agent_names, ops_file=f"./tasks/server_data_{session_name}/ops.json")
+    agents_op = wait_until(op_agents, timeout=MAKE_OPS_TIMEOUT, initial_delay=1, 
+                           description=f"{', '.join(agent_names)} to be operators")
     if agents_op:
         print("Agents are operators! You are good to go :D")
     else: 
@@ -522,8 +767,11 @@ def make_ops(agent_names, session_name):
         make_ops(agent_names, session_name)
 
 def check_agent_ops(agent_names, ops_file="ops.json"):
-    with open(ops_file, "r") as f:
-        ops_data = json.load(f)
+    try:
+        with open(ops_file, "r") as f:
+            ops_data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
     
     ops_names = [op["name"] for op in ops_data]
     
@@ -535,7 +783,13 @@ def check_agent_ops(agent_names, ops_file="ops.json"):
 def make_script_file_and_run(script_content, 
                              file_name, 
                              session_name="0",
-                             run_in_tmux=True):
+                             run_in_tmux=True, 
+                             wait=False, 
+                             env=None):
+    """
+    Writes a shell script and runs it, in the tmux session session_name or as a subprocess.
+    With wait=True the call only returns once the script has finished, also in tmux.
+    """
     script_dir = os.path.dirname(file_name)
     os.makedirs(script_dir, exist_ok=True)
     assert os.path.exists(script_dir), f"Script directory {script_dir} was not created"
@@ -549,15 +803,20 @@ def make_script_file_and_run(script_content,
     script_file_run = "bash " + file_name
 
     # Execute the shell script using subprocess
-    if run_in_tmux:
+    if run_in_tmux and wait:
+        # The script signals a tmux channel when done; wait-for blocks until it does
+        channel = f"job_done_{session_name}"
+        subprocess.run(["tmux", "send-keys", "-t", session_name, f"{script_file_run}; tmux wait-for -S {channel}", "C-m"])
+        subprocess.run(["tmux", "wait-for", channel])
+    elif run_in_tmux:
         subprocess.run(["tmux", "send-keys", "-t", session_name, script_file_run, "C-m"])
     else:
-        subprocess.run(script_file_run.split())
+        subprocess.run(script_file_run.split(), env=env, cwd=PROJECT_ROOT)
 
 def make_profiles(agent_names, models, apis, template_profile="profiles/collab_profile.json", url="http://127.0.0.1:8000/v1"):
     assert len(agent_names) == len(models)
 
-    with open(template_profile, 'r') as f:
+    with open(os.path.join(PROJECT_ROOT, template_profile), 'r') as f:
         content = f.read()
     
     profile = json.loads(content)
@@ -579,69 +838,37 @@ def make_profiles(agent_names, models, apis, template_profile="profiles/collab_p
         else: 
             profile["model"] = models[index]
 
-        with open(f"{agent_names[index]}.json", 'w') as f:
+        with open(os.path.join(PROJECT_ROOT, f"{agent_names[index]}.json"), 'w') as f:
             json.dump(profile, f, indent=4)
 
 def create_server_files(source_path, num_copies, world_name="Forest"):
     """Create multiple copies of server files for parallel experiments."""
     print("Creating server files...")
     print(num_copies)
+    start = time.monotonic()
+    dest_paths = provision_slots(source_path, [slot_path(i) for i in range(num_copies)])
+    print(f"Server files provisioned in {time.monotonic() - start:.2f}s")
     servers = []
-    for i in range(num_copies):
-        dest_path = f"./tasks/server_data_{i}/"
-        copy_server_files(source_path, dest_path)
+    for i, dest_path in enumerate(dest_paths):
         print(dest_path)
-        edit_file(dest_path + "server.properties", {"server-port": 55916 + i, 
-                                                    "level-name": world_name})
+        write_properties(os.path.join(dest_path, "server.properties"), {"server-port": 55916 + i,
+                                                                        "level-name": world_name})
         # edit_server_properties_file(dest_path, 55916 + i)
         servers.append((dest_path, 55916 + i))
     return servers
 
-def edit_file(file, content_dict):
-    try:
-        with open(file, 'r') as f:
-            lines = f.readlines()
-        with open(file, 'w') as f:
-            for line in lines:
-                for key, value in content_dict.items():
-                    if line.startswith(key):
-                        f.write(f"{key}={value}\n")
-                    else:
-                        f.write(line)
-        print(f"{file} updated with {content_dict}")  
-    except Exception as e:
-        print(f"Error editing file {file}: {e}")
-
 def clean_up_server_files(num_copies):
     """Delete server files from multiple locations."""
     for i in range(num_copies):
-        dest_path = f"./tasks/server_data_{i}/"
-        delete_server_files(dest_path)
+        delete_server_files(slot_path(i))
 
 def copy_server_files(source_path, dest_path):
     """Copy server files to the specified location."""
     try:
-        shutil.copytree(source_path, dest_path)
+        provision_slots(source_path, [dest_path])
         print(f"Server files copied to {dest_path}")
     except Exception as e:
         print(f"Error copying server files: {e}")
-    time.sleep(10)
-
-    same_files = check_same_files(source_path, dest_path)
-    if not same_files:
-        copy_server_files(source_path, dest_path)
-        print("The destination path does not contain all the same files as the source path.")
-    else:
-        print("The destination path contains all the same files as the source path.")
-
-def check_same_files(d1, d2):
-
-    items1 = set(os.listdir(d1))
-    items2 = set(os.listdir(d2))
-
-    if items1 != items2:
-        return False
-    return True
 
 def delete_server_files(dest_path):
     """Delete server files from the specified location."""
@@ -657,28 +884,24 @@ def delete_server_files(dest_path):
     #     delete_server_files(dest_path)
     
 
-def launch_world(server_path="./tasks/server_data/", agent_names=["andy", "jill"], session_name="server", port=55916):
+def launch_world(server_path=os.path.join(TASKS_DIR, "server_data", ""), agent_names=["andy", "jill"], session_name="server", port=55916):
     """Launch the Minecraft world."""
     print(f"Launching Minecraft world with port {port}...")
     cmd = f"cd {server_path} && java -jar server.jar"
     subprocess.run(['tmux', 'new-session', '-d', '-s', session_name], check=True)
     subprocess.run(["tmux", "send-keys", "-t", session_name, cmd, "C-m"])
-    time.sleep(10)
-    if not test_server_running(port):
+    if not wait_until(lambda: test_server_running(port), timeout=SERVER_START_TIMEOUT, 
+                      description=f"server on port {port}"):
         print("Server failed to start. Retrying...")
+        subprocess.run(["tmux", "kill-session", "-t", session_name])
         launch_world(server_path, agent_names, session_name, port)
 
 def test_server_running(port=55916):
-    host = 'localhost'
-
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        try:
-            s.connect((host, port))
-            print("Server is running on port 55916")
-            return True
-        except ConnectionRefusedError:
-            print("Server is not running on port 55916")
-            return False
+    if port_open(port):
+        print(f"Server is running on port {port}")
+        return True
+    print(f"Server is not running on port {port}")
+    return False
 
 def kill_world(session_name="server"):
     """Kill the Minecraft world."""
@@ -744,6 +967,18 @@ def main():
     parser.add_argument('--block_conversation', action='store_true', help='Block conversation actions')
     parser.add_argument('--check', metavar='FOLDER_PATH', help='Check and evaluate results in the specified folder without running experiments')
     parser.add_argument('--usernames', default="", help='Comma-separated list of usernames for the agents')
+    parser.add_argument('--warm_servers', action='store_true', 
+                        help='Keep the Minecraft servers running between invocations and reset their worlds between tasks')
+    parser.add_argument('--run_manifest', default=None, 
+                        help='Also write the run manifest (experiment folder, status, timings) to this path')
+    parser.add_argument('--adaptive', action='store_true', 
+                        help='Stop repeating a task once its success rate is settled; num_exp becomes the average repetitions per task')
+    parser.add_argument('--min_exp', default=DEFAULT_MIN_EXP, type=int, help='Repetitions of every task before it may stop (with --adaptive)')
+    parser.add_argument('--max_exp', default=None, type=int, help='Most repetitions of a single task (with --adaptive, default 2 * num_exp)')
+    parser.add_argument('--ci_width', default=DEFAULT_CI_WIDTH, type=float, 
+                        help='Width of the success rate confidence interval at which a task stops (with --adaptive)')
+    parser.add_argument('--runner', default="script", choices=["script", "subprocess"], 
+                        help='Run agents through generated bash scripts or as subprocesses managed by this script')
 
     args = parser.parse_args()
     print(args)
@@ -754,34 +989,23 @@ def main():
         return
     
     if not args.no_launch_world:
-        try: 
-            subprocess.run(['tmux', 'kill-server'], check=True)
-        except: 
-            print("No tmux session to kill")
-    
-    # delete all server files
-    if not args.no_launch_world:
-        clean_up_server_files(args.num_parallel)
+        prepare_servers(args.num_parallel, warm_servers=args.warm_servers)
     if args.add_keys:
         update_keys_json()
 
-    # change task file to include usernames
-    with open(args.task_path, 'r') as f:
-        content = f.read()
-        task = json.loads(content) 
+    # usernames are passed to the agents as an overlay instead of being written into the task file
+    tasks = TaskStore(args.task_path)
+    task_overrides = None
     # check if human count for first task is non zero
-    if "human_count" in task[list(task.keys())[0]]:
+    first_task = tasks.metadata[tasks.task_ids[0]]
+    if "human_count" in first_task:
         # check if human count is non zero
-        human_count = task[list(task.keys())[0]]["human_count"]
+        human_count = first_task["human_count"]
         username_lst = args.usernames.replace(" ", "").split(",")
         if len(username_lst) != human_count:
             raise ValueError(f"Number of usernames provided ({len(username_lst)}) does not match human count ({human_count})")
         if human_count > 0:
-            for task_id in task.keys():
-                task[task_id]["usernames"] = username_lst
-        # dump to task_path 
-        with open(args.task_path, 'w') as f:
-            json.dump(task, f, indent=4)
+            task_overrides = {"*": {"usernames": username_lst}}
     
     launch_parallel_experiments(args.task_path, 
                                 num_exp=args.num_exp, 
@@ -799,7 +1023,15 @@ def main():
                                 num_examples=args.num_examples, 
                                 no_pruning=args.no_pruning, 
                                 block_conversation=args.block_conversation,
-                                run_in_tmux=not args.no_launch_world)
+                                run_in_tmux=not args.no_launch_world, 
+                                runner=args.runner, 
+                                warm_servers=args.warm_servers, 
+                                run_manifest=args.run_manifest, 
+                                adaptive=args.adaptive, 
+                                min_exp=args.min_exp, 
+                                max_exp=args.max_exp, 
+                                ci_width=args.ci_width, 
+                                task_overrides=task_overrides)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
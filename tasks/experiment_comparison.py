@@ -0,0 +1,187 @@
+import os
+import json
+import glob
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from prettytable import PrettyTable
+
+from log_ingestion import ingest_folders
+from results_store import build_runs_frame, folder_frame
+from task_ids import parse_task_ids
+from comparison_stats import compare_models, format_interval
+
+"""
+Compares many experiments (one per model) from a single scan of their logs.
+
+The experiment roots are given as a glob, a JSON manifest or a {model: root} dict.
+Their task folders are listed in one parallel walk and all logs are parsed in a single
+log_ingestion.ingest_folders pass. The results are joined on task id into a
+task x model score matrix (and a success matrix), and every table - per material, per
+room, per blocked agent count, per cooking item - is a group-by over these matrices
+and the task attributes from task_ids, without going back to the disk.
+
+Example usage:
+    comparison = ExperimentComparison.load("experiments/*_04-22_16-20")
+    comparison.table("score", by=["materials"])  # materials x model mean scores
+    comparison.compare(by=["rooms"])  # means with bootstrap CIs and p-values
+
+    python tasks/experiment_comparison.py "experiments/*_04-22_16-20" --by materials rooms
+"""
+
+
+def resolve_experiments(spec, model_names=None):
+    """
+    Maps model names to experiment roots.
+
+    Args:
+        spec (str, list or dict): A glob of experiment roots, a JSON manifest file holding a
+            {model: root} object or a list of roots, a list of roots, or a {model: root} dict.
+        model_names (list): Names for the roots of a glob or list. Defaults to the folder names.
+
+    Returns:
+        dict: Model name to experiment root, in a stable order.
+    """
+    if isinstance(spec, dict):
+        return dict(spec)
+    if isinstance(spec, str) and spec.endswith(".json") and os.path.isfile(spec):
+        with open(spec, 'r') as f:
+            return resolve_experiments(json.load(f), model_names)
+    if isinstance(spec, str):
+        roots = sorted(path for path in glob.glob(spec) if os.path.isdir(path))
+    else:
+        roots = list(spec)
+    names = model_names or [os.path.basename(os.path.normpath(root)) for root in roots]
+    if len(names) != len(roots):
+        raise ValueError(f"Got {len(names)} model names for {len(roots)} experiments")
+    return dict(zip(names, roots))
+
+
+def list_task_folders(root_dir, task_prefix=""):
+    """Task folders directly inside an experiment root, optionally only those starting with task_prefix."""
+    try:
+        with os.scandir(root_dir) as entries:
+            return sorted(entry.path for entry in entries
+                          if entry.is_dir() and entry.name.startswith(task_prefix))
+    except FileNotFoundError:
+        print(f"Experiment folder not found: {root_dir}")
+        return []
+
+
+class ExperimentComparison:
+    def __init__(self, folders, models, score_column="score"):
+        """
+        Args:
+            folders (pd.DataFrame): results_store.folder_frame of all experiments, with a model column.
+            models (list): Model names, in table order.
+            score_column (str): Folder score of the score matrix: "score" (best agent) or "first_score".
+        """
+        self.folders = folders
+        self.models = list(models)
+        scored = folders[folders["score_found"]]
+        # task x model matrices, NaN where a model has no scored run of a task
+        self.scores = self.pivot(scored, score_column)
+        self.success = self.pivot(scored, "success").astype(float).where(self.scores.notna())
+        self.features = parse_task_ids(self.scores.index)
+
+    @classmethod
+    def load(cls, spec, model_names=None, task_prefix="", max_workers=None, score_column="score"):
+        """
+        Scans the experiments of spec (see resolve_experiments) in one pass.
+
+        Args:
+            task_prefix (str): Only consider task folders whose name starts with it.
+            max_workers (int): Threads listing the experiment roots and processes parsing the logs.
+            score_column (str): See __init__.
+        """
+        experiments = resolve_experiments(spec, model_names)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            task_folders = list(executor.map(lambda root: list_task_folders(root, task_prefix), experiments.values()))
+        folder_records = ingest_folders([folder for folders in task_folders for folder in folders],
+                                        max_workers=max_workers)
+
+        frames = []
+        for model_name, folders in zip(experiments, task_folders):
+            records = {folder: folder_records[folder] for folder in folders}
+            frames.append(folder_frame(build_runs_frame(records, model=model_name)))
+        return cls(pd.concat(frames, ignore_index=True), experiments.keys(), score_column)
+
+    def pivot(self, frame, value):
+        matrix = frame.pivot_table(index="task_id", columns="model", values=value, aggfunc="max")
+        matrix = matrix.reindex(columns=self.models)
+        matrix.columns.name = "model"
+        return matrix
+
+    def matrix(self, value="score", where=None):
+        """The score or success matrix, with the cells outside the where mask blanked out."""
+        matrix = {"score": self.scores, "success": self.success}[value]
+        return matrix if where is None else matrix.where(where)
+
+    def grouped(self, matrix, by):
+        """Rows of matrix keyed by the task attributes in by; multi-item tasks count once per item."""
+        features = self.features.loc[matrix.index, by]
+        if "items" in by:
+            features = features.explode("items").dropna(subset=["items"])
+        keyed = matrix.loc[features.index].reset_index()
+        features = features.reset_index(drop=True)
+        return keyed, [features[column] for column in by]
+
+    def table(self, value="score", by=None, agg="mean", where=None):
+        """
+        Aggregates one of the matrices per group of tasks.
+
+        Args:
+            value (str): "score" or "success".
+            by (list): Task attributes to group by, e.g. ["materials", "rooms"], ["num_blocked"] or ["items"].
+                None aggregates over all tasks.
+            agg (str): Aggregation of each model's values, e.g. "mean", "sum" or "count" (tasks with a result).
+            where (pd.DataFrame): Optional boolean task x model mask; other cells are ignored.
+
+        Returns:
+            pd.DataFrame: One row per group (a single "all" row without by) and one column per model.
+        """
+        matrix = self.matrix(value, where)
+        if not by:
+            return matrix.agg(agg).to_frame("all").T
+        keyed, keys = self.grouped(matrix, by)
+        return keyed[self.models].groupby(keys, dropna=True).agg(agg)
+
+    def long(self, value="score", by=None, where=None):
+        """The matrix as one row per scored (task, model) pair with the by attributes, e.g. for compare_models."""
+        matrix = self.matrix(value, where)
+        by = list(by or [])
+        keyed, keys = self.grouped(matrix, by) if by else (matrix.reset_index(), [])
+        for key in keys:
+            keyed[key.name] = key.values
+        return keyed.melt(id_vars=["task_id"] + by, value_vars=self.models, var_name="model",
+                          value_name=value).dropna(subset=[value] + by)
+
+    def compare(self, by=None, value="score", where=None, **kwargs):
+        """Means, bootstrap confidence intervals and permutation p-values, see comparison_stats.compare_models."""
+        return compare_models(self.long(value, by, where), self.models, by=by, value=value, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the results of several experiments')
+    parser.add_argument('experiments', help='Glob of experiment folders or a JSON manifest of them')
+    parser.add_argument('--model_names', nargs='+', default=None, help='Names of the experiments, in glob order')
+    parser.add_argument('--by', nargs='*', default=[], help='Task attributes to group by, e.g. materials rooms')
+    parser.add_argument('--value', default='score', choices=['score', 'success'], help='Value to compare')
+    parser.add_argument('--task_prefix', default='', help='Only consider task folders starting with this prefix')
+    args = parser.parse_args()
+
+    comparison = ExperimentComparison.load(args.experiments, args.model_names, task_prefix=args.task_prefix)
+    results = comparison.compare(by=args.by, value=args.value)
+    table = PrettyTable([" / ".join(args.by) or "Tasks"] + comparison.models + ["n"])
+    groups = results.groupby(args.by, sort=True) if args.by else [(("All",), results)]
+    for key, rows in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        cells = {row.model: format_interval(row.mean, row.ci_low, row.ci_high, row.p_value) for row in rows.itertuples()}
+        table.add_row([" / ".join(map(str, key))] + [cells[model] for model in comparison.models]
+                      + [" / ".join(str(n) for n in rows["n"])])
+    print(f"{args.value} (mean [95% CI], p vs {comparison.models[0]})")
+    print(table)
+
+if __name__ == "__main__":
+    main()
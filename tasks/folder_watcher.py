@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+"""
+Watches experiment task folders for new or rewritten agent logs.
+
+On Linux the watcher uses inotify, so a folder is reported as soon as a
+{agent}_{n}.json copy is closed. Elsewhere (or if inotify is unavailable) it falls
+back to polling the size and mtime of the JSON files in each folder.
+
+Example usage:
+    watcher = FolderWatcher(task_folders)
+    while True:
+        for folder in watcher.wait(timeout=60):
+            ...
+"""
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def load_inotify():
+    """Returns libc if it provides inotify, otherwise None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FolderWatcher:
+    def __init__(self, folder_paths, poll_interval=1.0, use_inotify=True):
+        """
+        Args:
+            folder_paths (list): Folders to watch. Folders that do not exist yet are picked up once created.
+            poll_interval (float): Seconds between scans when polling.
+            use_inotify (bool): Set to False to force the polling fallback.
+        """
+        self.folder_paths = list(folder_paths)
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.watches = {}  # inotify watch descriptor -> folder path
+        self.unwatched = set(self.folder_paths)
+        self.signatures = {}
+
+        self.libc = load_inotify() if use_inotify else None
+        if self.libc is not None:
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                print(f"inotify unavailable ({os.strerror(ctypes.get_errno())}), polling instead")
+                self.libc = None
+            else:
+                self.fd = fd
+                self.add_pending_watches()
+        if self.fd is None:
+            for folder_path in self.folder_paths:
+                self.signatures[folder_path] = self.folder_signature(folder_path)
+
+    @property
+    def polling(self):
+        return self.fd is None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def folder_signature(self, folder_path):
+        try:
+            with os.scandir(folder_path) as entries:
+                return frozenset((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                                 for entry in entries if entry.name.endswith(".json"))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def add_pending_watches(self):
+        """Starts watching folders that have been created since the last call. Returns them."""
+        added = set()
+        for folder_path in list(self.unwatched):
+            if not os.path.isdir(folder_path):
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder_path), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err != errno.ENOENT:
+                    print(f"Could not watch {folder_path}: {os.strerror(err)}")
+                continue
+            self.watches[wd] = folder_path
+            self.unwatched.discard(folder_path)
+            added.add(folder_path)
+        return added
+
+    def read_events(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+            folder_path = self.watches.get(wd)
+            if folder_path is None:
+                continue
+            if mask & IN_IGNORED:
+                # The folder was deleted; watch it again if it comes back
+                del self.watches[wd]
+                self.unwatched.add(folder_path)
+            elif name.endswith(".json"):
+                changed.add(folder_path)
+        return changed
+
+    def poll_changes(self):
+        changed = set()
+        for folder_path in self.folder_paths:
+            signature = self.folder_signature(folder_path)
+            if signature != self.signatures.get(folder_path):
+                self.signatures[folder_path] = signature
+                changed.add(folder_path)
+        return changed
+
+    def wait(self, timeout=None):
+        """
+        Blocks until at least one folder receives a new or rewritten JSON log, or until timeout.
+
+        Args:
+            timeout (float): Maximum seconds to wait. None waits forever.
+
+        Returns:
+            set: Paths of the folders that changed (empty on timeout).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.polling:
+                changed = self.poll_changes()
+            else:
+                # Newly created folders may already hold logs written before the watch existed
+                changed = self.add_pending_watches()
+                changed |= self.read_events()
+            if changed:
+                return changed
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            step = self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+            if self.polling:
+                time.sleep(step)
+            else:
+                # Wake up at least every poll_interval to pick up folders created in the meantime
+                select.select([self.fd], [], [], step)
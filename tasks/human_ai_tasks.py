@@ -1,11 +1,12 @@
 # run all tasks in a given file
 
 import os
-import json
 import argparse
 import subprocess
 import time
 
+from task_store import TaskStore
+
 def run_task(task_path, task_id, profiles=None):
     """Run a single task using main.js"""
     # Convert task_path to absolute path if it's relative
@@ -35,15 +36,14 @@ def main():
     
     args = parser.parse_args()
     
-    # Load the task file
-    with open(args.task_path, 'r') as f:
-        tasks = json.load(f)
+    # Only the task ids are needed, read from the index of the task file
+    tasks = TaskStore(args.task_path)
     
     print(f"Found {len(tasks)} tasks in {args.task_path}")
     
     # Run each task sequentially
     successful_tasks = 0
-    for task_id in tasks:
+    for task_id in tasks.task_ids:
         success = run_task(args.task_path, task_id, args.profiles)
         if success:
             successful_tasks += 1
@@ -0,0 +1,413 @@
+import os
+import re
+import json
+import mmap
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Shared ingestion of agent memory.json logs.
+
+Every analyzer used to carry its own copy of analyze_json_file and parse each log
+one at a time. This module walks an experiments tree once, fans the parsing out
+over a process pool and returns one RunRecord per log file, so the analyzers only
+have to decide how to aggregate the records.
+
+Parsed folders are kept in an in-process LRU cache keyed by the folder and the size
+and mtime of its logs, so analyzers and helpers that look at the same folders
+again only parse the logs that changed in between.
+
+Example usage:
+    records = ingest_experiments("experiments/exp_04-22_16-20")
+    scores = folder_scores(records)  # {task folder: best score}
+"""
+
+# Below this many files the process pool costs more than it saves
+MIN_PARALLEL_FILES = 64
+
+# End-of-task messages written by the agents, newest format first
+END_MESSAGE_PATTERNS = [
+    re.compile(r"Task ended with score\s*:\s*([0-9.]+)"),
+    re.compile(r"Task ended in score\s*:\s*([0-9.]+)"),
+]
+LEGACY_SUCCESS_MESSAGE = "Task successful ended with code : 2"
+
+# A system turn as laid out by JSON.stringify, capturing the raw (still escaped) content
+END_TURN_PATTERN = re.compile(rb'\{\s*"role":\s*"system",\s*"content":\s*"((?:[^"\\]|\\.)*)"\s*\}')
+# Bytes read from the end of a log before widening the search for the end-of-task turn
+TAIL_WINDOW = 16 * 1024
+
+RUN_FILE_PATTERN = re.compile(r"^(?P<agent>.+)_(?P<run>\d+)\.json$")
+
+# Number of task folders whose parsed records are kept in memory
+FOLDER_CACHE_SIZE = 8192
+
+
+class RunRecord(NamedTuple):
+    """Outcome of a single agent log, i.e. one {agent}_{n}.json file."""
+    task_id: str
+    agent: str
+    run: Optional[int]
+    score: Optional[float]
+    end_message: Optional[str]
+    turn_count: int
+    file_path: str
+
+
+def normalize_score(score):
+    """Keeps whole scores as ints so success counts print as before."""
+    if score is None:
+        return None
+    return int(score) if float(score).is_integer() else float(score)
+
+
+def parse_end_message(content):
+    """
+    Extracts the score from an end-of-task system message.
+
+    Args:
+        content (str): Content of a system turn.
+
+    Returns:
+        float or None: The task score, or None if the message is not an end-of-task message.
+    """
+    if not isinstance(content, str):
+        return None
+    if LEGACY_SUCCESS_MESSAGE in content:
+        return 1
+    for pattern in END_MESSAGE_PATTERNS:
+        match = pattern.search(content)
+        if match:
+            try:
+                return normalize_score(float(match.group(1).rstrip('.')))
+            except ValueError:
+                return None
+    return None
+
+
+def find_end_turn(turns):
+    """
+    Finds the last system turn that reports a task score.
+
+    Args:
+        turns (list): The "turns" list of a memory.json file.
+
+    Returns:
+        tuple: (score, end_message), both None if no end-of-task turn exists.
+    """
+    for turn in reversed(turns):
+        if not isinstance(turn, dict) or turn.get("role") != "system":
+            continue
+        score = parse_end_message(turn.get("content"))
+        if score is not None:
+            return score, turn["content"]
+    return None, None
+
+
+def split_run_file_name(file_name):
+    """Splits '{agent}_{n}.json' into (agent, n). Other names return (stem, None)."""
+    match = RUN_FILE_PATTERN.match(file_name)
+    if match:
+        return match.group("agent"), int(match.group("run"))
+    return os.path.splitext(file_name)[0], None
+
+
+def scan_log_file(file_path):
+    """
+    Fast path of parse_log_file: finds the end-of-task turn without decoding the whole file.
+
+    memory.json is written by JSON.stringify, so a system turn is a '{"role": "system",
+    "content": "..."}' object and, since quotes inside strings are always escaped, a
+    '"role":' key can only appear as an actual turn key. The file is memory-mapped,
+    searched backwards from its end in growing windows for the last end-of-task turn,
+    and the turns are counted by their role keys.
+
+    Args:
+        file_path (str): Path to the JSON log file.
+
+    Returns:
+        tuple or None: (score, end_message, turn_count), or None if the file does not look
+        like a complete memory.json and needs a full parse.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # A copy that is still being written (or was cut short) must go through json.load
+            if not mm[:64].lstrip().startswith(b"{") or not mm[max(0, size - 64):].rstrip().endswith(b"}"):
+                return None
+            turns_start = mm.find(b'"turns":')
+            if turns_start < 0:
+                return None
+
+            turn_count = 0
+            pos = mm.find(b'"role":', turns_start)
+            while pos >= 0:
+                turn_count += 1
+                pos = mm.find(b'"role":', pos + 7)
+
+            score, end_message = None, None
+            window = TAIL_WINDOW
+            while True:
+                start = max(turns_start, size - window)
+                for match in reversed(list(END_TURN_PATTERN.finditer(mm, start, size))):
+                    content = json.loads(b'"' + match.group(1) + b'"')
+                    score = parse_end_message(content)
+                    if score is not None:
+                        return score, content, turn_count
+                if start == turns_start:
+                    break
+                window *= 4
+
+            # An end message in a turn laid out differently than expected: let json.load decide
+            if mm.find(b"Task ended", turns_start) >= 0 or mm.find(LEGACY_SUCCESS_MESSAGE.encode(), turns_start) >= 0:
+                return None
+            return score, end_message, turn_count
+
+
+def parse_full_log_file(file_path):
+    """
+    Slow path of parse_log_file: decodes the whole file with json.load.
+
+    Returns:
+        tuple or None: (score, end_message, turn_count), or None if the file could not be read.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: File not found: {file_path}")
+        return None
+    except json.JSONDecodeError:
+        print(f"Error: Invalid JSON format in: {file_path}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred while processing {file_path}: {e}")
+        return None
+
+    turns = data.get("turns") if isinstance(data, dict) else None
+    if not isinstance(turns, list):
+        turns = []
+    score, end_message = find_end_turn(turns)
+    return score, end_message, len(turns)
+
+
+def parse_log_file(file_path):
+    """
+    Parses a single agent log into a RunRecord.
+
+    Args:
+        file_path (str): Path to the JSON log file.
+
+    Returns:
+        RunRecord or None: The parsed record, or None if the file could not be read.
+    """
+    try:
+        outcome = scan_log_file(file_path)
+    except FileNotFoundError:
+        print(f"Error: File not found: {file_path}")
+        return None
+    except (OSError, ValueError):
+        outcome = None
+    if outcome is None:
+        outcome = parse_full_log_file(file_path)
+        if outcome is None:
+            return None
+
+    score, end_message, turn_count = outcome
+    agent, run = split_run_file_name(os.path.basename(file_path))
+    return RunRecord(
+        task_id=os.path.basename(os.path.dirname(os.path.abspath(file_path))),
+        agent=agent,
+        run=run,
+        score=score,
+        end_message=end_message,
+        turn_count=turn_count,
+        file_path=file_path,
+    )
+
+
+def list_log_files(folder_path):
+    """Lists the JSON log files directly inside a task folder."""
+    try:
+        with os.scandir(folder_path) as entries:
+            return sorted(entry.path for entry in entries
+                          if entry.is_file() and entry.name.endswith(".json"))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def iter_log_files(root_dir):
+    """Yields every JSON log file below root_dir, at any depth."""
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.endswith(".json"):
+                yield os.path.join(dir_path, file_name)
+
+
+def ingest_files(file_paths, max_workers=None):
+    """
+    Parses many log files, in parallel when there are enough of them.
+
+    Args:
+        file_paths (list): Paths to JSON log files.
+        max_workers (int): Size of the process pool. Defaults to the CPU count; 1 disables the pool.
+
+    Returns:
+        list: RunRecords in the order of file_paths. Unreadable files are dropped.
+    """
+    file_paths = list(file_paths)
+    if max_workers == 1 or len(file_paths) < MIN_PARALLEL_FILES:
+        records = map(parse_log_file, file_paths)
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            records = list(executor.map(parse_log_file, file_paths, chunksize=chunksize))
+    return [record for record in records if record is not None]
+
+
+def folder_signature(folder_path):
+    """
+    Name, size and mtime of every JSON log directly inside a task folder.
+
+    Returns:
+        tuple: Sorted (file_name, size, mtime_ns) tuples, empty if the folder has no logs.
+    """
+    try:
+        with os.scandir(folder_path) as entries:
+            signature = []
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signature.append((entry.name, st.st_size, st.st_mtime_ns))
+            return tuple(sorted(signature))
+    except (FileNotFoundError, NotADirectoryError):
+        return ()
+
+
+class FolderCache:
+    """
+    LRU cache of the parsed records of task folders.
+
+    An entry is only returned while the folder still holds the same log files with the
+    same sizes and mtimes, so a log that is written or replaced is parsed again.
+    """
+
+    def __init__(self, maxsize=FOLDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, folder_path, signature):
+        """Returns the cached records of folder_path for this signature, or None."""
+        key = os.path.abspath(folder_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            records = entry[1]
+        # Report the file paths the way this caller spelled the folder
+        return [record._replace(file_path=os.path.join(folder_path, os.path.basename(record.file_path)))
+                for record in records]
+
+    def put(self, folder_path, signature, records):
+        key = os.path.abspath(folder_path)
+        with self.lock:
+            self.entries[key] = (signature, list(records))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by every caller of ingest_folders in this process
+FOLDER_CACHE = FolderCache()
+
+
+def ingest_folders(folder_paths, max_workers=None, cache=FOLDER_CACHE):
+    """
+    Parses the logs of many task folders in one parallel pass.
+
+    Folders whose logs are unchanged since they were last ingested are served from cache.
+
+    Args:
+        folder_paths (list): Task folders, each holding one JSON log per agent and run.
+        max_workers (int): Size of the process pool, see ingest_files.
+        cache (FolderCache): Cache of parsed folders; None parses every folder.
+
+    Returns:
+        dict: Maps each folder path to its list of RunRecords, or to None if it has no JSON logs.
+    """
+    results = {}
+    stale = {}
+    for folder_path in folder_paths:
+        signature = folder_signature(folder_path)
+        if not signature:
+            results[folder_path] = None
+            continue
+        records = cache.get(folder_path, signature) if cache is not None else None
+        if records is None:
+            stale[folder_path] = signature
+        else:
+            results[folder_path] = records
+
+    all_files = [os.path.join(folder_path, file_name)
+                 for folder_path, signature in stale.items() for file_name, _, _ in signature]
+    groups = group_by_folder(ingest_files(all_files, max_workers=max_workers))
+    for folder_path, signature in stale.items():
+        records = groups.get(os.path.normpath(folder_path), [])
+        results[folder_path] = records
+        if cache is not None:
+            cache.put(folder_path, signature, records)
+    return {folder_path: results[folder_path] for folder_path in folder_paths}
+
+
+def ingest_experiments(root_dir, max_workers=None):
+    """Parses every log in an experiments tree in one parallel pass."""
+    return ingest_files(iter_log_files(root_dir), max_workers=max_workers)
+
+
+def group_by_folder(records):
+    """Groups records by the folder that contains their log file."""
+    groups = {}
+    for record in records:
+        groups.setdefault(os.path.normpath(os.path.dirname(record.file_path)), []).append(record)
+    return groups
+
+
+def best_score(records):
+    """Returns the highest score among records, or None if none of them ended with a score."""
+    scores = [record.score for record in records if record.score is not None]
+    return max(scores) if scores else None
+
+
+def folder_scores(records):
+    """Maps each task folder (normalized path) to its best score, None if no agent reported one."""
+    return {folder: best_score(folder_records)
+            for folder, folder_records in group_by_folder(records).items()}
+
+
+def is_success(score):
+    """A run is successful when it ended with the full score."""
+    return score is not None and score >= 1
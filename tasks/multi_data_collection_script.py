@@ -2,13 +2,22 @@ import os
 import shutil
 import subprocess
 import argparse
+import queue
+import time
+import functools
 from pathlib import Path
 from datetime import datetime
-import time
-import json
 import tqdm
-from analyse_results import extract_result, get_immediate_subdirectories, analyze_json_file
-import glob
+from concurrent.futures import ProcessPoolExecutor
+from analyse_results import folder_success, get_immediate_subdirectories
+from log_ingestion import ingest_folders, is_success
+from dataset_export import DatasetWriter, export_conversations, log_files
+from blob_store import BlobStore, snapshot
+from run_manifest import RunManifest, RUN_MANIFEST_FILE_NAME, read_run_manifest
+from task_store import TaskStore
+from task_scheduler import JobQueue, build_jobs, start_workers
+from evaluation_script import (WORLD_NAMES, prepare_servers, start_servers, launch_slots, run_job_on_slot, 
+                               aggregate_results)
 
 # Calculate project root directory
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,55 +30,69 @@ EXPERIMENTS_DIR = os.path.join(project_root, "experiments")
 BOTS_DIR = os.path.join(project_root, "bots")
 
 """
-This script is intended to run the evaluation script multiple times and then automatically aggregate the 
-successful logs into a subfolder for each run, based on the success marked in the experiment folder. Then 
-at the end it will aggregate everything into a json file, ready for training. 
+This script is intended to run the evaluation script multiple times and then automatically export the 
+conversations of the successful runs, based on the success marked in the experiment folder, into one 
+training dataset of compressed JSONL shards (see dataset_export.py). 
+
+All repetitions of all task files share one job queue over the num_parallel servers, so the servers stay
+busy until the last job, and the conversations of every successful job are exported as soon as it finishes.
+With --serial, evaluation_script.py is instead run once per task file and repetition, one after the other.
 
 Example usage: 
 python3 ./multi_data_collection_script.py --api vllm --model meta-llama/Meta-Llama-3-8B-Instruct --num_agents 2 --num_parallel 2 \
     --tasks "tasks/crafting_tasks/test_tasks/tasks_2_agents.json:3" "tasks/crafting_tasks/test_tasks/tasks_3_agents.json:3"
 
 Meaning run those two tasks each 2 times, with num agents. The results will be in 
-./full_run_logs_{date}
-and ./successful_run_logs_{date}
-Use the successful run logs to train the next model.
+./training_data_{date} (manifest.json and conversations-*.jsonl.gz, and the run manifest of every
+evaluation run in run_manifests/)
+and, with --copy_full_logs, snapshots of the bot folders in ./full_run_logs_{date} (see blob_store.py;
+restore one with python tasks/blob_store.py restore tasks/full_run_logs_{date} run_001 <dest>)
+Use the training data to train the next model.
 
 """
 
 
-def extract_result_single_agent(folder_path):
+def folder_success_single_agent(folder_path, records):
     folder_name = os.path.basename(folder_path)
-    json_files = glob.glob(os.path.join(folder_path, "*.json"))
-    if not json_files:
+    if records is None:
         print(f"No JSON files found in {folder_name}")
         return None
-    else:
-        outcome = False
-        for json_file in json_files:
-            outcome = analyze_json_file(json_file)
-            if outcome:
-                return True
+    return any(is_success(record.score) for record in records)
+
+
+def extract_result_single_agent(folder_path):
+    return folder_success_single_agent(folder_path, ingest_folders([folder_path])[folder_path])
+
+
+def success_fn(num_agents):
+    return folder_success_single_agent if num_agents == 1 else functools.partial(folder_success, num_agents=num_agents)
+
+
+def task_succeeded(folder_path, num_agents):
+    """Whether a task folder with one log per agent counts as successful, as in identify_success_folders."""
+    records = ingest_folders([folder_path])[folder_path]
+    if records is not None and len(records) != num_agents:
+        print(f"Expected {num_agents} json files in {os.path.basename(folder_path)}, found {len(records)}")
         return False
+    return bool(success_fn(num_agents)(folder_path, records))
 
 
 def identify_success_folders(download_dir, num_agents):
     folders = get_immediate_subdirectories(download_dir)
-    
-    if num_agents == 1:
-        extract_result_fn = extract_result_single_agent
-    else:
-        extract_result_fn = extract_result
+    folder_success_fn = success_fn(num_agents)
     
     total = 0
     successful = 0
     successful_exp_list = []
     
+    # Parse the logs of every folder in one parallel pass
+    folder_records = ingest_folders(folders)
     for folder_path in tqdm.tqdm(folders):
         folder_name = os.path.basename(folder_path)
 
         try: 
             total += 1
-            success = int(extract_result_fn(folder_path))
+            success = int(folder_success_fn(folder_path, folder_records[folder_path]))
             successful += success
             if success:
                 successful_exp_list.append(folder_path)
@@ -79,19 +102,204 @@ def identify_success_folders(download_dir, num_agents):
     return successful_exp_list
 
 
+def run_evaluation(args, eval_script_path, task_path, exp_name, manifest_path):
+    """
+    Runs evaluation_script.py once (from the project root) and returns its run manifest.
+
+    Raises:
+        RuntimeError: If the script did not publish a finished run manifest.
+    """
+    subprocess.run([
+        "python", eval_script_path,
+        "--api", args.api,
+        "--model", args.model,
+        "--task_path", task_path, # task_path is already absolute or resolved
+        "--num_agents", str(args.num_agents),
+        "--num_parallel", str(args.num_parallel),
+        "--template_profile", args.template_profile,
+        "--exp_name", exp_name,
+        "--url", args.url,
+        "--max_messages", str(args.max_messages),
+        "--num_examples", str(args.num_examples),
+        "--run_manifest", manifest_path
+    ] + (["--insecure_coding"] if args.insecure_coding else [])
+      + (["--warm_servers"] if args.warm_servers else []), check=True, cwd=project_root)
+
+    run = read_run_manifest(manifest_path)
+    if run is None or run["status"] != "finished":
+        status = run["status"] if run is not None else "missing"
+        raise RuntimeError(f"Evaluation of {task_path} did not finish (run manifest {manifest_path}: {status})")
+    return run
+
+
+def collect_serially(args, tasks_to_run, writer, training_data_dir, full_logs_store=None):
+    """
+    Runs evaluation_script.py once per task spec and repetition, one run after the other, and exports
+    the conversations of the successful tasks after every run.
+    """
+    # Resolve eval_script path
+    eval_script_path = args.eval_script
+    if not os.path.isabs(eval_script_path):
+        eval_script_path = os.path.join(project_root, eval_script_path)
+
+    full_logs_manifest = None
+    run_counter = 1
+    for task_path, repeats in tasks_to_run:
+        for rep in range(repeats):
+            run_id = f"run_{run_counter:03d}"
+            print(f"\n Starting {task_path} (rep {rep + 1}/{repeats}) -> {run_id}")
+
+            # evaluation_script.py publishes the experiment folder of this run in its run manifest
+            manifest_path = os.path.join(training_data_dir, "run_manifests", f"{run_id}.json")
+            run = run_evaluation(args, eval_script_path, task_path, f"{args.exp_name}_{run_id}", manifest_path)
+            experiment_dir = os.path.join(project_root, run["experiment_folder"])
+
+            print(f"Found experiment folder: {experiment_dir} ({run['duration']}s, {len(run['jobs'])} jobs)")
+            
+            # Identify successful experiments from project_root/experiments/...
+            successful_exp_list = identify_success_folders(experiment_dir, args.num_agents)
+            
+            # Export the conversations of the successful experiments (read from project_root/bots)
+            successful_task_ids = [os.path.basename(exp_path) for exp_path in successful_exp_list]
+            written, duplicates = export_conversations(writer, log_files(BOTS_DIR, successful_task_ids),
+                                                       source=f"{run_id}:{experiment_dir}")
+            print(f"Exported {written} conversations of {len(successful_task_ids)} successful tasks "
+                  f"({duplicates} duplicates skipped) to {training_data_dir}")
+            
+            if full_logs_store is not None:
+                # Snapshot the full agent directories (read from project_root/bots, write to tasks/full_...)
+                full_logs_manifest = snapshot(full_logs_store, BOTS_DIR, run_id,
+                                              include=["Andy_*", "Jill_*", "agent_*"], previous=full_logs_manifest)
+                stats = full_logs_manifest["stats"]
+                print(f"Snapshotted {stats['files']} agent files ({stats['bytes']} bytes) to {full_logs_store.root}, "
+                      f"{stats['new_blobs']} new blobs ({stats['new_blob_bytes']} bytes compressed)")
+
+            run_counter += 1
+
+
+def collect_concurrently(args, tasks_to_run, writer, training_data_dir, full_logs_store=None):
+    """
+    Runs every repetition of every task spec from one job queue shared by all server slots.
+
+    Each repetition is a run with its own experiment folder and run manifest, as with collect_serially,
+    but all their (task_id, repetition) jobs go into a single queue, so a slot that becomes free picks
+    up the next job of whatever task file is still left. The conversations of a successful job are
+    exported as soon as it finishes. Task files played in different worlds are run one world after
+    the other, since all slots of a queue share the world of their servers.
+    """
+    date_time = datetime.now().strftime("%m-%d_%H-%M")
+    runs = []
+    worlds = {}
+    for task_path, repeats in tasks_to_run:
+        tasks = TaskStore(task_path)
+        task_ids = tasks.task_ids
+        world_name = WORLD_NAMES[tasks.task_type()]
+        for rep in range(repeats):
+            run_id = f"run_{len(runs) + 1:03d}"
+            experiments_folder = os.path.join(EXPERIMENTS_DIR, f"{args.exp_name}_{run_id}_{date_time}")
+            for task_id in task_ids:
+                os.makedirs(os.path.join(experiments_folder, task_id), exist_ok=True)
+            manifest = RunManifest([os.path.join(experiments_folder, RUN_MANIFEST_FILE_NAME),
+                                    os.path.join(training_data_dir, "run_manifests", f"{run_id}.json")],
+                                   experiment_folder=os.path.relpath(experiments_folder, project_root),
+                                   exp_name=f"{args.exp_name}_{run_id}_{date_time}",
+                                   task_path=task_path,
+                                   task_ids=task_ids,
+                                   num_exp=1,
+                                   model=args.model,
+                                   api=args.api,
+                                   num_agents=args.num_agents,
+                                   num_parallel=args.num_parallel)
+            worlds.setdefault(world_name, []).append(len(runs))
+            runs.append({"run_id": run_id, "task_path": task_path, "tasks": tasks, "task_ids": task_ids,
+                         "experiments_folder": experiments_folder, "manifest": manifest,
+                         "remaining": set(task_ids), "successful": 0})
+            print(f"{run_id}: {task_path} (rep {rep + 1}/{repeats}) -> {experiments_folder}")
+
+    def finish_run(run):
+        task_folders = [os.path.join(run["experiments_folder"], task_id) for task_id in run["task_ids"]]
+        results = aggregate_results(task_folders)
+        run["manifest"].finish(results)
+        print(f"{run['run_id']} finished: {results}, {run['successful']} successful tasks exported")
+
+    try:
+        for world_name, run_indices in worlds.items():
+            print(f"\nRunning {len(run_indices)} runs in {world_name} on {args.num_parallel} servers")
+            prepare_servers(args.num_parallel, warm_servers=args.warm_servers)
+            servers, pool = start_servers(args.num_parallel, world_name, warm_servers=args.warm_servers)
+            slots = launch_slots(servers,
+                                 launch_world_server=pool is None,
+                                 num_agents=args.num_agents,
+                                 model=args.model,
+                                 api=args.api,
+                                 template_profile=args.template_profile,
+                                 insecure_coding=args.insecure_coding,
+                                 url=args.url,
+                                 max_messages=args.max_messages,
+                                 num_examples=args.num_examples)
+            jobs = [job for i in run_indices
+                    for job in build_jobs(runs[i]["tasks"].metadata, runs[i]["task_ids"], 1, source=i)]
+            job_queue = JobQueue(jobs)
+            finished = queue.Queue()
+
+            def run_job(slot, job):
+                run = runs[job.source]
+                if pool is not None:
+                    pool.reset_world(int(slot["session_name"]), run["tasks"].get(job.task_id))
+                run_job_on_slot(slot, job, run["task_path"], run["experiments_folder"])
+
+            def on_done(slot, job, ok, duration):
+                # Runs on the worker threads; the main thread scores and exports the job
+                try:
+                    runs[job.source]["manifest"].job_done(slot, job, ok, duration)
+                finally:
+                    finished.put((slot, job, time.time() - duration))
+
+            start_workers(job_queue, slots, run_job, on_done=on_done)
+            with ProcessPoolExecutor() as executor:
+                for _ in range(len(jobs)):
+                    slot, job, started = finished.get()
+                    run = runs[job.source]
+                    experiment_dir = run["experiments_folder"]
+                    if task_succeeded(os.path.join(experiment_dir, job.task_id), args.num_agents):
+                        # Only the files this job's agents wrote, other slots may be running the same task
+                        files = log_files(BOTS_DIR, [job.task_id], agent_names=slot["agent_names"], since=started)
+                        written, duplicates = export_conversations(writer, files, source=f"{run['run_id']}:{experiment_dir}",
+                                                                   executor=executor)
+                        run["successful"] += 1
+                        print(f"Exported {written} conversations of {job.task_id} ({run['run_id']}, "
+                              f"{duplicates} duplicates skipped)")
+                    run["remaining"].discard(job.task_id)
+                    if not run["remaining"]:
+                        finish_run(run)
+
+            if full_logs_store is not None:
+                # One snapshot of the agent directories per world, the runs of a world are interleaved
+                name = "_".join(runs[i]["run_id"] for i in run_indices)
+                stats = snapshot(full_logs_store, BOTS_DIR, name, include=["Andy_*", "Jill_*", "agent_*"])["stats"]
+                print(f"Snapshotted {stats['files']} agent files ({stats['bytes']} bytes) to {full_logs_store.root}, "
+                      f"{stats['new_blobs']} new blobs ({stats['new_blob_bytes']} bytes compressed)")
+    except BaseException as e:
+        for run in runs:
+            if run["remaining"]:
+                run["manifest"].finish(status="failed", error=repr(e))
+        raise
+
+
 def run_data_collection(args):
     # Set up output directories inside tasks/
     timestamp_str = datetime.now().strftime('%Y-%m-%d_%H%M%S') # Add time to avoid overwrite
-    SUCCESSFUL_DIR = Path(os.path.join(tasks_dir, f"successful_run_logs_{timestamp_str}"))
+    TRAINING_DATA_DIR = os.path.join(tasks_dir, f"training_data_{timestamp_str}")
     FULL_RUN_LOGS_DIR = Path(os.path.join(tasks_dir, f"full_run_logs_{timestamp_str}"))
     # Input/state dirs (relative to project root)
     logs_dir_path = Path(LOGS_DIR)
-    experiments_dir_path = Path(EXPERIMENTS_DIR)
     bots_dir_path = Path(BOTS_DIR)
     
     logs_dir_path.mkdir(exist_ok=True) 
-    SUCCESSFUL_DIR.mkdir(exist_ok=True)
-    FULL_RUN_LOGS_DIR.mkdir(exist_ok=True)
+    # Full bot folders are snapshotted into a content-addressed store: files unchanged between runs are stored once
+    full_logs_store = BlobStore(FULL_RUN_LOGS_DIR) if args.copy_full_logs else None
+    # Conversations of successful runs are streamed into one dataset, deduplicated across runs
+    writer = DatasetWriter(TRAINING_DATA_DIR, max_shard_bytes=args.max_shard_mb * 1024 * 1024)
 
     # Parse tasks and repetitions, ensuring paths are relative to project root
     TASKS_TO_RUN = []
@@ -111,78 +319,13 @@ def run_data_collection(args):
         if bot_dir.name.startswith(("Andy_", "Jill_", "agent_")):
             shutil.rmtree(bot_dir)
 
-    # Resolve eval_script path
-    eval_script_path = args.eval_script
-    if not os.path.isabs(eval_script_path):
-        eval_script_path = os.path.join(project_root, eval_script_path)
-
-    run_counter = 1
-    for task_path, repeats in TASKS_TO_RUN:
-        for rep in range(repeats):
-            run_id = f"run_{run_counter:03d}"
-            print(f"\n Starting {task_path} (rep {rep + 1}/{repeats}) -> {run_id}")
-
-            # Track start time to locate experiment folder
-            # Ensure EXPERIMENTS_DIR is treated as Path object if needed
-            before = set(experiments_dir_path.glob("*"))
-
-            # Run evaluation using the resolved eval_script_path
-            # Run from project root
-            subprocess.run([
-                "python", eval_script_path,
-                "--api", args.api,
-                "--model", args.model,
-                "--task_path", task_path, # task_path is already absolute or resolved
-                "--num_agents", str(args.num_agents),
-                "--num_parallel", str(args.num_parallel)
-            ], check=True, cwd=project_root)
-
-            # Wait for experiment folder to appear in project_root/experiments/
-            time.sleep(20)  # avoid race condition
-            after = set(experiments_dir_path.glob("*"))
-            new_experiments = list(after - before)
-            assert len(new_experiments) == 1, f"Expected one new experiment folder, found {len(new_experiments)}"
-            experiment_dir = new_experiments[0]
-
-            print(f"Found experiment folder: {experiment_dir}")
-            
-            # Identify successful experiments from project_root/experiments/...
-            successful_exp_list = identify_success_folders(experiment_dir, args.num_agents)
-            
-            # Save successful logs and results (read from project_root/bots, write to tasks/successful_...)
-            success_output_dir = SUCCESSFUL_DIR / run_id
-            success_output_dir.mkdir(parents=True, exist_ok=True)
-            # Identify the ones that are successful
-            for exp_path in successful_exp_list:
-                exp_name = os.path.basename(exp_path)
-                # For each agent, find and copy their logs for this successful experiment
-                for bot_dir in bots_dir_path.glob("*"):
-                    if bot_dir.name.startswith(("Andy_", "Jill_", "agent_")):
-                        agent_logs_dir = bot_dir / "logs"
-                        if agent_logs_dir.exists():
-                            # Look for the experiment directory directly under logs
-                            exp_dir = agent_logs_dir / exp_name
-                            if exp_dir.exists():
-                                # Add timestamp for uniqueness
-                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                                dest_dir = success_output_dir / f"{bot_dir.name}_{timestamp}_{exp_name}"
-                                shutil.copytree(exp_dir, dest_dir)
-                                print(f"Copied successful log directory: {exp_dir} -> {dest_dir}")
-            
-            # Move full logs to the full logs dir (read from project_root/bots, write to tasks/full_...)
-            full_logs_dir = FULL_RUN_LOGS_DIR / run_id
-            full_logs_dir.mkdir(parents=True, exist_ok=True)
-            for bot_dir in bots_dir_path.glob("*"):
-                if bot_dir.name.startswith(("Andy_", "Jill_", "agent_")):
-                    # bot_dir is already the full path, no need for agent_dir
-                    dest_dir = full_logs_dir / bot_dir.name
-                    if bot_dir.exists():
-                        shutil.copytree(bot_dir, dest_dir, dirs_exist_ok=True)
-                        print(f"Copied full agent directory for {bot_dir.name} to {dest_dir}")
-
-            run_counter += 1
+    if args.serial:
+        collect_serially(args, TASKS_TO_RUN, writer, TRAINING_DATA_DIR, full_logs_store)
+    else:
+        collect_concurrently(args, TASKS_TO_RUN, writer, TRAINING_DATA_DIR, full_logs_store)
 
-    print("\nAll evaluations done and successful runs saved.")
+    manifest = writer.close()
+    print(f"\nAll evaluations done. {manifest['num_records']} conversations of successful runs saved to {TRAINING_DATA_DIR}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run multiple evaluations and collect successful logs")
@@ -193,6 +336,17 @@ if __name__ == "__main__":
     parser.add_argument("--num_parallel", type=int, default=2, help="Number of parallel runs")
     parser.add_argument("--tasks", nargs="+", default=["tasks/crafting_tasks/test_tasks/tasks_2_agents.json:2"], 
                         help="Tasks to run in format 'path:repeats'")
+    parser.add_argument("--template_profile", default="profiles/tasks/crafting_profile.json", help="Profile template of the agents")
+    parser.add_argument("--insecure_coding", action="store_true", help="Enable insecure coding")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/v1", help="URL of the vllm server")
+    parser.add_argument("--max_messages", type=int, default=15, help="Maximum number of messages before summarizing")
+    parser.add_argument("--num_examples", type=int, default=2, help="Number of examples in the agent prompts")
+    parser.add_argument("--warm_servers", action="store_true", help="Keep the Minecraft servers running between runs and reset their worlds instead")
+    parser.add_argument("--serial", action="store_true", 
+                        help="Run evaluation_script.py once per task spec and repetition instead of one job queue over all of them")
+    parser.add_argument("--exp_name", default="collect", help="Prefix of the experiment names, suffixed with the run id")
+    parser.add_argument("--max_shard_mb", type=int, default=256, help="Uncompressed size of a training data shard in MB")
+    parser.add_argument("--copy_full_logs", action="store_true", help="Also snapshot every bot directory into full_run_logs_{date} after each run")
     
     args = parser.parse_args()
     run_data_collection(args)
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import socket
+import argparse
+
+from log_ingestion import parse_log_file
+
+"""
+Readiness probes used by evaluation_script.py instead of fixed sleeps.
+
+Each wait polls a probe with exponential backoff until it succeeds or a deadline
+passes, so a step continues as soon as the thing it waits for is actually ready.
+
+The module can also be called from the generated experiment scripts, e.g. to wait
+until every agent has written its end-of-task turn before the logs are copied:
+    python tasks/readiness.py run-ended bots/Andy_0/memory.json bots/Jill_0/memory.json --since $run_start
+"""
+
+
+def wait_until(probe, timeout=60, initial_delay=0.25, max_delay=5, backoff=2, description="condition"):
+    """
+    Polls probe with exponential backoff until it returns a truthy value or the deadline passes.
+
+    Args:
+        probe (callable): Function without arguments; exceptions count as "not ready yet".
+        timeout (float): Seconds before giving up.
+        initial_delay (float): Seconds before the second attempt.
+        max_delay (float): Upper bound on the delay between attempts.
+        backoff (float): Factor applied to the delay after every failed attempt.
+        description (str): What is being waited for, used in log messages.
+
+    Returns:
+        The last result of probe, which is falsy if the deadline passed.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    while True:
+        try:
+            result = probe()
+        except Exception as e:
+            print(f"Probe for {description} failed: {e}")
+            result = False
+        if result:
+            print(f"Ready: {description} ({time.monotonic() - start:.1f}s)")
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Timed out after {timeout}s waiting for {description}")
+            return result
+        time.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
+
+
+def port_open(port, host='localhost'):
+    """True if something accepts TCP connections on host:port, e.g. a booted Minecraft server."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.connect((host, port))
+            return True
+        except ConnectionRefusedError:
+            return False
+
+
+def run_ended(memory_path, since=None):
+    """True once an agent's memory.json contains an end-of-task turn (written after since, if given)."""
+    try:
+        if since is not None and os.path.getmtime(memory_path) < since:
+            return False
+    except FileNotFoundError:
+        return False
+    record = parse_log_file(memory_path)
+    return record is not None and record.score is not None
+
+
+def wait_for_run_end(memory_paths, timeout=30, since=None):
+    """Waits until every agent of a run has written its end-of-task turn."""
+    return wait_until(lambda: all(run_ended(path, since=since) for path in memory_paths),
+                      timeout=timeout,
+                      description=f"end of task in {', '.join(memory_paths)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wait for experiment readiness conditions')
+    subparsers = parser.add_subparsers(dest='probe', required=True)
+    run_ended_parser = subparsers.add_parser('run-ended', help='Wait until every memory.json has an end-of-task turn')
+    run_ended_parser.add_argument('memory_paths', nargs='+', help='Paths to the agents\' memory.json files')
+    run_ended_parser.add_argument('--timeout', default=30, type=float, help='Seconds before giving up')
+    run_ended_parser.add_argument('--since', type=float, help='Ignore logs last written before this Unix time')
+    args = parser.parse_args()
+
+    if args.probe == 'run-ended':
+        ready = wait_for_run_end(args.memory_paths, timeout=args.timeout, since=args.since)
+        sys.exit(0 if ready else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+from contextlib import closing
+
+from log_ingestion import RunRecord, ingest_files, list_log_files, group_by_folder, normalize_score
+
+"""
+Persistent, incremental index of parsed agent logs for one experiment folder.
+
+The index is a SQLite sidecar stored in experiments/<exp_name>/ and keyed by each
+log's path (relative to the experiment folder), size and mtime. Re-checking a folder
+only parses the memory.json copies that are new or changed since the last check.
+
+Example usage:
+    folder_records = ingest_folders_indexed(task_folders, "experiments/exp_04-22_16-20")
+"""
+
+INDEX_FILE_NAME = ".results_index.sqlite"
+# Bump when the stored columns or the parsing rules change, so old indexes are rebuilt
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    readable INTEGER NOT NULL,
+    task_id TEXT,
+    agent TEXT,
+    run INTEGER,
+    score REAL,
+    end_message TEXT,
+    turn_count INTEGER
+)
+"""
+
+
+def index_path(exp_folder):
+    return os.path.join(exp_folder, INDEX_FILE_NAME)
+
+
+def open_index(exp_folder):
+    """Opens (and if needed creates or rebuilds) the index of an experiment folder."""
+    conn = sqlite3.connect(index_path(exp_folder), timeout=30)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != INDEX_VERSION:
+        conn.execute("DROP TABLE IF EXISTS runs")
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    conn.execute(SCHEMA)
+    return conn
+
+
+def stat_log_files(folder_paths):
+    """
+    Lists the JSON logs of each folder together with their size and mtime.
+
+    Returns:
+        dict: Maps each folder path to a list of (file_path, size, mtime_ns) tuples.
+    """
+    folder_files = {}
+    for folder_path in folder_paths:
+        entries = []
+        for file_path in list_log_files(folder_path):
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            entries.append((file_path, st.st_size, st.st_mtime_ns))
+        folder_files[folder_path] = entries
+    return folder_files
+
+
+def row_to_record(row, file_path):
+    _, _, _, readable, task_id, agent, run, score, end_message, turn_count = row
+    if not readable:
+        return None
+    return RunRecord(task_id=task_id, agent=agent, run=run, score=normalize_score(score),
+                     end_message=end_message, turn_count=turn_count, file_path=file_path)
+
+
+def ingest_folders_indexed(folder_paths, exp_folder, max_workers=None):
+    """
+    Same as log_ingestion.ingest_folders, but only parses logs that are not yet in the
+    index of exp_folder or whose size or mtime changed since they were indexed.
+
+    Args:
+        folder_paths (list): Task folders inside exp_folder.
+        exp_folder (str): Experiment folder that holds the index.
+        max_workers (int): Size of the process pool, see log_ingestion.ingest_files.
+
+    Returns:
+        dict: Maps each folder path to its list of RunRecords, or to None if it has no JSON logs.
+    """
+    folder_files = stat_log_files(folder_paths)
+
+    with closing(open_index(exp_folder)) as conn:
+        indexed = {row[0]: row for row in conn.execute("SELECT * FROM runs")}
+
+        records = []
+        stale = {}
+        for entries in folder_files.values():
+            for file_path, size, mtime_ns in entries:
+                key = os.path.relpath(file_path, exp_folder)
+                row = indexed.get(key)
+                if row is not None and row[1] == size and row[2] == mtime_ns:
+                    record = row_to_record(row, file_path)
+                    if record is not None:
+                        records.append(record)
+                else:
+                    stale[file_path] = (key, size, mtime_ns)
+
+        if stale:
+            parsed = {record.file_path: record
+                      for record in ingest_files(list(stale), max_workers=max_workers)}
+            rows = []
+            for file_path, (key, size, mtime_ns) in stale.items():
+                record = parsed.get(file_path)
+                if record is None:
+                    rows.append((key, size, mtime_ns, 0, None, None, None, None, None, None))
+                else:
+                    records.append(record)
+                    rows.append((key, size, mtime_ns, 1, record.task_id, record.agent, record.run,
+                                 record.score, record.end_message, record.turn_count))
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        # Forget logs that were deleted from the scanned folders
+        scanned = {os.path.normpath(os.path.relpath(folder_path, exp_folder)) for folder_path in folder_paths}
+        present = {os.path.relpath(file_path, exp_folder)
+                   for entries in folder_files.values() for file_path, _, _ in entries}
+        removed = [(key,) for key in indexed
+                   if key not in present and os.path.normpath(os.path.dirname(key) or ".") in scanned]
+        if removed:
+            with conn:
+                conn.executemany("DELETE FROM runs WHERE path = ?", removed)
+
+    groups = group_by_folder(records)
+    return {folder_path: (groups.get(os.path.normpath(folder_path), []) if entries else None)
+            for folder_path, entries in folder_files.items()}
@@ -0,0 +1,125 @@
+import os
+
+import pandas as pd
+
+from task_ids import parse_task_ids
+
+"""
+Columnar store of per-run results with columns parsed from the task ids.
+
+Every agent log becomes one row (folder, task_id, agent, run, score, success, ...)
+extended with the task attributes decoded by task_ids.parse_task_ids: crafting depth,
+plan type and missing items, construction materials and rooms, cooking items and
+blocked agents. The analyzers aggregate these frames with group-bys instead of keeping a
+counter per slice, and save them as Parquet next to their reports so new slices can
+be queried later without re-reading the logs.
+
+Example usage:
+    runs = build_runs_frame(ingest_folders(folders))
+    folders = folder_frame(runs)
+    print(success_table(folders[folders["has_logs"]], "depth"))
+    save_runs(runs, "experiments/analysis_results/crafting_runs.parquet")
+"""
+
+RUN_COLUMNS = ["folder", "task_id", "agent", "run", "score", "turn_count", "has_logs"]
+
+
+def add_task_columns(frame):
+    """Returns frame joined with the parsed attributes of its task_id column, see task_ids.parse_task_ids."""
+    return frame.join(parse_task_ids(frame["task_id"]), on="task_id")
+
+
+def build_runs_frame(folder_records, model=None):
+    """
+    One row per agent log. Folders without readable logs keep a single row without agent.
+
+    Args:
+        folder_records (dict): Maps folder paths to lists of RunRecords (None if the folder has no JSON logs),
+            as returned by log_ingestion.ingest_folders.
+        model (str): Optional value of a model column, for combining several experiments.
+
+    Returns:
+        pd.DataFrame: Runs with the RUN_COLUMNS, success and the task columns.
+    """
+    rows = []
+    for folder_path, records in folder_records.items():
+        task_id = os.path.basename(os.path.normpath(folder_path))
+        if not records:
+            rows.append((folder_path, task_id, None, None, None, None, records is not None))
+        for record in records or []:
+            rows.append((folder_path, task_id, record.agent, record.run, record.score, record.turn_count, True))
+    runs = pd.DataFrame.from_records(rows, columns=RUN_COLUMNS)
+    runs["score"] = runs["score"].astype(float)
+    runs["success"] = runs["score"] >= 1
+    if model is not None:
+        runs.insert(0, "model", model)
+    return add_task_columns(runs)
+
+
+def folder_frame(runs):
+    """
+    Aggregates runs per task folder.
+
+    Returns:
+        pd.DataFrame: One row per folder with num_logs, has_logs, score (best), first_score (of the
+            first log with a score, in file order), score_found, success (any agent succeeded) and the
+            task columns.
+    """
+    keys = ["model", "folder"] if "model" in runs.columns else ["folder"]
+    folders = runs.groupby(keys, sort=False).agg(
+        task_id=("task_id", "first"),
+        has_logs=("has_logs", "first"),
+        num_logs=("agent", "count"),
+        score=("score", "max"),
+        first_score=("score", "first"),
+        success=("success", "any"),
+    ).reset_index()
+    folders["score_found"] = folders["score"].notna()
+    return add_task_columns(folders)
+
+
+def success_table(frame, by):
+    """
+    Success counts of frame grouped by one or more columns.
+
+    Returns:
+        pd.DataFrame: total, successful and success_rate per group.
+    """
+    table = frame.groupby(by, observed=True)["success"].agg(total="size", successful="sum")
+    table["success_rate"] = table["successful"] / table["total"]
+    return table
+
+
+def success_summary(frame, slices):
+    """
+    Flat {name_total, name_successful, name_success_rate} dict over boolean slices of frame.
+
+    Args:
+        frame (pd.DataFrame): Frame with a success column.
+        slices (dict): Maps slice names to boolean masks of frame; "" names the unprefixed overall slice.
+    """
+    summary = {}
+    for name, mask in slices.items():
+        prefix = f"{name}_" if name else ""
+        count = int(mask.sum())
+        successful = int(frame.loc[mask, "success"].sum())
+        summary[f"{prefix}total"] = count
+        summary[f"{prefix}successful"] = successful
+        summary[f"{prefix}success_rate"] = successful / count if count > 0 else 0
+    return summary
+
+
+def save_runs(runs, path):
+    """Writes runs as Parquet. Returns the path, or None if no Parquet engine (pyarrow) is installed."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+        runs.to_parquet(path, index=False)
+    except ImportError as e:
+        print(f"Not saving {path}: {e}")
+        return None
+    print(f"Runs saved to {path}")
+    return path
+
+
+def load_runs(path):
+    return pd.read_parquet(path)
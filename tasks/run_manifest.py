@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+"""
+Machine-readable record of one evaluation_script.py invocation.
+
+evaluation_script.py writes run_manifest.json into the experiment folder (and to the
+path given with --run_manifest) as soon as the folder exists, and rewrites it after
+every job and at the end. It holds the experiment folder, the task file and ids, the
+status ("running", "finished" or "failed"), start and end times, the outcome and
+duration of every job and the final results. A driver that starts the script with
+its own --run_manifest path knows exactly which experiment folder belongs to its run,
+without watching experiments/ for new folders.
+
+Example usage:
+    manifest = RunManifest(["experiments/exp_04-22_16-20/run_manifest.json"], experiment_folder=...)
+    manifest.job_done(slot, job, ok, duration)
+    manifest.finish(results)
+
+    run = read_run_manifest("tasks/run_manifests/run_001.json")
+    if run["status"] == "finished": print(run["experiment_folder"])
+"""
+
+RUN_MANIFEST_FILE_NAME = "run_manifest.json"
+
+
+def write_json_atomic(path, data):
+    """Replaces path with data in one step, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def read_run_manifest(path):
+    """Returns the run manifest at path, or None if it does not exist (yet)."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class RunManifest:
+    def __init__(self, paths, **fields):
+        """
+        Publishes a new manifest with status "running".
+
+        Args:
+            paths (list): Files the manifest is written to.
+            **fields: Description of the run, e.g. experiment_folder, task_path, task_ids, num_exp.
+        """
+        self.paths = [path for path in paths if path]
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.data = dict(fields, status="running", pid=os.getpid(),
+                         started_at=datetime.now().isoformat(timespec="seconds"),
+                         finished_at=None, duration=None, jobs=[], results=None)
+        self.save()
+
+    def save(self):
+        for path in self.paths:
+            write_json_atomic(path, self.data)
+
+    def job_done(self, slot, job, ok, duration):
+        """Records a finished job; has the on_done signature of task_scheduler.start_workers."""
+        with self.lock:
+            self.data["jobs"].append({"task_id": job.task_id, "repetition": job.repetition,
+                                      "slot": slot["session_name"], "ok": ok, "duration": round(duration, 3)})
+            self.save()
+
+    def update(self, **fields):
+        """Adds or replaces fields of the manifest, e.g. a summary computed at the end of the run."""
+        with self.lock:
+            self.data.update(fields)
+            self.save()
+
+    def finish(self, results=None, status="finished", error=None):
+        """Records the end of the run with its results, or status="failed" and the error."""
+        with self.lock:
+            self.data.update(status=status, results=results, error=error,
+                             finished_at=datetime.now().isoformat(timespec="seconds"),
+                             duration=round(time.monotonic() - self.start, 3))
+            self.save()
@@ -0,0 +1,210 @@
+import os
+import json
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import boto3
+from botocore.exceptions import ClientError
+from tqdm import tqdm
+
+"""
+Concurrent, resumable download of experiment folders from S3.
+
+Objects are listed with pagination, downloaded by a bounded thread pool and recorded
+in a manifest next to the downloaded folders. Objects whose ETag and size match the
+manifest (and whose local copy is intact) are skipped, so an interrupted pull can
+simply be run again. The storage backend is pluggable: LocalBackend serves a plain
+directory laid out like a bucket, which lets the downloader run without AWS.
+
+Example usage:
+    folders = download_s3_folders("mindcraft", "experiments/gpt-4o/", "experiments")
+    folders = download_s3_folders("unused", "exp/", "/tmp/out", backend=LocalBackend("/tmp/fake_bucket"))
+"""
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MANIFEST_FILE_NAME = ".s3_manifest.json"
+# Save the manifest after this many completed downloads so a crash loses little work
+MANIFEST_SAVE_EVERY = 50
+
+
+class S3Backend:
+    """Reads objects from an S3 bucket through boto3."""
+
+    def __init__(self, bucket_name, client=None):
+        if client is None:
+            client = boto3.client('s3')
+        self.bucket_name = bucket_name
+        self.client = client
+
+    def list_objects(self, prefix):
+        """Yields {"Key", "Size", "ETag"} dicts for every object under prefix, across all pages."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield {"Key": obj['Key'], "Size": obj['Size'], "ETag": obj['ETag'].strip('"')}
+
+    def download(self, key, local_path):
+        self.client.download_file(self.bucket_name, key, local_path)
+
+
+class LocalBackend:
+    """Serves a local directory as if it were a bucket; keys are '/'-separated relative paths."""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def list_objects(self, prefix):
+        for dir_path, dir_names, file_names in os.walk(self.root_dir):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                path = os.path.join(dir_path, file_name)
+                key = os.path.relpath(path, self.root_dir).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    yield {"Key": key, "Size": os.path.getsize(path), "ETag": file_md5(path)}
+
+    def download(self, key, local_path):
+        shutil.copyfile(os.path.join(self.root_dir, *key.split('/')), local_path)
+
+
+def file_md5(path):
+    """MD5 hex digest of a file, which is what S3 reports as ETag for single-part uploads."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_up_to_date(obj, local_path, manifest):
+    entry = manifest.get(obj["Key"])
+    if entry is None or entry.get("etag") != obj["ETag"] or entry.get("size") != obj["Size"]:
+        return False
+    return os.path.isfile(local_path) and os.path.getsize(local_path) == obj["Size"]
+
+
+def download_objects(backend, objects, manifest_path, max_workers=16):
+    """
+    Downloads objects to their local paths, skipping the ones already recorded in the manifest.
+
+    Args:
+        backend: S3Backend, LocalBackend or any object with the same download method.
+        objects (list): (object, local_path) pairs, objects as yielded by backend.list_objects. Of
+            several objects with the same local path only the last one is downloaded.
+        manifest_path (str): JSON file recording the ETag and size of every completed download.
+        max_workers (int): Number of concurrent downloads.
+
+    Returns:
+        tuple: (downloaded, skipped, failed) keys.
+    """
+    manifest = load_manifest(manifest_path)
+    downloaded, skipped, failed = [], [], []
+
+    # One download per target file, so no two threads write the same path
+    targets = {}
+    for obj, local_path in objects:
+        targets[local_path] = obj
+
+    pending = []
+    for local_path, obj in targets.items():
+        if is_up_to_date(obj, local_path, manifest):
+            skipped.append(obj["Key"])
+        else:
+            pending.append((obj, local_path))
+
+    def fetch(obj, local_path):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        # Download next to the target and rename, so an interrupted transfer never looks complete
+        part_path = local_path + ".part"
+        backend.download(obj["Key"], part_path)
+        os.replace(part_path, local_path)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(fetch, obj, local_path): obj for obj, local_path in pending}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                obj = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error downloading {obj['Key']}: {e}")
+                    failed.append(obj["Key"])
+                    continue
+                manifest[obj["Key"]] = {"etag": obj["ETag"], "size": obj["Size"]}
+                downloaded.append(obj["Key"])
+                if len(downloaded) % MANIFEST_SAVE_EVERY == 0:
+                    save_manifest(manifest, manifest_path)
+        save_manifest(manifest, manifest_path)
+
+    print(f"Downloaded {len(downloaded)} objects, skipped {len(skipped)} up-to-date, {len(failed)} failed")
+    return downloaded, skipped, failed
+
+
+def download_s3_folders(bucket_name, s3_prefix, local_base_dir, backend=None, max_workers=16):
+    """
+    Downloads groups of folders from S3 based on the next level of prefixes.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket.
+        s3_prefix (str): Prefix where the folders are located (e.g., 'my-experiments/').
+        local_base_dir (str): Local directory to download the folders to.
+        backend: Storage backend, defaults to S3Backend(bucket_name).
+        max_workers (int): Number of concurrent downloads.
+
+    Returns:
+        list: List of downloaded local folder paths.
+    """
+    if backend is None:
+        backend = S3Backend(bucket_name)
+
+    # Ensure local_base_dir is relative to project root if not absolute
+    if not os.path.isabs(local_base_dir):
+        local_base_dir = os.path.join(project_root, local_base_dir)
+
+    subfolder = s3_prefix.split('/')[-2]
+    local_root = os.path.join(local_base_dir, subfolder)
+
+    try:
+        listing = list(backend.list_objects(s3_prefix))
+    except ClientError as e:
+        print(f"Error accessing S3: {e}")
+        return []
+
+    # Files of each folder one level below the prefix are flattened into that folder
+    objects = []
+    folder_names = {}
+    for obj in listing:
+        parts = obj["Key"][len(s3_prefix):].split('/')
+        if len(parts) < 2 or not parts[0]:
+            continue
+        folder_names[parts[0]] = True
+        objects.append((obj, os.path.join(local_root, parts[0], parts[-1])))
+
+    if not folder_names:
+        print(f"No folders found under s3://{bucket_name}/{s3_prefix}")
+        return []
+
+    downloaded_folders = []
+    for folder_name in folder_names:
+        local_folder_path = os.path.join(local_root, folder_name)
+        os.makedirs(local_folder_path, exist_ok=True)
+        downloaded_folders.append(local_folder_path)
+
+    download_objects(backend, objects, os.path.join(local_root, MANIFEST_FILE_NAME), max_workers=max_workers)
+    return downloaded_folders
@@ -0,0 +1,200 @@
+import os
+import json
+import argparse
+import subprocess
+
+from readiness import wait_until, port_open
+from server_provisioning import provision_slots
+
+"""
+Long-lived pool of Minecraft server slots that survives between evaluation runs.
+
+Slot i lives in tasks/server_data_{i}/, listens on port 55916 + i and runs in the
+tmux session server_{i}. The pool remembers in a small registry which world every
+slot was booted with. start() reuses a slot whose server is still up with the same
+world and only provisions and cold-boots the others, so consecutive invocations skip
+the JVM and world startup. Between jobs, reset_world() cleans the world up through
+the server console instead of restarting it.
+
+Example usage:
+    pool = ServerPool(4, world_name="Superflat")
+    servers = pool.start()
+    pool.reset_world(0, task)
+    pool.shutdown()
+
+The pool can also be managed by hand:
+    python tasks/server_pool.py stop --num_slots 4
+"""
+
+TASKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_PORT = 55916
+REGISTRY_PATH = os.path.join(TASKS_DIR, ".server_pool.json")
+SERVER_START_TIMEOUT = 180
+SERVER_STOP_TIMEOUT = 30
+# Console commands run before every job: drop loose items and restore a neutral day
+RESET_COMMANDS = [
+    "kill @e[type=item]",
+    "kill @e[type=experience_orb]",
+    "clear @a",
+    "effect clear @a",
+    "time set day",
+    "weather clear",
+]
+
+
+def write_properties(path, updates):
+    """Sets the given keys of a server.properties file, keeping the other lines as they are."""
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    remaining = dict(updates)
+    with open(path, 'w') as f:
+        for line in lines:
+            key = line.split("=", 1)[0]
+            if key in remaining:
+                f.write(f"{key}={remaining.pop(key)}\n")
+            else:
+                f.write(line)
+        for key, value in remaining.items():
+            f.write(f"{key}={value}\n")
+
+
+def slot_path(i):
+    """Absolute server folder of slot i, so the slots do not depend on the working directory."""
+    return os.path.join(TASKS_DIR, f"server_data_{i}", "")
+
+
+def blueprint_reset_command(blueprint):
+    """The /fill command resetConstructionWorld in construction_tasks.js uses to clear a blueprint's area."""
+    start = blueprint["levels"][0]["coordinates"]
+    length = len(blueprint["levels"][0]["placement"]) + 5
+    height = len(blueprint["levels"]) + 5
+    width = len(blueprint["levels"][0]["placement"][0]) + 5
+    return (f"fill {start[0]} {start[1]} {start[2]} "
+            f"{start[0] + width} {start[1] + height} {start[2] + length} air")
+
+
+class ServerPool:
+    def __init__(self, num_slots, template_path=os.path.join(TASKS_DIR, "server_data", ""), world_name="Forest", registry_path=REGISTRY_PATH):
+        """
+        Args:
+            num_slots (int): Number of servers.
+            template_path (str): Pristine server folder slots are provisioned from.
+            world_name (str): Level name every slot must run.
+            registry_path (str): JSON file recording the world each running slot was booted with.
+        """
+        self.num_slots = num_slots
+        self.template_path = template_path
+        self.world_name = world_name
+        self.registry_path = registry_path
+
+    def server_path(self, i):
+        return slot_path(i)
+
+    def port(self, i):
+        return BASE_PORT + i
+
+    def session_name(self, i):
+        return f"server_{i}"
+
+    def load_registry(self):
+        try:
+            with open(self.registry_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_registry(self, registry):
+        with open(self.registry_path, 'w') as f:
+            json.dump(registry, f, indent=4)
+
+    def is_warm(self, i, registry):
+        """True if slot i is still serving the pool's world from its own folder."""
+        entry = registry.get(str(i))
+        return (entry is not None
+                and entry.get("world_name") == self.world_name
+                and entry.get("server_path") == self.server_path(i)
+                and port_open(self.port(i)))
+
+    def send_command(self, i, command):
+        subprocess.run(["tmux", "send-keys", "-t", self.session_name(i), command, "C-m"])
+
+    def stop_server(self, i):
+        if port_open(self.port(i)):
+            self.send_command(i, "stop")
+            wait_until(lambda: not port_open(self.port(i)), timeout=SERVER_STOP_TIMEOUT,
+                       description=f"server on port {self.port(i)} to stop")
+        subprocess.run(["tmux", "kill-session", "-t", self.session_name(i)], stderr=subprocess.DEVNULL)
+
+    def boot_server(self, i):
+        session_name = self.session_name(i)
+        subprocess.run(["tmux", "new-session", "-d", "-s", session_name], check=True)
+        self.send_command(i, f"cd {self.server_path(i)} && java -jar server.jar")
+        if not wait_until(lambda: port_open(self.port(i)), timeout=SERVER_START_TIMEOUT,
+                          description=f"server on port {self.port(i)}"):
+            raise RuntimeError(f"Server {i} did not start within {SERVER_START_TIMEOUT}s")
+
+    def start(self):
+        """
+        Makes sure every slot runs a server with the pool's world, reusing running ones.
+
+        Returns:
+            list: (server_path, port) per slot, as create_server_files in evaluation_script.py.
+        """
+        registry = self.load_registry()
+        cold = [i for i in range(self.num_slots) if not self.is_warm(i, registry)]
+        print(f"Reusing {self.num_slots - len(cold)} running servers, starting {len(cold)}")
+
+        for i in cold:
+            self.stop_server(i)
+            registry.pop(str(i), None)
+        self.save_registry(registry)
+
+        provision_slots(self.template_path, [self.server_path(i) for i in cold])
+        for i in cold:
+            write_properties(os.path.join(self.server_path(i), "server.properties"),
+                             {"server-port": self.port(i), "level-name": self.world_name})
+            self.boot_server(i)
+            registry[str(i)] = {"world_name": self.world_name, "server_path": self.server_path(i),
+                                "port": self.port(i)}
+            self.save_registry(registry)
+
+        return [(self.server_path(i), self.port(i)) for i in range(self.num_slots)]
+
+    def reset_world(self, i, task=None):
+        """
+        Cleans up slot i between jobs without restarting its server.
+
+        Args:
+            i (int): Slot index.
+            task (dict): Definition of the next task. Construction tasks also get their blueprint area cleared.
+        """
+        commands = list(RESET_COMMANDS)
+        if task is not None and task.get("blueprint"):
+            commands.append(blueprint_reset_command(task["blueprint"]))
+        for command in commands:
+            self.send_command(i, command)
+
+    def shutdown(self):
+        """Stops every server of the pool and forgets it."""
+        registry = self.load_registry()
+        for i in range(self.num_slots):
+            self.stop_server(i)
+            registry.pop(str(i), None)
+        self.save_registry(registry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the pool of warm Minecraft servers')
+    parser.add_argument('action', choices=['start', 'stop'], help='Start (or reuse) the servers, or stop them')
+    parser.add_argument('--num_slots', default=1, type=int, help='Number of servers in the pool')
+    parser.add_argument('--world_name', default="Forest", help='Level name of the servers')
+    args = parser.parse_args()
+
+    pool = ServerPool(args.num_slots, world_name=args.world_name)
+    if args.action == 'start':
+        print(pool.start())
+    else:
+        pool.shutdown()
+
+if __name__ == "__main__":
+    main()
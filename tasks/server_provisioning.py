@@ -0,0 +1,181 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Provisions per-slot copies of the Minecraft server folder from a pristine template.
+
+Jar files (the server jar, libraries, versions), which the server never writes, are
+hardlinked into each slot. Everything else is reflinked where the file system supports it
+(btrfs, XFS, APFS-like copy-on-write) and copied otherwise, so a running server can
+never modify the template. Every slot is checked against a content manifest of the
+template, which is cached next to the template and only re-hashed for changed files.
+
+Example usage:
+    servers = provision_slots("./tasks/server_data/", [f"./tasks/server_data_{i}/" for i in range(16)])
+"""
+
+MANIFEST_FILE_NAME = ".provision_manifest.json"
+# Paths (relative to the template, '/'-separated) the server only ever reads. They are hardlinked,
+# so a write to one of them would reach the template and every other slot.
+IMMUTABLE_PATTERNS = ["*.jar"]
+# ioctl request that makes a file share the blocks of another file (Linux FICLONE)
+FICLONE = 0x40049409
+
+
+def is_immutable(rel_path, patterns=IMMUTABLE_PATTERNS):
+    return any(fnmatch.fnmatch(rel_path, pattern) for pattern in patterns)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def template_files(template_path):
+    """Yields the '/'-separated relative path of every file in the template."""
+    for dir_path, dir_names, file_names in os.walk(template_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            rel_path = os.path.relpath(os.path.join(dir_path, file_name), template_path).replace(os.sep, '/')
+            if rel_path != MANIFEST_FILE_NAME:
+                yield rel_path
+
+
+def build_manifest(template_path):
+    """
+    Content manifest of the template: size, mtime and SHA-256 of every file.
+
+    The manifest is cached in the template folder; files whose size and mtime are
+    unchanged keep their cached hash.
+
+    Returns:
+        dict: Maps each relative path to {"size", "mtime_ns", "sha256"}.
+    """
+    manifest_path = os.path.join(template_path, MANIFEST_FILE_NAME)
+    try:
+        with open(manifest_path, 'r') as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cached = {}
+
+    manifest = {}
+    for rel_path in template_files(template_path):
+        st = os.stat(os.path.join(template_path, rel_path))
+        entry = cached.get(rel_path)
+        if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                     "sha256": file_sha256(os.path.join(template_path, rel_path))}
+        manifest[rel_path] = entry
+
+    if manifest != cached:
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def reflink_or_copy(src, dst):
+    """Clones src to dst sharing its blocks if the file system allows it, otherwise copies it."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copystat(src, dst)
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different file system or no hardlink support
+        reflink_or_copy(src, dst)
+
+
+def provision_slot(template_path, dest_path, manifest, immutable_patterns=IMMUTABLE_PATTERNS):
+    """
+    Builds dest_path from the template. An existing dest_path is replaced.
+
+    Args:
+        template_path (str): Pristine server folder.
+        dest_path (str): Folder of the slot.
+        manifest (dict): Manifest of the template, see build_manifest.
+        immutable_patterns (list): Patterns of files that are hardlinked instead of cloned.
+    """
+    if os.path.exists(dest_path):
+        shutil.rmtree(dest_path)
+    for rel_path in manifest:
+        src = os.path.join(template_path, rel_path)
+        dst = os.path.join(dest_path, rel_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if is_immutable(rel_path, immutable_patterns):
+            link_or_copy(src, dst)
+        else:
+            reflink_or_copy(src, dst)
+
+
+def verify_slot(template_path, dest_path, manifest, full=False):
+    """
+    Checks a freshly provisioned slot against the template manifest.
+
+    Hardlinked files must be the template's own inode; other files must have the
+    manifest size. With full=True every file, hardlinked ones included, must also
+    have the manifest SHA-256, which catches a shared file modified in place.
+
+    Returns:
+        list: Relative paths that are missing or differ (empty if the slot is intact).
+    """
+    bad = []
+    for rel_path, entry in manifest.items():
+        dst = os.path.join(dest_path, rel_path)
+        try:
+            st = os.stat(dst)
+        except FileNotFoundError:
+            bad.append(rel_path)
+            continue
+        src_st = os.stat(os.path.join(template_path, rel_path))
+        if (st.st_ino, st.st_dev) == (src_st.st_ino, src_st.st_dev) and not full:
+            continue
+        if st.st_size != entry["size"] or (full and file_sha256(dst) != entry["sha256"]):
+            bad.append(rel_path)
+    return bad
+
+
+def provision_slots(template_path, dest_paths, max_workers=8, full_check=False):
+    """
+    Provisions several slots from one template in parallel and verifies each of them.
+
+    A slot that fails verification is provisioned once more; if it is still not
+    intact an error is raised.
+
+    Args:
+        template_path (str): Pristine server folder.
+        dest_paths (list): Folders of the slots.
+        max_workers (int): Number of slots built concurrently.
+        full_check (bool): Also compare the SHA-256 of every file, hardlinked or cloned.
+
+    Returns:
+        list: dest_paths, all provisioned.
+    """
+    manifest = build_manifest(template_path)
+
+    def build(dest_path):
+        for attempt in range(2):
+            provision_slot(template_path, dest_path, manifest)
+            bad = verify_slot(template_path, dest_path, manifest, full=full_check)
+            if not bad:
+                return dest_path
+            print(f"{dest_path} differs from {template_path} in {len(bad)} files, e.g. {bad[:3]}")
+        raise RuntimeError(f"Could not provision {dest_path} from {template_path}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(build, dest_paths))
@@ -0,0 +1,142 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+"""
+Decodes the attributes encoded in task ids, shared by the analyzers and task filters.
+
+Each task family names its tasks with a fixed grammar:
+    crafting:     multiagent_crafting_pink_wool_full_plan_missing_black_wool__depth_0_num_agents_3
+    cooking:      multiagent_cooking_2_1_bread_1_golden_apple_blocked_access_0_1
+    construction: materials_1_rooms_2_window_0_carpet_1_variant_3
+
+parse_task_id decodes one id (memoized); parse_task_ids decodes a whole column of
+ids at once with pandas string operations.
+
+Example usage:
+    task = parse_task_id("multiagent_crafting_lectern_full_plan__depth_2")
+    task.depth, task.plan  # (2, "full_plan")
+    features = parse_task_ids(runs["task_id"])
+"""
+
+FAMILY_PATTERN = re.compile(r"^multiagent_(cooking|crafting|techtree)_")
+DEPTH_PATTERN = re.compile(r"depth_(\d+)")
+PLAN_PATTERN = re.compile(r"(full_plan|partial_plan|no_plan|with_plan)")
+NUM_AGENTS_PATTERN = re.compile(r"num_agents_(\d+)")
+BLOCKED_ACCESS_PATTERN = re.compile(r"blocked_access_([0-9_]+)$")
+CONSTRUCTION_PATTERN = re.compile(r"materials_(\d+)_rooms_(\d+)(?:_window_(\d+)_carpet_(\d+)(?:_variant_(\d+))?)?")
+COOKING_ITEM_PATTERN = re.compile(r"([0-9]+)_([a-zA-Z_]+)")
+COOKING_PREFIX_PATTERN = re.compile(r"^multiagent_cooking_")
+BLOCKED_SUFFIX_PATTERN = re.compile(r"_blocked_access_[0-9_]+$")
+
+CONSTRUCTION_FIELDS = ["materials", "rooms", "window", "carpet", "variant"]
+INTEGER_FIELDS = ["depth", "num_agents"] + CONSTRUCTION_FIELDS
+
+
+class TaskFeatures(NamedTuple):
+    family: str  # "crafting", "cooking", "techtree", "construction" or "other"
+    depth: Optional[int]
+    plan: Optional[str]  # "full_plan", "partial_plan", "no_plan" or "with_plan"
+    missing: bool
+    num_agents: Optional[int]
+    blocked_access: tuple  # indices of the agents with blocked access
+    items: tuple  # cooking items
+    materials: Optional[int]
+    rooms: Optional[int]
+    window: Optional[int]
+    carpet: Optional[int]
+    variant: Optional[int]
+
+    @property
+    def num_blocked(self):
+        return len(self.blocked_access)
+
+
+def optional_int(value):
+    return int(value) if value is not None else None
+
+
+def task_family(task_id):
+    match = FAMILY_PATTERN.match(task_id)
+    if match:
+        return match.group(1)
+    if CONSTRUCTION_PATTERN.search(task_id):
+        return "construction"
+    return "other"
+
+
+def parse_blocked_access(task_id):
+    match = BLOCKED_ACCESS_PATTERN.search(task_id)
+    return tuple(int(agent) for agent in match.group(1).split("_") if agent) if match else ()
+
+
+def parse_cooking_items(task_id):
+    """Items to cook in a multiagent_cooking_* task id, e.g. ('bread', 'golden_apple')."""
+    if not task_id.startswith("multiagent_cooking_"):
+        return ()
+    clean_name = BLOCKED_SUFFIX_PATTERN.sub("", COOKING_PREFIX_PATTERN.sub("", task_id))
+    return tuple(match.group(2).rstrip("_") for match in COOKING_ITEM_PATTERN.finditer(clean_name))
+
+
+@lru_cache(maxsize=None)
+def parse_task_id(task_id):
+    """
+    Decodes a task id (or task folder name).
+
+    Returns:
+        TaskFeatures: Attributes found in the id; absent ones are None, False or empty.
+    """
+    depth = DEPTH_PATTERN.search(task_id)
+    plan = PLAN_PATTERN.search(task_id)
+    num_agents = NUM_AGENTS_PATTERN.search(task_id)
+    construction = CONSTRUCTION_PATTERN.search(task_id)
+    construction_values = construction.groups() if construction else (None,) * len(CONSTRUCTION_FIELDS)
+    return TaskFeatures(
+        family=task_family(task_id),
+        depth=optional_int(depth.group(1)) if depth else None,
+        plan=plan.group(1) if plan else None,
+        missing="missing" in task_id,
+        num_agents=optional_int(num_agents.group(1)) if num_agents else None,
+        blocked_access=parse_blocked_access(task_id),
+        items=parse_cooking_items(task_id),
+        **{field: optional_int(value) for field, value in zip(CONSTRUCTION_FIELDS, construction_values)},
+    )
+
+
+def parse_task_ids(task_ids):
+    """
+    Decodes a column of task ids in one pass over its distinct values.
+
+    Args:
+        task_ids (iterable): Task ids, e.g. a pandas Series.
+
+    Returns:
+        pd.DataFrame: One row per distinct id, indexed by it, with the TaskFeatures fields
+            (nullable Int64 for the numeric ones) and num_blocked.
+    """
+    ids = pd.Series(pd.unique(pd.Series(task_ids, dtype="object")), dtype="object")
+    features = pd.DataFrame(index=pd.Index(ids, name="task_id"))
+
+    family = ids.str.extract(FAMILY_PATTERN, expand=False)
+    construction = ids.str.extract(CONSTRUCTION_PATTERN)
+    construction.columns = CONSTRUCTION_FIELDS
+    family = family.where(family.notna(), construction["materials"].notna().map({True: "construction", False: "other"}))
+
+    features["family"] = family.values
+    features["depth"] = ids.str.extract(DEPTH_PATTERN, expand=False).values
+    features["plan"] = ids.str.extract(PLAN_PATTERN, expand=False).values
+    features["missing"] = ids.str.contains("missing", regex=False).values
+    features["num_agents"] = ids.str.extract(NUM_AGENTS_PATTERN, expand=False).values
+    for field in CONSTRUCTION_FIELDS:
+        features[field] = construction[field].values
+    for field in INTEGER_FIELDS:
+        features[field] = pd.to_numeric(features[field]).astype("Int64")
+
+    blocked = ids.str.extract(BLOCKED_ACCESS_PATTERN, expand=False)
+    features["blocked_access"] = blocked.map(
+        lambda value: tuple(int(agent) for agent in value.split("_") if agent) if isinstance(value, str) else ()).values
+    features["num_blocked"] = features["blocked_access"].map(len)
+    features["items"] = ids.map(parse_cooking_items).values
+    return features
@@ -0,0 +1,275 @@
+import re
+import heapq
+import random
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import accumulate, product
+from typing import NamedTuple
+
+from task_ids import parse_task_id
+
+"""
+Stratified sampling of construction tasks by difficulty.
+
+A DifficultyIndex buckets the tasks of a task file by (m, r, w, c, levels): the
+materials, rooms, window and carpet values of the task id and the number of blueprint
+levels (read from the TaskStore index, so no blueprint is decoded). Which tasks to draw
+is written as a list of quotas, one per line of the sampling plan:
+    "3 per (m,r) with m,r<=2 and w,c<=1"   3 random tasks for every (m, r) value present
+    "2 with m,r,w,c=0"                     2 random tasks among the matching ones
+    "500 first by (m,r,w,c)"               the first 500 tasks, lowest (m, r, w, c) first,
+                                           in file order within a value
+Conditions are "<fields><op><int>" joined by "and", with op one of = == != < <= > >=;
+the fields are m, r, w, c and levels (or materials, rooms, window, carpet, num_levels).
+
+A quota only looks at the buckets its conditions select and draws positions in the
+union of those buckets, so sampling costs O(quota) per group instead of a scan over the
+tasks. A task is never drawn twice, and the same seed gives the same sample. A quota
+that finds too few tasks prints a warning; for a "per" quota whose conditions bound
+every group field from above, that includes the allowed values without any task.
+
+Example usage:
+    tasks = TaskStore("tasks/construction_tasks/test/2_agents.json")
+    sampler = StratifiedSampler(DifficultyIndex.from_store(tasks), seed=0)
+    task_ids = sampler.sample(["3 per (m,r) with w,c<=1", "2 with m,r,w,c=0"], where="levels>=3")
+"""
+
+FIELDS = ("m", "r", "w", "c", "levels")
+FIELD_ALIASES = {"materials": "m", "rooms": "r", "window": "w", "carpet": "c", "num_levels": "levels"}
+OPERATORS = {
+    "=": lambda a, b: a == b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+QUOTA_PATTERN = re.compile(r"^\s*(\d+)\s*(?:(per|first\s+by)\s*\(([^)]*)\))?\s*(?:with\s+(.+?))?\s*$")
+CONDITION_PATTERN = re.compile(r"^\s*([a-z_,\s]+?)\s*(==|!=|<=|>=|=|<|>)\s*(-?\d+)\s*$")
+
+
+class Quota(NamedTuple):
+    count: int
+    mode: str  # "random", "per" or "first"
+    group_by: tuple  # field positions in the index keys
+    conditions: tuple  # (field position, operator, value)
+    text: str
+
+
+def task_difficulty(task_id):
+    """(m, r, w, c) of a construction task id, (0, 0, 0, 0) for ids without them."""
+    task = parse_task_id(task_id)
+    if task.variant is not None:
+        return (task.materials, task.rooms, task.window, task.carpet)
+    return (0, 0, 0, 0)
+
+
+def field_position(name):
+    name = FIELD_ALIASES.get(name, name)
+    if name not in FIELDS:
+        raise ValueError(f"Unknown field '{name}', expected one of {', '.join(FIELDS)}")
+    return FIELDS.index(name)
+
+
+def parse_fields(text):
+    return tuple(field_position(name.strip()) for name in text.split(",") if name.strip())
+
+
+def parse_conditions(text):
+    """Parses "w,c<=1 and levels>=3" into (field position, operator, value) triples."""
+    conditions = []
+    if not text:
+        return tuple(conditions)
+    for part in re.split(r"\s+and\s+", text.strip()):
+        match = CONDITION_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"Cannot parse condition '{part}'")
+        fields, operator, value = match.groups()
+        conditions.extend((position, operator, int(value)) for position in parse_fields(fields))
+    return tuple(conditions)
+
+
+def parse_quota(text):
+    """
+    Parses one quota of a sampling plan, see the module docstring.
+
+    Returns:
+        Quota: The parsed quota.
+    """
+    match = QUOTA_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Cannot parse quota '{text}'")
+    count, mode, group_by, conditions = match.groups()
+    mode = "random" if mode is None else mode.split()[0]
+    return Quota(int(count), mode, parse_fields(group_by or ""), parse_conditions(conditions), text.strip())
+
+
+def matches(key, conditions):
+    return all(OPERATORS[operator](key[position], value) for position, operator, value in conditions)
+
+
+def field_values(position, conditions):
+    """Values of a field the conditions allow, None if they set no upper bound. Fields are never negative."""
+    low, high = 0, None
+    for field, operator, value in conditions:
+        if field != position:
+            continue
+        if operator in ("=", "==", ">=", ">"):
+            low = max(low, value + (operator == ">"))
+        if operator in ("=", "==", "<=", "<"):
+            bound = value - (operator == "<")
+            high = bound if high is None else min(high, bound)
+    if high is None:
+        return None
+    return [value for value in range(low, high + 1)
+            if all(OPERATORS[operator](value, bound) for field, operator, bound in conditions if field == position)]
+
+
+def expected_groups(group_by, conditions):
+    """Every group_by value the conditions allow, or [] if some group field is unbounded."""
+    values = [field_values(position, conditions) for position in group_by]
+    if any(field is None for field in values):
+        return []
+    return list(product(*values))
+
+
+class DifficultyIndex:
+    def __init__(self, task_ids, num_levels):
+        """
+        Args:
+            task_ids (list): Task ids, in file order.
+            num_levels (list): Number of blueprint levels of every task.
+        """
+        self.task_ids = list(task_ids)
+        # (m, r, w, c, levels) of every task, and the positions of the tasks of every such key
+        self.keys = []
+        self.buckets = defaultdict(list)
+        for position, (task_id, levels) in enumerate(zip(self.task_ids, num_levels)):
+            key = task_difficulty(task_id) + (levels,)
+            self.keys.append(key)
+            self.buckets[key].append(position)
+
+    @classmethod
+    def from_store(cls, tasks):
+        """Index of a TaskStore, from its metadata only."""
+        return cls(tasks.task_ids, [tasks.metadata[task_id].get("num_levels", 0) for task_id in tasks.task_ids])
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        """Index of a dict of task definitions."""
+        return cls(list(tasks), [len(task.get("blueprint", {}).get("levels", [])) for task in tasks.values()])
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def select(self, conditions):
+        """Keys of the non-empty buckets that satisfy all conditions."""
+        return [key for key in self.buckets if matches(key, conditions)]
+
+    def count(self, conditions=()):
+        return sum(len(self.buckets[key]) for key in self.select(conditions))
+
+    def groups(self, keys, group_by):
+        """Bucket keys grouped by their values of the group_by fields, in increasing order of those values."""
+        groups = defaultdict(list)
+        for key in keys:
+            groups[tuple(key[position] for position in group_by)].append(key)
+        return sorted(groups.items())
+
+
+class StratifiedSampler:
+    def __init__(self, index, seed=None):
+        """
+        Args:
+            index (DifficultyIndex): The tasks to sample from.
+            seed: Seed of the random draws; None for a different sample every time.
+        """
+        self.index = index
+        self.rng = random.Random(seed)
+
+    def draw(self, keys, count, taken):
+        """
+        Draws up to count random positions from the buckets of keys, skipping taken ones.
+
+        Returns:
+            tuple: (positions, number of untaken positions that were available)
+        """
+        buckets = [self.index.buckets[key] for key in keys]
+        ends = list(accumulate(len(bucket) for bucket in buckets))
+        total = ends[-1] if ends else 0
+        key_set = set(keys)
+        num_taken = sum(1 for position in taken if self.index.keys[position] in key_set)
+        available = total - num_taken
+        if available <= count:
+            return [position for bucket in buckets for position in bucket if position not in taken], available
+
+        # count + num_taken distinct draws always hold count untaken positions
+        picks = []
+        for draw in self.rng.sample(range(total), count + num_taken):
+            b = bisect_right(ends, draw)
+            position = buckets[b][draw - (ends[b - 1] if b else 0)]
+            if position not in taken:
+                picks.append(position)
+                if len(picks) == count:
+                    break
+        return picks, available
+
+    def first(self, keys, count, taken):
+        """The first count untaken positions of the buckets of keys, in file order."""
+        picks = []
+        for position in heapq.merge(*(self.index.buckets[key] for key in keys)):
+            if len(picks) == count:
+                break
+            if position not in taken:
+                picks.append(position)
+        return picks
+
+    def sample(self, quotas, where=None):
+        """
+        Samples the tasks of a plan; quotas are drawn in order and never repeat a task.
+
+        Args:
+            quotas (list): Quota strings (or parsed Quotas), see the module docstring.
+            where (str): Conditions every sampled task must satisfy, e.g. "levels>=3".
+
+        Returns:
+            list: Task ids, quota by quota.
+        """
+        base = parse_conditions(where)
+        taken = set()
+        order = []
+        for quota in quotas:
+            quota = quota if isinstance(quota, Quota) else parse_quota(quota)
+            keys = self.index.select(base + quota.conditions)
+            if quota.mode == "first":
+                remaining = quota.count
+                for _, group_keys in self.index.groups(keys, quota.group_by):
+                    picks = self.first(group_keys, remaining, taken)
+                    taken.update(picks)
+                    order.extend(picks)
+                    remaining -= len(picks)
+                    if remaining == 0:
+                        break
+                if remaining:
+                    print(f"Warning: '{quota.text}' found only {quota.count - remaining} tasks.")
+                continue
+
+            group_by = quota.group_by if quota.mode == "per" else ()
+            if group_by:
+                # Allowed groups without any task are drawn from too, so that they get a warning
+                groups = dict(self.index.groups(keys, group_by))
+                for value in expected_groups(group_by, base + quota.conditions):
+                    groups.setdefault(value, [])
+                groups = sorted(groups.items())
+            else:
+                groups = [((), keys)]
+            for value, group_keys in groups:
+                picks, available = self.draw(group_keys, quota.count, taken)
+                taken.update(picks)
+                order.extend(picks)
+                if available < quota.count:
+                    group = ", ".join(f"{FIELDS[position]}={v}" for position, v in zip(group_by, value))
+                    label = f" for ({group})" if group else ""
+                    print(f"Warning: Not enough tasks{label} in '{quota.text}'. Found {available}.")
+        return [self.index.task_ids[position] for position in order]
@@ -0,0 +1,162 @@
+import time
+import heapq
+import threading
+from typing import NamedTuple
+
+"""
+Central scheduler that shares one queue of (task_id, repetition) jobs between all
+server slots.
+
+Each slot pulls the next job as soon as it becomes free, so a slot never idles while
+another one still has a backlog. Jobs are ordered by estimated cost, longest first,
+which keeps a long construction task from starting last and stretching the sweep.
+
+Example usage:
+    queue = JobQueue(build_jobs(tasks, task_ids, num_exp=3))
+    run_jobs(queue, slots, lambda slot, job: run_job_on_slot(slot, job))
+"""
+
+# Same default as the task timeout in src/agent/tasks/tasks.js
+DEFAULT_TASK_TIMEOUT = 300
+
+
+class Job(NamedTuple):
+    task_id: str
+    repetition: int
+    cost: float
+    # Which task file or run the job belongs to, when one queue serves several of them
+    source: object = None
+
+
+def estimate_cost(task):
+    """Estimated cost of one run of a task: its timeout in seconds."""
+    return task.get("timeout") or DEFAULT_TASK_TIMEOUT
+
+
+def build_jobs(tasks, task_ids, num_exp, cost_fn=estimate_cost, source=None):
+    """
+    Expands tasks into one job per repetition.
+
+    Args:
+        tasks (dict): Task definitions keyed by task id.
+        task_ids (list): IDs of the tasks to run.
+        num_exp (int): Number of repetitions of every task.
+        cost_fn (callable): Maps a task definition to its estimated cost.
+        source: Optional tag stored in every job, e.g. the index of the task file.
+
+    Returns:
+        list: Jobs, one per (task_id, repetition).
+    """
+    jobs = []
+    for task_id in task_ids:
+        cost = cost_fn(tasks[task_id])
+        for repetition in range(num_exp):
+            jobs.append(Job(task_id, repetition, cost, source))
+    return jobs
+
+
+def longest_first(job):
+    """Default JobQueue order: longest estimated cost first, then earlier repetitions."""
+    return (-job.cost, job.repetition)
+
+
+class JobQueue:
+    """
+    Thread-safe priority queue of jobs, longest estimated cost first.
+
+    Among equally expensive jobs, earlier repetitions go first, then jobs in insertion
+    order. Another order can be given as a key function. get() blocks while the queue
+    is empty but other jobs are still running, because finished jobs may add follow-up
+    jobs; it returns None once nothing is queued or running.
+    """
+
+    def __init__(self, jobs=(), key=longest_first):
+        self.key = key
+        self.heap = []
+        self.counter = 0
+        self.in_flight = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        for job in jobs:
+            self.put(job)
+
+    def put(self, job):
+        with self.condition:
+            heapq.heappush(self.heap, (self.key(job), self.counter, job))
+            self.counter += 1
+            self.condition.notify()
+
+    def get(self):
+        with self.condition:
+            while not self.heap and self.in_flight > 0 and not self.closed:
+                self.condition.wait()
+            if not self.heap or self.closed:
+                return None
+            self.in_flight += 1
+            return heapq.heappop(self.heap)[-1]
+
+    def task_done(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def close(self):
+        """Drops the remaining jobs; workers stop after their current job."""
+        with self.condition:
+            self.closed = True
+            self.heap = []
+            self.condition.notify_all()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.heap)
+
+
+def slot_worker(queue, slot, run_job, on_done=None):
+    while True:
+        job = queue.get()
+        if job is None:
+            return
+        start = time.monotonic()
+        ok = False
+        try:
+            run_job(slot, job)
+            ok = True
+        except Exception as e:
+            print(f"Error running {job.task_id} (repetition {job.repetition}): {e}")
+        finally:
+            duration = time.monotonic() - start
+            print(f"Finished {job.task_id} (repetition {job.repetition}) in {duration:.1f}s")
+            try:
+                if on_done is not None:
+                    on_done(slot, job, ok, duration)
+            finally:
+                queue.task_done()
+
+
+def start_workers(queue, slots, run_job, on_done=None):
+    """
+    Starts one worker thread per slot. Each worker repeatedly takes the next job from
+    queue and runs it with run_job(slot, job) until the queue is exhausted.
+
+    Args:
+        queue (JobQueue): Shared job queue.
+        slots (list): One entry per server slot, passed through to run_job.
+        run_job (callable): Runs one job on one slot and blocks until it finishes.
+        on_done (callable): Called as on_done(slot, job, ok, duration) after every job. May put follow-up jobs.
+
+    Returns:
+        list: The started threads.
+    """
+    threads = []
+    for slot in slots:
+        thread = threading.Thread(target=slot_worker, args=(queue, slot, run_job, on_done), daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def run_jobs(queue, slots, run_job, on_done=None):
+    """Same as start_workers, but blocks until every job has run."""
+    for thread in start_workers(queue, slots, run_job, on_done=on_done):
+        thread.join()
@@ -0,0 +1,178 @@
+import os
+import re
+import json
+
+"""
+Lazy, indexed access to task files.
+
+Task files are single JSON objects mapping task ids to task definitions, and the
+construction ones embed a blueprint per task. Listing the ids or reading the type of
+the first task should not decode all of them, so the first TaskStore of a file parses
+it once into an index: the byte offset and length of every task definition, and a few
+small metadata fields (type, agent_count, timeout, human_count, and num_levels for
+tasks with a blueprint). The index is cached
+next to the task file as .<file name>.index.json and rebuilt when the file's size or
+mtime changes. Single tasks are then read by seeking to their offset.
+
+Per-run changes such as the usernames of human players are kept in an overlay, a
+{"*": {...}, task_id: {...}} dict whose fields replace those of every task and of one
+task respectively. The task file itself is never rewritten; main.js applies the same
+overlay when the TASK_OVERRIDES environment variable points to a file written with
+save_overrides.
+
+Example usage:
+    tasks = TaskStore("tasks/construction_tasks/test_multiagent_construction_tasks.json")
+    tasks.task_ids, tasks.metadata[tasks.task_ids[0]]["type"]
+    tasks.get("church_three_agents")  # only this task is decoded
+
+    tasks = TaskStore(task_path, overrides={"*": {"usernames": ["izzycw"]}})
+    save_overrides(tasks.overrides, "experiments/exp_04-22_16-20/task_overrides.json")
+"""
+
+INDEX_VERSION = 2
+# Fields copied into the index, when a task has them
+METADATA_KEYS = ("type", "agent_count", "timeout", "human_count")
+TASK_OVERRIDES_FILE_NAME = "task_overrides.json"
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def index_path(task_path):
+    directory, file_name = os.path.split(task_path)
+    return os.path.join(directory, f".{file_name}.index.json")
+
+
+def task_metadata(task):
+    if not isinstance(task, dict):
+        return {}
+    meta = {key: task[key] for key in METADATA_KEYS if key in task}
+    blueprint = task.get("blueprint")
+    if isinstance(blueprint, dict):
+        # Lets the construction filters select by size without decoding blueprints
+        meta["num_levels"] = len(blueprint.get("levels", []))
+    return meta
+
+
+def build_index(task_path):
+    """
+    Parses a task file into its index.
+
+    Returns:
+        dict: Task id to {"offset", "length", "meta"}, in file order. Offsets and lengths are in bytes.
+    """
+    with open(task_path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    # Character positions equal byte positions unless the file has non-ASCII characters
+    ascii_only = len(text) == len(data)
+    mark = {"char": 0, "byte": 0}
+
+    def byte_offset(char_index):
+        if ascii_only:
+            return char_index
+        mark["byte"] += len(text[mark["char"]:char_index].encode('utf-8'))
+        mark["char"] = char_index
+        return mark["byte"]
+
+    def expect(pos, char):
+        if text[pos:pos + 1] != char:
+            raise ValueError(f"{task_path}: expected '{char}' at character {pos}")
+        return WHITESPACE.match(text, pos + 1).end()
+
+    decoder = json.JSONDecoder()
+    entries = {}
+    pos = expect(WHITESPACE.match(text, 0).end(), "{")
+    if text[pos:pos + 1] == "}":
+        return entries
+    while True:
+        task_id, pos = decoder.raw_decode(text, pos)
+        pos = expect(WHITESPACE.match(text, pos).end(), ":")
+        task, end = decoder.raw_decode(text, pos)
+        start = byte_offset(pos)
+        # A repeated id replaces the earlier definition but keeps its position, as with json.load
+        entries[task_id] = {"offset": start, "length": byte_offset(end) - start, "meta": task_metadata(task)}
+        pos = WHITESPACE.match(text, end).end()
+        if text[pos:pos + 1] == "}":
+            return entries
+        pos = expect(pos, ",")
+
+
+def load_index(task_path):
+    """The index of a task file, from its cache file if that is still up to date."""
+    st = os.stat(task_path)
+    cache_path = index_path(task_path)
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if (cached["version"] == INDEX_VERSION and cached["size"] == st.st_size
+                and cached["mtime_ns"] == st.st_mtime_ns):
+            return cached["tasks"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    entries = build_index(task_path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": INDEX_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "tasks": entries}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not cache the index of {task_path}: {e}")
+    return entries
+
+
+def apply_overrides(task, task_id, overrides):
+    """task with the fields of overrides["*"] and then overrides[task_id] replaced, as in tasks.js."""
+    if not overrides:
+        return task
+    return {**task, **overrides.get("*", {}), **overrides.get(task_id, {})}
+
+
+def save_overrides(overrides, path):
+    """Writes an overlay for main.js, see TASK_OVERRIDES in settings.js."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(overrides, f, indent=4)
+
+
+class TaskStore:
+    def __init__(self, task_path, overrides=None):
+        """
+        Args:
+            task_path (str): Path to the task file.
+            overrides (dict): Optional overlay, {"*": fields of every task, task_id: fields of one task}.
+        """
+        self.task_path = task_path
+        self.overrides = overrides or {}
+        self.index = load_index(task_path)
+        self.task_ids = list(self.index)
+        self.metadata = {task_id: entry["meta"] for task_id, entry in self.index.items()}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, task_id):
+        return task_id in self.index
+
+    def __iter__(self):
+        return iter(self.task_ids)
+
+    def __getitem__(self, task_id):
+        return self.get(task_id)
+
+    def task_type(self):
+        """Type of the first task; task files hold tasks of a single type."""
+        return self.metadata[self.task_ids[0]].get("type") if self.task_ids else None
+
+    def get(self, task_id):
+        """Decodes a single task, with the overlay applied."""
+        entry = self.index.get(task_id)
+        if entry is None:
+            raise KeyError(f"Task {task_id} not found in {self.task_path}")
+        with open(self.task_path, 'rb') as f:
+            f.seek(entry["offset"])
+            task = json.loads(f.read(entry["length"]))
+        return apply_overrides(task, task_id, self.overrides)
+
+    def items(self):
+        for task_id in self.task_ids:
+            yield task_id, self.get(task_id)
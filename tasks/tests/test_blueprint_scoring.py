@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import math
+import random
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from blueprint import Blueprint
+from blueprint_scoring import load_blueprint, mismatch_list, score, score_file
+
+"""
+Checks the NumPy scoring of world snapshots against a direct port of Blueprint.checkLevel
+in src/agent/tasks/construction_tasks.js, on random blueprints and worlds.
+"""
+
+BLOCKS = ["air", "oak_planks", "stone_bricks", "oak_door", "glass_pane", "torch"]
+# Blocks that may be in the world but in no blueprint
+WORLD_BLOCKS = BLOCKS + ["dirt", "cobblestone"]
+
+
+def check(blueprint, blocks):
+    """Blueprint.check with bot.blockAt reading blocks, {(x, y, z): name}; unknown positions are air."""
+    matches, mismatches = [], []
+    for level in blueprint["levels"]:
+        start_x, y, start_z = level["coordinates"]
+        for z_offset, row in enumerate(level["placement"]):
+            for x_offset, block_name in enumerate(row):
+                x, z = start_x + x_offset, start_z + z_offset
+                actual_block_name = blocks.get((x, y, z), "air")
+                if block_name == "air" and actual_block_name == "air":
+                    continue
+                item = {"level": level["level"], "coordinates": [x, y, z],
+                        "expected": block_name, "actual": actual_block_name}
+                (mismatches if actual_block_name != block_name else matches).append(item)
+    return matches, mismatches
+
+
+def random_blueprint(rng):
+    num_levels, depth, width = rng.randint(1, 4), rng.randint(1, 6), rng.randint(1, 6)
+    start_x, start_y, start_z = rng.randint(-20, 20), rng.randint(-60, -50), rng.randint(-20, 20)
+    palette = rng.sample(BLOCKS[1:], rng.randint(1, 3))
+    return {"materials": {}, "levels": [
+        {"level": level, "coordinates": [start_x, start_y + level, start_z],
+         "placement": [[rng.choice(["air"] + palette) for _ in range(width)] for _ in range(depth)]}
+        for level in range(num_levels)]}
+
+
+def random_world(rng, blueprint):
+    """Builds part of the blueprint, with wrong, extra and explicit air blocks, also around it."""
+    blocks = {}
+    for level in blueprint["levels"]:
+        start_x, y, start_z = level["coordinates"]
+        for z_offset, row in enumerate(level["placement"]):
+            for x_offset, block_name in enumerate(row):
+                position = (start_x + x_offset, y, start_z + z_offset)
+                draw = rng.random()
+                if draw < 0.5:
+                    blocks[position] = block_name
+                elif draw < 0.7:
+                    blocks[position] = rng.choice(WORLD_BLOCKS)
+    for _ in range(10):
+        start_x, y, start_z = blueprint["levels"][0]["coordinates"]
+        position = (start_x + rng.randint(-2, 8), y + rng.randint(-1, 4), start_z + rng.randint(-2, 8))
+        blocks.setdefault(position, rng.choice(WORLD_BLOCKS))
+    return blocks
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_score_matches_check_level(seed):
+    rng = random.Random(seed)
+    data = random_blueprint(rng)
+    blocks = random_world(rng, data)
+    matches, mismatches = check(data, blocks)
+    blueprint = Blueprint.from_json(data)
+    snapshot = {",".join(map(str, position)): name for position, name in blocks.items()}
+
+    result = score(blueprint, snapshot)
+    assert (result["matches"], result["mismatches"]) == (len(matches), len(mismatches))
+    assert result["valid"] == (not mismatches)
+    total = len(matches) + len(mismatches)
+    if total:
+        assert result["score"] == pytest.approx(100 * len(matches) / total)
+    else:
+        assert math.isnan(result["score"])
+    assert mismatch_list(blueprint, snapshot) == mismatches
+
+
+def test_score_file_reuses_blueprint(tmp_path):
+    rng = random.Random(0)
+    tasks = {f"construction_{i}": {"type": "construction", "blueprint": random_blueprint(rng)} for i in range(2)}
+    task_path = tmp_path / "tasks.json"
+    task_path.write_text(json.dumps(tasks, indent=4))
+    load_blueprint.cache_clear()
+
+    for i in range(3):
+        for task_id, task in tasks.items():
+            blocks = random_world(rng, task["blueprint"])
+            snapshot_path = tmp_path / f"{task_id}_{i}.json"
+            entries = [[*position, name] for position, name in blocks.items()]
+            snapshot_path.write_text(json.dumps({"task_id": task_id, "blocks": entries}))
+            matches, mismatches = check(task["blueprint"], blocks)
+            result = score_file((str(snapshot_path), str(task_path), None))
+            assert (result["task_id"], result["matches"], result["mismatches"]) == \
+                (task_id, len(matches), len(mismatches))
+
+    assert load_blueprint.cache_info().misses == 2
@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import glob
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_ingestion import TAIL_WINDOW, scan_log_file, parse_full_log_file, parse_log_file
+
+"""
+Checks that the memory-mapped fast path of parse_log_file agrees with a full json.load
+parse of the same memory.json files.
+"""
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "experiment")
+FIXTURE_FILES = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*", "*.json")))
+
+
+def write_log(path, turns):
+    """Writes a memory.json laid out like JSON.stringify(data, null, 2) in history.js."""
+    data = {"memory": "", "turns": turns, "self_prompting_state": 0, "self_prompt": None,
+            "taskStart": 1745366400000, "last_sender": "jill"}
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(data, indent=2, ensure_ascii=False))
+    return str(path)
+
+
+def assert_agrees(path):
+    fast = scan_log_file(path)
+    if fast is not None:
+        assert fast == parse_full_log_file(path)
+
+
+@pytest.mark.parametrize("path", FIXTURE_FILES, ids=lambda path: os.path.relpath(path, FIXTURES_DIR))
+def test_fast_path_matches_full_parse(path):
+    assert_agrees(path)
+
+
+def test_fast_path_handles_complete_fixtures():
+    # Only the copy that was cut short may fall back to json.load
+    fallbacks = [os.path.relpath(path, FIXTURES_DIR) for path in FIXTURE_FILES if scan_log_file(path) is None]
+    assert fallbacks == [os.path.join("multiagent_crafting_lectern_full_plan__depth_1", "jill_0.json")]
+    assert parse_log_file(os.path.join(FIXTURES_DIR, *fallbacks[0].split(os.sep))) is None
+
+
+def test_end_turn_outside_the_tail_window(tmp_path):
+    turns = [{"role": "system", "content": "Task ended with score : 0.25"}]
+    turns += [{"role": "user", "content": "x" * 100} for _ in range(TAIL_WINDOW // 50)]
+    path = write_log(tmp_path / "andy_0.json", turns)
+    assert scan_log_file(path) == (0.25, "Task ended with score : 0.25", len(turns))
+    assert_agrees(path)
+
+
+def test_last_end_turn_wins(tmp_path):
+    path = write_log(tmp_path / "andy_0.json", [
+        {"role": "system", "content": "Task ended with score : 0"},
+        {"role": "system", "content": "Task ended with score : 1"},
+    ])
+    assert scan_log_file(path)[0] == 1
+    assert_agrees(path)
+
+
+def test_record_fields():
+    record = parse_log_file(os.path.join(FIXTURES_DIR, "multiagent_cooking_1_bread", "andy_0.json"))
+    assert (record.task_id, record.agent, record.run) == ("multiagent_cooking_1_bread", "andy", 0)
+    assert record.score == 0.5
+    assert record.end_message == 'Task ended with score : 0.5\nReason: "half done" ✓'
+    assert record.turn_count == 5
@@ -0,0 +1,60 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_ingestion import ingest_folders
+from results_index import ingest_folders_indexed, index_path
+
+"""
+Checks that the SQLite results index returns the same records as a full parse of the
+logs, both when it is built and when it is read back, and that it follows changes.
+"""
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "experiment")
+
+
+@pytest.fixture
+def exp_folder(tmp_path):
+    folder = tmp_path / "exp_04-22_16-20"
+    shutil.copytree(FIXTURES_DIR, folder)
+    return str(folder)
+
+
+def task_folders(exp_folder):
+    return sorted(os.path.join(exp_folder, name) for name in os.listdir(exp_folder)
+                  if os.path.isdir(os.path.join(exp_folder, name)))
+
+
+def parsed(folders):
+    return {folder: None if records is None else sorted(records)
+            for folder, records in ingest_folders(folders, max_workers=1, cache=None).items()}
+
+
+def indexed(folders, exp_folder):
+    return {folder: None if records is None else sorted(records)
+            for folder, records in ingest_folders_indexed(folders, exp_folder, max_workers=1).items()}
+
+
+def test_index_matches_full_parse(exp_folder):
+    folders = task_folders(exp_folder) + [os.path.join(exp_folder, "missing_task")]
+    expected = parsed(folders)
+    assert indexed(folders, exp_folder) == expected
+    assert os.path.exists(index_path(exp_folder))
+    # Second pass is served from the index
+    assert indexed(folders, exp_folder) == expected
+
+
+def test_index_follows_changes(exp_folder):
+    folders = task_folders(exp_folder)
+    indexed(folders, exp_folder)
+
+    folder = os.path.join(exp_folder, "multiagent_crafting_pink_wool_full_plan__depth_0")
+    shutil.copyfile(os.path.join(exp_folder, "multiagent_cooking_1_bread", "jill_0.json"),
+                    os.path.join(folder, "jill_0.json"))
+    os.remove(os.path.join(folder, "andy_0.json"))
+    result = indexed(folders, exp_folder)
+    assert result == parsed(folders)
+    assert [(record.agent, record.score) for record in result[folder]] == [("jill", 1)]
@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from s3_transfer import LocalBackend, download_s3_folders
+
+"""
+Checks the downloader against a LocalBackend bucket: files of a folder are flattened
+into it, the last of several keys with the same file name wins, and a second pull
+finds everything up to date.
+"""
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_keys_with_the_same_file_name(tmp_path, capsys):
+    bucket = tmp_path / "bucket"
+    write(bucket / "exp" / "task_1" / "andy_0.json", "andy")
+    write(bucket / "exp" / "task_1" / "bots" / "Andy_0" / "memory.json", "a" * 10)
+    write(bucket / "exp" / "task_1" / "bots" / "Jill_0" / "memory.json", "j" * 20)
+    out = tmp_path / "out"
+
+    folders = download_s3_folders("unused", "exp/", str(out), backend=LocalBackend(str(bucket)))
+    folder = out / "exp" / "task_1"
+    assert folders == [str(folder)]
+    assert sorted(os.listdir(folder)) == ["andy_0.json", "memory.json"]
+    # Keys are listed in sorted order and the last one is kept, as when they were downloaded one by one
+    assert (folder / "memory.json").read_text() == "j" * 20
+    assert "Downloaded 2 objects, skipped 0 up-to-date, 0 failed" in capsys.readouterr().out
+
+    download_s3_folders("unused", "exp/", str(out), backend=LocalBackend(str(bucket)))
+    assert "Downloaded 0 objects, skipped 2 up-to-date, 0 failed" in capsys.readouterr().out
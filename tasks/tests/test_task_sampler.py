@@ -0,0 +1,74 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_sampler import DifficultyIndex, StratifiedSampler, task_difficulty
+
+"""
+Checks the stratified sampler on a synthetic construction index: the same seed gives
+the same sample, no task is drawn twice, and missing tasks are reported.
+"""
+
+EASY_TASK_QUOTAS = [
+    "3 per (m,r) with m,r<=2 and w,c<=1",
+    "2 with m,r,w,c=0",
+    "1 with m=1 and r,w,c=0",
+]
+
+
+def make_index(skip=(), variants=2):
+    """Every (m, r, w, c) up to (2, 2, 1, 1) with variants tasks each, except the (m, r) in skip."""
+    task_ids, num_levels = [], []
+    for m in range(3):
+        for r in range(3):
+            if (m, r) in skip:
+                continue
+            for w in range(2):
+                for c in range(2):
+                    for variant in range(variants):
+                        task_ids.append(f"materials_{m}_rooms_{r}_window_{w}_carpet_{c}_variant_{variant}")
+                        num_levels.append(3 + variant % 2)
+    return DifficultyIndex(task_ids, num_levels)
+
+
+def test_same_seed_same_sample():
+    index = make_index()
+    first = StratifiedSampler(index, seed=0).sample(EASY_TASK_QUOTAS, where="levels>=3")
+    assert StratifiedSampler(index, seed=0).sample(EASY_TASK_QUOTAS, where="levels>=3") == first
+    assert len(first) == 9 * 3 + 2 + 1
+
+
+def test_no_duplicates():
+    index = make_index(variants=1)
+    # The (0, 0, 0, 0) and (1, 0, 0, 0) tasks are also drawn by the first quota
+    sample = StratifiedSampler(index, seed=1).sample(EASY_TASK_QUOTAS + ["100 with m,r<=2"])
+    assert len(sample) == len(set(sample)) == len(index)
+
+
+def test_quota_counts():
+    sample = StratifiedSampler(make_index(), seed=2).sample(["3 per (m,r) with m,r<=2 and w,c<=1"])
+    groups = {}
+    for task_id in sample:
+        m, r, _, _ = task_difficulty(task_id)
+        groups[(m, r)] = groups.get((m, r), 0) + 1
+    assert groups == {(m, r): 3 for m in range(3) for r in range(3)}
+
+
+def test_shortfall_warnings(capsys):
+    index = make_index(skip={(2, 1)}, variants=1)
+    sample = StratifiedSampler(index, seed=0).sample(["3 per (m,r) with m,r<=2 and w,c=0", "5 with m=2 and r=2"])
+    out = capsys.readouterr().out
+    # (2, 1) has no task at all, every other group only one with w,c=0
+    assert "Warning: Not enough tasks for (m=2, r=1) in '3 per (m,r) with m,r<=2 and w,c=0'. Found 0." in out
+    assert "Warning: Not enough tasks for (m=0, r=0) in '3 per (m,r) with m,r<=2 and w,c=0'. Found 1." in out
+    assert out.count("Not enough tasks for") == 9
+    assert "Warning: Not enough tasks in '5 with m=2 and r=2'. Found 3." in out
+    assert len(sample) == 8 + 3
+
+
+def test_unbounded_group_field(capsys):
+    # No upper bound on r, so only the values present are groups
+    StratifiedSampler(make_index(skip={(0, 2)}, variants=1), seed=0).sample(["4 per (m,r) with m=0"])
+    out = capsys.readouterr().out
+    assert "(m=0, r=2)" not in out
+    assert out.count("Not enough tasks for") == 0
@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_store import TaskStore, apply_overrides
+
+"""
+Checks that the task overlay is merged like Object.assign in tasks.js: the fields of a
+task's own entry win over those of "*", which win over the task file.
+"""
+
+TASKS = {
+    "multiagent_cooking_1_bread": {"type": "cooking", "agent_count": 2, "usernames": ["andy"], "timeout": 300},
+    "multiagent_cooking_2_cake": {"type": "cooking", "agent_count": 2, "timeout": 300},
+}
+
+
+def test_task_entry_wins_over_every_task(tmp_path):
+    task_path = tmp_path / "tasks.json"
+    task_path.write_text(json.dumps(TASKS, indent=4))
+    overrides = {"*": {"usernames": ["izzycw"], "timeout": 600},
+                 "multiagent_cooking_1_bread": {"usernames": ["jill"]}}
+    tasks = TaskStore(str(task_path), overrides=overrides)
+
+    assert tasks.get("multiagent_cooking_1_bread") == dict(TASKS["multiagent_cooking_1_bread"],
+                                                           usernames=["jill"], timeout=600)
+    assert tasks.get("multiagent_cooking_2_cake") == dict(TASKS["multiagent_cooking_2_cake"],
+                                                          usernames=["izzycw"], timeout=600)
+
+
+def test_no_overrides():
+    task = TASKS["multiagent_cooking_1_bread"]
+    assert apply_overrides(task, "multiagent_cooking_1_bread", {}) is task
+    assert apply_overrides(task, "multiagent_cooking_1_bread", {"multiagent_cooking_2_cake": {"timeout": 1}}) == task